@@ -1,11 +1,25 @@
-from state import State
+from state import State, StateView, to_flags
 
-from mesa import Agent
 
-class MemeAgent(Agent):
+# plain integer masks, cheaper than IntFlag arithmetic on the hot path
+SUSCEPTIBLE = int(State.SUSCEPTIBLE)
+INTERESTED_A = int(State.INTERESTED_A)
+INTERESTED_B = int(State.INTERESTED_B)
+BORED_A = int(State.BORED_A)
+BORED_B = int(State.BORED_B)
+BORED_ANY = BORED_A | BORED_B
+INFLUENCER = int(State.INFLUENCER)
+
+
+class MemeAgent:
     """
     Internet meme agent that consume and spread memes.
 
+    The agent keeps its state as an integer bitmask of State in ``flags``;
+    ``state`` gives a set-like view over it. It provides the interface
+    mesa's scheduler and NetworkGrid expect from an Agent, and uses
+    ``__slots__`` so each agent carries no instance dict.
+
     :param unique_id: *int*
         The id assigned to a node.
         Id must be unique
@@ -13,8 +27,8 @@ class MemeAgent(Agent):
     :param model: *MemeModel*
         The model used for the agent to live.
 
-    :param initial_state: *set*
-        A set of State for identifying the node's state.
+    :param initial_state: *int* or *set*
+        The State flags for identifying the node's state.
 
     :param meme_spread_chance: *float*
         The base probability of a meme to spread to other nodes.
@@ -29,6 +43,20 @@ class MemeAgent(Agent):
         The discount value for spread chance of Meme B.
     """
 
+    __slots__ = (
+        "unique_id",
+        "model",
+        "pos",
+        "flags",
+        "meme_A_spread_chance",
+        "meme_B_spread_chance",
+        "maybe_bored_A",
+        "maybe_bored_B",
+        "TIME_BEFORE_INTERESTED_A",
+        "TIME_BEFORE_INTERESTED_B",
+        "TIME_BEFORE_BORED_A",
+        "TIME_BEFORE_BORED_B",
+    )
 
     def __init__(
         self,
@@ -41,12 +69,16 @@ class MemeAgent(Agent):
         meme_interest_B,
         influencer_spread_chance
     ):
-        super().__init__(unique_id, model)
+        self.unique_id = unique_id
+        self.model = model
+        self.pos = None
 
-        self.state = initial_state
+        if not isinstance(initial_state, int):
+            initial_state = to_flags(initial_state)
+        self.flags = int(initial_state)
 
         # apply discount factor to either influencer or ordinary node
-        if State.INFLUENCER in initial_state:
+        if self.flags & INFLUENCER:
             self.meme_A_spread_chance = influencer_spread_chance * meme_interest_A
             self.meme_B_spread_chance = influencer_spread_chance * meme_interest_B
         else:
@@ -62,6 +94,51 @@ class MemeAgent(Agent):
         self.TIME_BEFORE_BORED_A = self.random.randrange(2, 4, 1)
         self.TIME_BEFORE_BORED_B = self.random.randrange(2, 4, 1)
 
+    @classmethod
+    def bulk(cls, model, flags, spread_A, spread_B, bored_A, bored_B):
+        """
+        One agent per node, node ``i`` getting the ``i``-th value of every
+        list, without drawing anything: the countdowns before interest are
+        1 and the boredom chances ``model.maybe_bored``, as the constructor
+        sets them.
+
+        :return: *list* of MemeAgent, placed on their node.
+        """
+        agents = []
+        new = cls.__new__
+        maybe_bored = model.maybe_bored
+        for node, (state, chance_A, chance_B, time_A, time_B) in enumerate(
+            zip(flags, spread_A, spread_B, bored_A, bored_B)
+        ):
+            a = new(cls)
+            a.unique_id = a.pos = node
+            a.model = model
+            a.flags = state
+            a.meme_A_spread_chance = chance_A
+            a.meme_B_spread_chance = chance_B
+            a.maybe_bored_A = a.maybe_bored_B = maybe_bored
+            a.TIME_BEFORE_INTERESTED_A = a.TIME_BEFORE_INTERESTED_B = 1
+            a.TIME_BEFORE_BORED_A = time_A
+            a.TIME_BEFORE_BORED_B = time_B
+            agents.append(a)
+        return agents
+
+    @property
+    def random(self):
+        return self.model.random
+
+    @property
+    def state(self):
+        return StateView(self)
+
+    def set_flags(self, flags):
+        """
+        Change the agent state and let the model track the transition.
+        """
+        if flags != self.flags:
+            old, self.flags = self.flags, flags
+            self.model.state_changed(self, old, flags)
+
 
     def deduct_before_interest_A(self):
         self.TIME_BEFORE_INTERESTED_A -= 1
@@ -79,33 +156,72 @@ class MemeAgent(Agent):
         """
         A method for agent to spread memes.
         """
-        neighbors_nodes = self.model.grid.get_neighbors(self.pos, include_center=False)
+        offsets = self.model.neighbor_offsets
         neighbors_contents = [
-            agent for agent in self.model.grid.get_cell_list_contents(neighbors_nodes)
-            if State.BORED_A not in agent.state and State.BORED_B not in agent.state
+            agent for agent in self.model.neighbor_agents[offsets[self.pos]:offsets[self.pos + 1]]
+            if not agent.flags & BORED_ANY
         ]
 
         # check first for state in which category of meme does a node interested in
         if state is State.INTERESTED_A:
-            for a in neighbors_contents:
+            for a, draw in zip(neighbors_contents, self.model.uniforms.take(len(neighbors_contents))):
                 # neighbour node will be interested after certain time past
                 if self.TIME_BEFORE_INTERESTED_A > 0:
                     self.deduct_before_interest_A()
-                if self.random.random() < self.meme_A_spread_chance:
+                if draw < self.meme_A_spread_chance:
                     if self.TIME_BEFORE_INTERESTED_A == 0:
-                        if State.SUSCEPTIBLE in a.state:
-                            a.state.remove(State.SUSCEPTIBLE)
-                        a.state.add(State.INTERESTED_A)
+                        a.set_flags((a.flags & ~SUSCEPTIBLE) | INTERESTED_A)
         # same with logic above
         elif state is State.INTERESTED_B:
-            for a in neighbors_contents:
+            for a, draw in zip(neighbors_contents, self.model.uniforms.take(len(neighbors_contents))):
                 if self.TIME_BEFORE_INTERESTED_B > 0:
                     self.deduct_before_interest_B()
-                if self.random.random() < self.meme_B_spread_chance:
+                if draw < self.meme_B_spread_chance:
                     if self.TIME_BEFORE_INTERESTED_B == 0:
-                        if State.SUSCEPTIBLE in a.state:
-                            a.state.remove(State.SUSCEPTIBLE)
-                        a.state.add(State.INTERESTED_B)
+                        a.set_flags((a.flags & ~SUSCEPTIBLE) | INTERESTED_B)
+
+    def spread_to_remaining(self, state):
+        """
+        try_to_spread_memes for CalendarActivation.
+
+        The countdown is deducted for every non-bored neighbour as in
+        try_to_spread_memes, but random numbers are only drawn for the
+        neighbours that can still become interested in the meme.
+
+        :return: *bool* whether any neighbour can still become interested,
+            once none can the agent has nothing left to spread.
+        """
+        offsets = self.model.neighbor_offsets
+        # neighbours that can catch the meme, and whether the countdown
+        # had run out when their turn came
+        targets = []
+        if state is State.INTERESTED_A:
+            for a in self.model.neighbor_agents[offsets[self.pos]:offsets[self.pos + 1]]:
+                if a.flags & BORED_ANY:
+                    continue
+                if self.TIME_BEFORE_INTERESTED_A > 0:
+                    self.deduct_before_interest_A()
+                if not a.flags & INTERESTED_A:
+                    targets.append((a, self.TIME_BEFORE_INTERESTED_A == 0))
+            chance, meme = self.meme_A_spread_chance, INTERESTED_A
+        elif state is State.INTERESTED_B:
+            for a in self.model.neighbor_agents[offsets[self.pos]:offsets[self.pos + 1]]:
+                if a.flags & BORED_ANY:
+                    continue
+                if self.TIME_BEFORE_INTERESTED_B > 0:
+                    self.deduct_before_interest_B()
+                if not a.flags & INTERESTED_B:
+                    targets.append((a, self.TIME_BEFORE_INTERESTED_B == 0))
+            chance, meme = self.meme_B_spread_chance, INTERESTED_B
+        else:
+            return False
+        remaining = False
+        for (a, ready), draw in zip(targets, self.model.uniforms.take(len(targets))):
+            if draw < chance and ready:
+                a.set_flags((a.flags & ~SUSCEPTIBLE) | meme)
+            else:
+                remaining = True
+        return remaining
 
     def try_be_bored(self, state):
         """
@@ -116,24 +232,22 @@ class MemeAgent(Agent):
             self.deduct_before_bored_A()
         elif state is State.INTERESTED_B and self.TIME_BEFORE_BORED_B > 0:
             self.deduct_before_bored_B()
-        bored_random = self.random.random()
+        bored_random = self.model.uniforms.random()
         if state is State.INTERESTED_A and bored_random < self.maybe_bored_A:
             if self.TIME_BEFORE_BORED_A == 0:
-                self.state.remove(State.INTERESTED_A)
-                self.state.add(State.BORED_A)
+                self.set_flags((self.flags & ~INTERESTED_A) | BORED_A)
         if state is State.INTERESTED_B and bored_random < self.maybe_bored_B:
             if self.TIME_BEFORE_BORED_B == 0:
-                self.state.remove(State.INTERESTED_B)
-                self.state.add(State.BORED_B)
+                self.set_flags((self.flags & ~INTERESTED_B) | BORED_B)
 
     def step(self):
         """
         The actions for the agent to take for each step/tick
         depending on the state.
         """
-        if State.INTERESTED_A in self.state:
+        if self.flags & INTERESTED_A:
             self.try_to_spread_memes(State.INTERESTED_A)
             self.try_be_bored(State.INTERESTED_A)
-        if State.INTERESTED_B in self.state:
+        if self.flags & INTERESTED_B:
             self.try_to_spread_memes(State.INTERESTED_B)
             self.try_be_bored(State.INTERESTED_B)
@@ -0,0 +1,206 @@
+"""
+Streaming aggregation of per-step series across runs.
+
+The notebook's ``generate_cor`` collects every run's ``Percentage_spread``
+list and then averages step by step. StepStatistics folds each series into
+running statistics as soon as a run finishes, in O(steps) memory whatever
+the number of runs, and SweepAggregator keeps one of them per variable
+parameter value as a SweepRunner sink.
+"""
+from statistics import NormalDist
+
+import numpy as np
+
+
+class StepStatistics:
+    """
+    Running count, mean and variance (Welford) of a series at every step.
+
+    Series may have different lengths: a step only counts the runs that
+    reached it, as in the notebook's ``generate_cor``.
+
+    :param bins: *int*, default None
+        Also keep a histogram of the values at every step with this many
+        bins over ``value_range``, to answer approximate quantiles.
+
+    :param value_range: *tuple*, default (0.0, 1.0)
+        The range of the histogram; values outside are clipped into it.
+
+    :param carry_last: *bool*, default False
+        Extend every series with its last value up to the longest one
+        seen, so runs that stopped early keep counting with their final
+        value.
+    """
+
+    def __init__(self, bins=None, value_range=(0.0, 1.0), carry_last=False):
+        self.bins = bins
+        self.value_range = value_range
+        self.carry_last = carry_last
+        self.count = np.zeros(0, dtype=np.int64)
+        self.mean = np.zeros(0)
+        self._m2 = np.zeros(0)
+        # count, mean, M2 and histogram of the final values of the runs so
+        # far, what every step past their end gets with carry_last
+        self._finals = (0, 0.0, 0.0, np.zeros(bins or 0, dtype=np.int64))
+        self.histogram = np.zeros((0, bins or 0), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.count)
+
+    def _grow(self, steps):
+        extra = steps - len(self.count)
+        if extra <= 0:
+            return
+        self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+        self.mean = np.concatenate([self.mean, np.zeros(extra)])
+        self._m2 = np.concatenate([self._m2, np.zeros(extra)])
+        self.histogram = np.vstack(
+            [self.histogram, np.zeros((extra, self.histogram.shape[1]), dtype=np.int64)]
+        )
+        if self.carry_last:
+            # earlier, shorter runs keep their final value on the new steps:
+            # merging their statistics into empty steps is a copy
+            count, mean, m2, histogram = self._finals
+            start = steps - extra
+            self.count[start:] = count
+            self.mean[start:] = mean
+            self._m2[start:] = m2
+            self.histogram[start:] = histogram
+
+    def _bins(self, values):
+        low, high = self.value_range
+        index = ((values - low) / (high - low) * self.bins).astype(np.int64)
+        return np.clip(index, 0, self.bins - 1)
+
+    def _update(self, values, start=0):
+        end = start + len(values)
+        self.count[start:end] += 1
+        delta = values - self.mean[start:end]
+        self.mean[start:end] += delta / self.count[start:end]
+        self._m2[start:end] += delta * (values - self.mean[start:end])
+        if self.bins:
+            self.histogram[np.arange(start, end), self._bins(values)] += 1
+
+    def add(self, series):
+        """
+        Fold the per-step values of one run into the statistics.
+        """
+        values = np.asarray(series, dtype=np.float64)
+        if not len(values):
+            return
+        self._grow(len(values))
+        if self.carry_last:
+            final = values[-1]
+            count, mean, m2, histogram = self._finals
+            count += 1
+            delta = final - mean
+            mean += delta / count
+            m2 += delta * (final - mean)
+            if self.bins:
+                histogram[self._bins(values[-1:])] += 1
+            self._finals = (count, mean, m2, histogram)
+            values = np.concatenate([values, np.full(len(self.count) - len(values), values[-1])])
+        self._update(values)
+
+    @property
+    def variance(self):
+        """Sample variance at every step, NaN where fewer than two runs."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 1, self._m2 / (self.count - 1), np.nan)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    def ci(self, level=0.95):
+        """
+        Normal confidence interval of the mean at every step.
+
+        :return: *tuple* of the lower and upper bound arrays.
+        """
+        z = NormalDist().inv_cdf((1 + level) / 2)
+        half = z * np.sqrt(self.variance / np.maximum(self.count, 1))
+        return self.mean - half, self.mean + half
+
+    def quantile(self, q):
+        """
+        Approximate ``q`` quantile at every step from the histogram,
+        interpolated inside the bin holding it.
+        """
+        if not self.bins:
+            raise ValueError("StepStatistics needs bins to answer quantiles")
+        low, high = self.value_range
+        width = (high - low) / self.bins
+        cumulative = np.cumsum(self.histogram, axis=1)
+        target = q * self.count
+        index = np.minimum((cumulative < target[:, None]).sum(axis=1), self.bins - 1)
+        rows = np.arange(len(self.count))
+        before = np.where(index > 0, cumulative[rows, index - 1], 0)
+        inside = self.histogram[rows, index]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fraction = np.where(inside > 0, (target - before) / inside, 0.5)
+        return low + (index + np.clip(fraction, 0, 1)) * width
+
+    def curve(self, level=0.95):
+        """
+        ``(xcor, mean, lower, upper)`` ready to plot, steps numbered from 1
+        like ``generate_cor``.
+        """
+        lower, upper = self.ci(level)
+        return np.arange(1, len(self) + 1), self.mean, lower, upper
+
+
+class SweepAggregator:
+    """
+    SweepRunner sink folding run series into StepStatistics, one per
+    variable and per value of the grouping parameters.
+
+    :param group_by: *list*
+        Parameter names the runs are grouped by, usually the variable
+        parameters of the sweep.
+
+    :param variables: *list*, default ("Percentage_spread",)
+        The datacollector variables to aggregate.
+
+    :param kwargs:
+        Passed on to every StepStatistics (``bins``, ``carry_last``, ...).
+    """
+
+    needs_series = True
+
+    def __init__(self, group_by, variables=("Percentage_spread",), **kwargs):
+        self.group_by = list(group_by)
+        self.variables = list(variables)
+        self.kwargs = kwargs
+        self.groups = {}
+
+    def key(self, params):
+        return tuple(params[name] for name in self.group_by)
+
+    def write(self, result):
+        steps = result["series"].get("step")
+        if steps is not None and len(steps) and steps[-1] != len(steps) - 1:
+            raise ValueError(
+                "SweepAggregator needs a row for every step, run {} was collected on "
+                "steps {}...: use collect_every=1".format(result["run"], list(steps[:3]))
+            )
+        group = self.groups.setdefault(self.key(result["params"]), {
+            name: StepStatistics(**self.kwargs) for name in self.variables
+        })
+        for name in self.variables:
+            group[name].add(result["series"][name])
+
+    def close(self):
+        pass
+
+    def statistics(self, name="Percentage_spread"):
+        """
+        Group key to the StepStatistics of a variable.
+        """
+        return {key: group[name] for key, group in self.groups.items()}
+
+    def curves(self, name="Percentage_spread", level=0.95):
+        """
+        Group key to ``(xcor, mean, lower, upper)`` of a variable.
+        """
+        return {key: stats.curve(level) for key, stats in self.statistics(name).items()}
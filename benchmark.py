@@ -0,0 +1,444 @@
+"""
+Benchmarks for MemeModel.
+
+Measures the memory taken by each agent and the time the reporters need to
+scan the whole population::
+
+    $ python benchmark.py --num-nodes 100000
+
+The suite times model construction, steps per second, per-step latency
+percentiles and peak RSS over a grid of models with fixed seeds, plus a
+notebook-style sweep and the network portrayal, and saves the results as a
+JSON baseline; ``compare`` flags what got slower than a baseline::
+
+    $ python benchmark.py suite --output baseline.json
+    $ python benchmark.py suite --output current.json
+    $ python benchmark.py compare baseline.json current.json --threshold 0.1
+
+``startup`` times model construction alone, network generation apart, at
+10k, 100k and 1M nodes, and ``coldstart`` the wall time of a fresh
+``cli.py simulate`` process up to its first step, as paid by every short
+worker run::
+
+    $ python benchmark.py startup --max-nodes 1000000
+    $ python benchmark.py coldstart
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from model import MemeModel, number_interested_A, number_interested_B
+from model import percentage_spread, percentage_meme_A_spread, percentage_meme_B_spread
+
+
+# the reporters evaluated by MemeModel.step and its datacollector every tick
+STEP_REPORTERS = [
+    number_interested_A,
+    number_interested_B,
+    percentage_spread,
+    percentage_meme_A_spread,
+    percentage_meme_B_spread,
+]
+
+# the model of the notebook experiments; larger models keep its group size
+# and expected degree, so only the scale changes
+BASE = {"num_nodes": 250, "n_groups": 5, "p_in": 0.08, "p_out": 0.003}
+SCALES = [250, 1000, 10000, 100000, 1000000]
+# parameters varied one at a time around BASE
+PARAMETERS = {
+    "n_groups": [2, 5, 10],
+    "meme_spread_chance": [0.1, 0.3, 0.6],
+    "influencer_appearance": [1, 5, 10],
+}
+ENGINES = ["agent", "vectorized"]
+# the model sizes of the startup benchmark
+STARTUP_SCALES = [10000, 100000, 1000000]
+
+# metrics where a larger value is better, every other one is a cost
+HIGHER_IS_BETTER = {"steps_per_s", "runs_per_s"}
+
+
+def bench_agents(num_nodes, seed=0):
+    """
+    Memory allocated per node while building the model.
+
+    The graph is left without edges, so only the agents and the node
+    bookkeeping are measured.
+
+    :return: *tuple* of the model and the bytes per node.
+    """
+    tracemalloc.start()
+    model = MemeModel(num_nodes=num_nodes, p_in=0.0, p_out=0.0, seed=seed)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return model, allocated / num_nodes
+
+
+def bench_reporters(model, repeat=5):
+    """
+    Best wall time of one pass over ``STEP_REPORTERS``, in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for reporter in STEP_REPORTERS:
+            reporter(model)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def scaled(num_nodes):
+    """
+    BASE parameters for ``num_nodes`` nodes, with the group size and the
+    expected number of neighbours of the notebook model.
+    """
+    group_size = BASE["num_nodes"] // BASE["n_groups"]
+    return {
+        "num_nodes": num_nodes,
+        "n_groups": max(1, num_nodes // group_size),
+        "p_in": BASE["p_in"],
+        "p_out": BASE["p_out"] * BASE["num_nodes"] / num_nodes,
+    }
+
+
+def suite_cases(max_nodes=100000, engines=ENGINES):
+    """
+    The model cases of the suite, as ``(name, parameters)``.
+    """
+    cases = []
+    for engine in engines:
+        for num_nodes in SCALES:
+            if num_nodes <= max_nodes:
+                cases.append((
+                    "{}/num_nodes={}".format(engine, num_nodes),
+                    dict(scaled(num_nodes), engine=engine),
+                ))
+        for name, values in PARAMETERS.items():
+            for value in values:
+                cases.append((
+                    "{}/{}={}".format(engine, name, value),
+                    dict(BASE, engine=engine, **{name: value}),
+                ))
+    return cases
+
+
+def bench_model(params, seeds=(0, 1, 2), max_steps=100):
+    """
+    Construction time, stepping speed and step latency of a model, over a
+    few seeds.
+
+    Meant to run in a process of its own so that ``peak_rss_mb`` only
+    covers this model.
+    """
+    build, latencies = [], []
+    for seed in seeds:
+        start = time.perf_counter()
+        model = MemeModel(seed=seed, **params)
+        build.append(time.perf_counter() - start)
+        while model.running and model.schedule.steps < max_steps:
+            start = time.perf_counter()
+            model.step()
+            latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies)
+    return {
+        "construct_s": float(np.median(build)),
+        "steps": len(latencies),
+        "steps_per_s": float(len(latencies) / latencies.sum()) if len(latencies) else 0.0,
+        "step_p50_ms": float(np.percentile(latencies, 50) * 1000) if len(latencies) else 0.0,
+        "step_p90_ms": float(np.percentile(latencies, 90) * 1000) if len(latencies) else 0.0,
+        "step_p99_ms": float(np.percentile(latencies, 99) * 1000) if len(latencies) else 0.0,
+        # kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def bench_sweep(iterations=10, processes=1):
+    """
+    Wall time of experiment 2 of the notebook (influencer appearance) run
+    end to end through SweepRunner.
+    """
+    from sweep import SweepRunner
+
+    runner = SweepRunner(
+        MemeModel,
+        fixed_parameters={"num_nodes": 250, "n_groups": 5},
+        variable_parameters={"influencer_appearance": [1, 3, 5, 7]},
+        iterations=iterations,
+        max_steps=100,
+        model_reporters={"Percentage_spread": percentage_spread},
+        seed=0,
+        processes=processes,
+    )
+    start = time.perf_counter()
+    runs = runner.run_all()
+    elapsed = time.perf_counter() - start
+    return {"sweep_s": elapsed, "runs_per_s": runs / elapsed}
+
+
+def bench_portrayal(num_nodes, steps=10, seed=0):
+    """
+    Wall time of the network portrayals over the first steps of a model:
+    the full ``network_portrayal`` and NetworkDeltaModule.
+    """
+    from portrayal import NetworkDeltaModule
+    from server import network_portrayal
+
+    model = MemeModel(seed=seed, **scaled(num_nodes))
+    element = NetworkDeltaModule(collapse_above=num_nodes)
+    start = time.perf_counter()
+    json.dumps(element.render(model))
+    topology = time.perf_counter() - start
+    full, delta = [], []
+    for _ in range(steps):
+        model.step()
+        start = time.perf_counter()
+        json.dumps(network_portrayal(model.G))
+        full.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        json.dumps(element.render(model))
+        delta.append(time.perf_counter() - start)
+    return {
+        "full_ms": float(np.median(full) * 1000),
+        "topology_ms": topology * 1000,
+        "delta_ms": float(np.median(delta) * 1000),
+    }
+
+
+def bench_startup(params, seeds=(0, 1, 2)):
+    """
+    Construction time of a model, and of its network alone, over a few
+    seeds.
+
+    Meant to run in a process of its own so that ``peak_rss_mb`` only
+    covers this model.
+    """
+    from graph import build_csr, partition_sizes, random_partition_edges
+
+    build, network = [], []
+    for seed in seeds:
+        start = time.perf_counter()
+        MemeModel(seed=seed, **params)
+        build.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        edges = random_partition_edges(
+            partition_sizes(params["num_nodes"], params["n_groups"]),
+            params["p_in"],
+            params["p_out"],
+            np.random.default_rng(seed),
+        )
+        build_csr(params["num_nodes"], edges)
+        network.append(time.perf_counter() - start)
+    construct, network = float(np.median(build)), float(np.median(network))
+    return {
+        "construct_s": construct,
+        "network_s": network,
+        "nodes_s": max(construct - network, 0.0),
+        # kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def bench_coldstart(num_nodes=250, repeat=5):
+    """
+    Wall time of fresh processes running one step of a model through
+    ``cli.py``, and of a bare interpreter for reference, in seconds.
+
+    :return: *dict* with the medians, and the heavy modules the command
+        line imported.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    command = [
+        sys.executable, os.path.join(directory, "cli.py"), "simulate",
+        "--param", "num_nodes={}".format(num_nodes), "--seed", "0", "--max-steps", "1",
+    ]
+    heavy = ["pandas", "networkx", "matplotlib", "mesa.visualization", "tornado"]
+    probe = [
+        sys.executable, "-c",
+        "import sys, cli, model; cli.main(sys.argv[1:]); "
+        "print([name for name in {!r} if name in sys.modules], file=sys.stderr)".format(heavy),
+    ] + command[2:]
+
+    def wall(args):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(args, cwd=directory, check=True, stdout=subprocess.DEVNULL)
+            times.append(time.perf_counter() - start)
+        return float(np.median(times))
+
+    imported = subprocess.run(
+        probe, cwd=directory, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        universal_newlines=True,
+    ).stderr.strip().splitlines()[-1]
+    return {
+        "python_s": wall([sys.executable, "-c", "pass"]),
+        "first_step_s": wall(command),
+        "heavy_modules": imported,
+    }
+
+
+def isolated(function, *args):
+    """Run ``function`` in a fresh process, for its own peak RSS."""
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(function, args)
+
+
+def run_suite(max_nodes=100000, engines=ENGINES, seeds=(0, 1, 2), sweep_iterations=10):
+    """
+    Run the whole suite.
+
+    :return: *dict* with the environment under ``meta`` and one metrics
+        dict per case under ``results``.
+    """
+    results = {}
+    for name, params in suite_cases(max_nodes, engines):
+        print("running {}".format(name), file=sys.stderr)
+        results[name] = isolated(bench_model, params, seeds)
+    print("running sweep", file=sys.stderr)
+    results["sweep/experiment_2"] = isolated(bench_sweep, sweep_iterations)
+    for num_nodes in (250, 1000):
+        print("running portrayal {}".format(num_nodes), file=sys.stderr)
+        results["portrayal/num_nodes={}".format(num_nodes)] = isolated(bench_portrayal, num_nodes)
+    import mesa
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "mesa": mesa.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seeds": list(seeds),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Compare two suite results.
+
+    :param threshold: *float*, default 0.1
+        Relative change above which a metric counts as a regression
+        (slower, bigger) or an improvement.
+
+    :return: *list* of ``(case, metric, before, after, change, verdict)``
+        rows, ``change`` being the relative change in the bad direction.
+    """
+    rows = []
+    for case, metrics in baseline["results"].items():
+        for metric, before in metrics.items():
+            after = current["results"].get(case, {}).get(metric)
+            if after is None or metric == "steps" or not before:
+                continue
+            if metric in HIGHER_IS_BETTER:
+                change = (before - after) / before
+            else:
+                change = (after - before) / before
+            verdict = ""
+            if change > threshold:
+                verdict = "REGRESSION"
+            elif change < -threshold:
+                verdict = "improved"
+            rows.append((case, metric, before, after, change, verdict))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--num-nodes", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    commands = parser.add_subparsers(dest="command")
+
+    suite = commands.add_parser("suite", help="run the benchmark suite")
+    suite.add_argument("--output", default="benchmark.json")
+    suite.add_argument(
+        "--max-nodes", type=int, default=100000,
+        help="largest model of the scaling grid, up to 1000000",
+    )
+    suite.add_argument("--engine", action="append", choices=ENGINES)
+    suite.add_argument("--seeds", type=int, default=3)
+    suite.add_argument("--sweep-iterations", type=int, default=10)
+
+    startup = commands.add_parser("startup", help="time model construction")
+    startup.add_argument("--max-nodes", type=int, default=1000000)
+    startup.add_argument("--engine", action="append", choices=ENGINES)
+    startup.add_argument("--seeds", type=int, default=3)
+
+    coldstart = commands.add_parser("coldstart", help="time a fresh process to its first step")
+    coldstart.add_argument("--num-nodes", type=int, default=250)
+    coldstart.add_argument("--repeat", type=int, default=5)
+
+    comparison = commands.add_parser("compare", help="compare two suite results")
+    comparison.add_argument("baseline")
+    comparison.add_argument("current")
+    comparison.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.command == "suite":
+        report = run_suite(
+            args.max_nodes, args.engine or ENGINES, tuple(range(args.seeds)), args.sweep_iterations
+        )
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        for case, metrics in report["results"].items():
+            print("{:40} {}".format(case, "  ".join(
+                "{}={:.4g}".format(metric, value) for metric, value in metrics.items()
+            )))
+        return
+
+    if args.command == "startup":
+        for engine in args.engine or ENGINES:
+            for num_nodes in STARTUP_SCALES:
+                if num_nodes > args.max_nodes:
+                    continue
+                metrics = isolated(
+                    bench_startup, dict(scaled(num_nodes), engine=engine), tuple(range(args.seeds))
+                )
+                print("{:30} {}".format(
+                    "{}/num_nodes={}".format(engine, num_nodes),
+                    "  ".join("{}={:.4g}".format(metric, value) for metric, value in metrics.items()),
+                ))
+        return
+
+    if args.command == "coldstart":
+        metrics = bench_coldstart(args.num_nodes, args.repeat)
+        print("python:      {:.3f} s".format(metrics["python_s"]))
+        print("first step:  {:.3f} s".format(metrics["first_step_s"]))
+        print("heavy modules imported: {}".format(metrics["heavy_modules"]))
+        return
+
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        rows = compare(baseline, current, args.threshold)
+        for case, metric, before, after, change, verdict in rows:
+            print("{:40} {:14} {:12.4g} {:12.4g} {:+7.1%} {}".format(
+                case, metric, before, after, change, verdict
+            ))
+        regressions = [row for row in rows if row[-1] == "REGRESSION"]
+        print("{} regression(s) above {:.0%}".format(len(regressions), args.threshold))
+        sys.exit(1 if regressions else 0)
+
+    model, per_agent = bench_agents(args.num_nodes, args.seed)
+    scan = bench_reporters(model, args.repeat)
+    print("nodes:            {}".format(args.num_nodes))
+    print("bytes per node:   {:.0f}".format(per_agent))
+    print("reporter scan:    {:.3f} ms".format(scan * 1000))
+
+
+if __name__ == "__main__":
+    main()
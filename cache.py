@@ -0,0 +1,398 @@
+"""
+On-disk caches of generated networks and of simulation runs.
+
+Sweeps over agent parameters (``influencer_appearance``,
+``initial_viral_size_A``, ...) keep ``num_nodes``, ``n_groups``, ``p_in`` and
+``p_out`` fixed, yet every MemeModel draws its partition graph again. A
+GraphCache saves each generated graph as ``.npy`` arrays keyed by its
+generation parameters and seed::
+
+    cache/
+        <key>/meta.json       the generation parameters
+        <key>/offsets.npy     CSR index
+        <key>/indices.npy
+        <key>/edges.npy
+
+and hands them back memory-mapped and read-only, so the worker processes of
+a sweep all share the same pages instead of holding a copy each. The least
+recently used graphs are removed once the cache grows past ``max_bytes``;
+workers sharing a cache may remove each other's entries at any time, which
+only costs a miss.
+
+A RunCache keeps the final reporters and per-step series of finished runs,
+keyed by the model, its parameters, the seed, ``max_steps`` and a version
+of the model code, so re-running a sweep only simulates what changed::
+
+    runner = SweepRunner(..., cache="cache/runs")
+"""
+import functools
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+
+from graph import build_csr, partition_sizes, random_partition_edges
+
+
+GRAPH_ARRAYS = ("offsets", "indices", "edges")
+
+
+def file_size(path):
+    """
+    Size of a file, 0 once another process removed it.
+    """
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def directory_size(path):
+    return sum(
+        file_size(os.path.join(root, name))
+        for root, _, names in os.walk(path) for name in names
+    )
+
+
+def remove(path):
+    """
+    Remove a file, unless another process did already.
+
+    :return: *bool* whether this call removed it.
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def least_recently_used(paths):
+    """
+    ``paths`` sorted by modification time, oldest first, without those
+    another process removed in the meantime.
+    """
+    times = {}
+    for path in paths:
+        try:
+            times[path] = os.path.getmtime(path)
+        except FileNotFoundError:
+            pass
+    return sorted(times, key=times.get)
+
+
+class GraphCache:
+    """
+    Memory-mapped partition graphs keyed by
+    ``(num_nodes, n_groups, p_in, p_out, seed)``.
+
+    Picklable, so it can be passed to worker processes; passing the path
+    works too.
+
+    :param path: *str*
+        The cache directory, created if needed.
+
+    :param max_bytes: *int*, default 1 GiB
+        Size above which the least recently used graphs are evicted.
+    """
+
+    def __init__(self, path, max_bytes=1 << 30):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(num_nodes, n_groups, p_in, p_out, seed):
+        params = json.dumps([num_nodes, n_groups, float(p_in), float(p_out), seed])
+        return hashlib.sha1(params.encode()).hexdigest()[:20]
+
+    def entries(self):
+        """
+        The cached graph directories, least recently used first.
+        """
+        return least_recently_used(
+            os.path.join(self.path, name) for name in os.listdir(self.path)
+            if not name.startswith(".")
+        )
+
+    def size(self):
+        return sum(directory_size(path) for path in self.entries())
+
+    def load(self, directory):
+        # reading a graph marks it as recently used
+        os.utime(directory)
+        return tuple(
+            np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+            for name in GRAPH_ARRAYS
+        )
+
+    def get(self, num_nodes, n_groups, p_in, p_out, seed):
+        """
+        The graph for these parameters, generated and stored on a miss.
+
+        :param seed: *int*
+            Seed of the generator drawing the graph, the same graph as
+            ``random_partition_edges(..., np.random.default_rng(seed))``.
+
+        :return: *tuple* of read-only memory-mapped ``(offsets, indices,
+            edges)`` arrays.
+        """
+        directory = os.path.join(self.path, self.key(num_nodes, n_groups, p_in, p_out, seed))
+        try:
+            return self.load(directory)
+        except FileNotFoundError:
+            # not cached, or evicted by another worker while being read:
+            # clear what is left so the new graph can take its place
+            shutil.rmtree(directory, ignore_errors=True)
+        edges = random_partition_edges(
+            partition_sizes(num_nodes, n_groups), p_in, p_out, np.random.default_rng(seed)
+        )
+        offsets, indices = build_csr(num_nodes, edges)
+        # written aside then renamed, so concurrent workers never see a
+        # partial graph; the first rename wins
+        staging = tempfile.mkdtemp(prefix=".", dir=self.path)
+        for name, values in zip(GRAPH_ARRAYS, (offsets, indices, edges)):
+            np.save(os.path.join(staging, name + ".npy"), values)
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump({
+                "num_nodes": num_nodes,
+                "n_groups": n_groups,
+                "p_in": p_in,
+                "p_out": p_out,
+                "seed": seed,
+            }, f)
+        try:
+            os.rename(staging, directory)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict(keep=directory)
+        try:
+            return self.load(directory)
+        except FileNotFoundError:
+            # evicted again already: the arrays just drawn are the same graph
+            return offsets, indices, edges
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used graphs until the cache fits in
+        ``max_bytes``, never removing ``keep``.
+        """
+        entries = [path for path in self.entries() if path != keep]
+        total = sum(directory_size(path) for path in entries)
+        if keep is not None:
+            total += directory_size(keep)
+        for path in entries:
+            if total <= self.max_bytes:
+                break
+            total -= directory_size(path)
+            shutil.rmtree(path, ignore_errors=True)
+
+    def clear(self):
+        for path in self.entries():
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# the modules whose code decides the outcome of a run; editing any of them
+# gives RunCache a new code version
+MODEL_SOURCES = (
+    "agent.py",
+    "collector.py",
+    "engine.py",
+    "graph.py",
+    "memes.py",
+    "model.py",
+    "scheduler.py",
+    "sharded.py",
+    "state.py",
+    "streams.py",
+)
+
+# model arguments that do not change the outcome of a run
+IGNORED_PARAMETERS = ("graph_cache", "debug", "profile")
+
+
+def describe(function):
+    """
+    A stable name for a model class or reporter, None when there is none.
+    """
+    if isinstance(function, functools.partial):
+        inner = describe(function.func)
+        if inner is None:
+            return None
+        arguments = [repr(arg) for arg in function.args]
+        arguments += ["{}={!r}".format(k, v) for k, v in sorted(function.keywords.items())]
+        return "{}({})".format(inner, ", ".join(arguments))
+    module = getattr(function, "__module__", None)
+    qualname = getattr(function, "__qualname__", None)
+    if module is None or qualname is None or "<" in qualname:
+        # lambdas and nested functions have no stable name
+        return None
+    return "{}.{}".format(module, qualname)
+
+
+def code_version():
+    """
+    Hash of the sources of ``MODEL_SOURCES``.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha1()
+    for name in MODEL_SOURCES:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+class RunCache:
+    """
+    Results of finished runs keyed by model, parameters, seed, ``max_steps``
+    and code version, one pickle per run.
+
+    An entry answers a run asking for the reporters it holds, under the same
+    reporter functions, and for the series if it holds them; otherwise the
+    run is simulated again and the entry replaced. Reporters with no stable
+    name (lambdas, nested functions) are never stored, so a run asking for
+    one always misses. Picklable, so it travels
+    with the sweep tasks to the workers.
+
+    :param path: *str*
+        The cache directory, created if needed.
+
+    :param max_bytes: *int*, default 1 GiB
+        Size above which the least recently used runs are evicted.
+
+    :param version: *str*, default None
+        The model code version runs are stored under. When None, a hash of
+        ``MODEL_SOURCES``: editing the model invalidates earlier runs on its
+        own. Set it to share runs across harmless edits, or change it to
+        invalidate them by hand.
+    """
+
+    def __init__(self, path, max_bytes=1 << 30, version=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.version = version or code_version()
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, model_cls, kwargs, seed, max_steps):
+        """
+        The key of a run, None when the model has no stable name.
+        """
+        model = describe(model_cls)
+        if model is None:
+            return None
+        params = {k: v for k, v in kwargs.items() if k not in IGNORED_PARAMETERS}
+        description = json.dumps(
+            [model, self.version, params, seed, max_steps], sort_keys=True, default=repr
+        )
+        return hashlib.sha1(description.encode()).hexdigest()[:24]
+
+    def file(self, key):
+        return os.path.join(self.path, key + ".pkl")
+
+    def entries(self):
+        """
+        The cached run files, least recently used first.
+        """
+        return least_recently_used(
+            os.path.join(self.path, name) for name in os.listdir(self.path)
+            if name.endswith(".pkl") and not name.startswith(".")
+        )
+
+    def size(self):
+        return sum(file_size(path) for path in self.entries())
+
+    def get(self, key, reporters, series=False):
+        """
+        The cached ``(reporters, series)`` of a run, None on a miss.
+
+        :param reporters: *dict*
+            Name to reporter function, as given to the run.
+
+        :param series: *bool*, default False
+            Whether the run needs the per-step series.
+        """
+        path = self.file(key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        stored = entry["reporters"]
+        for name, reporter in reporters.items():
+            description = describe(reporter)
+            if description is None or name not in stored or stored[name][0] != description:
+                return None
+        if series and entry["series"] is None:
+            return None
+        # reading a run marks it as recently used
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # evicted by another worker since
+            return None
+        values = {name: stored[name][1] for name in reporters}
+        return values, entry["series"]
+
+    def put(self, key, reporters, values, series=None):
+        """
+        Store the reporter values, and series, of a finished run.
+        """
+        descriptions = {name: describe(reporter) for name, reporter in reporters.items()}
+        entry = {
+            "reporters": {
+                name: (description, values[name])
+                for name, description in descriptions.items() if description is not None
+            },
+            "series": series,
+            "version": self.version,
+        }
+        # written aside then renamed, so concurrent workers never read a
+        # partial entry
+        descriptor, staging = tempfile.mkstemp(prefix=".", dir=self.path)
+        with os.fdopen(descriptor, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(staging, self.file(key))
+        self.evict(keep=self.file(key))
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used runs until the cache fits in
+        ``max_bytes``, never removing ``keep``.
+        """
+        entries = self.entries()
+        total = sum(file_size(path) for path in entries)
+        for path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            total -= file_size(path)
+            remove(path)
+
+    def invalidate(self):
+        """
+        Remove the runs stored under another code version, which can no
+        longer be hit.
+
+        :return: *int* the number of runs removed.
+        """
+        removed = 0
+        for path in self.entries():
+            try:
+                with open(path, "rb") as f:
+                    version = pickle.load(f).get("version")
+            except (OSError, EOFError, pickle.UnpicklingError):
+                version = None
+            if version != self.version:
+                removed += remove(path)
+        return removed
+
+    def clear(self):
+        for path in self.entries():
+            os.remove(path)
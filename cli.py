@@ -0,0 +1,226 @@
+"""
+Command line runs of the meme models, without the visualization server.
+
+``simulate`` runs one model and writes its collected series as CSV,
+``sweep`` runs a SweepRunner described by a JSON file::
+
+    $ python cli.py simulate --param num_nodes=10000 --param engine=vectorized \\
+          --seed 1 --max-steps 100 --output run.csv
+    $ python cli.py sweep experiments/influencer.json --processes 8
+
+A sweep file holds the SweepRunner arguments, with the model and its
+reporters given by name::
+
+    {
+        "model": "MemeModel",
+        "fixed_parameters": {"num_nodes": 250, "n_groups": 5},
+        "variable_parameters": {"influencer_appearance": [1, 3, 5, 7]},
+        "iterations": 50,
+        "max_steps": 100,
+        "model_reporters": {"peak_A": "number_peak_meme_A"},
+        "model_options": {"collect_every": 0},
+        "seed": 42
+    }
+
+The reporters go to ``--output``, else to the file's ``output``, else to a
+CSV named after the sweep file in the current directory.
+
+Reporters are functions of the model's module; ``["number_peak_meme", 2]``
+binds arguments, e.g. a meme of MultiMemeModel. MemeModel sweeps without
+``model_reporters`` report what the notebook experiments did.
+
+Only the simulation core is imported: no mesa visualization, networkx,
+pandas or matplotlib, so short runs in worker processes or cron jobs start
+fast. ``--timings`` prints the time to import, build and first step.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from ast import literal_eval
+from functools import partial
+from importlib import import_module
+
+
+# model name to the module defining it and its reporters
+MODELS = {
+    "MemeModel": "model",
+    "MultiMemeModel": "memes",
+}
+
+# the reporters of the notebook experiments
+DEFAULT_REPORTERS = {
+    "susceptible": "number_susceptible",
+    "num_steps": "number_steps",
+    "peak_A": "number_peak_meme_A",
+    "step_peak_A": "step_peak_meme_A",
+    "peak_B": "number_peak_meme_B",
+    "step_peak_B": "step_peak_meme_B",
+    "bored_A": "number_bored_A",
+    "bored_B": "number_bored_B",
+    "bored_both": "number_bored_both",
+    "interest_A": "number_interest_A",
+    "interest_B": "number_interest_B",
+    "interest_both": "number_interest_both",
+    "percentage_spread": "percentage_spread",
+    "percentage_meme_A_spread": "percentage_meme_A_spread",
+    "percentage_meme_B_spread": "percentage_meme_B_spread",
+}
+
+
+def load_model(name):
+    """
+    The model class called ``name`` and its module.
+    """
+    if name not in MODELS:
+        raise ValueError("Unknown model {!r}, expected one of {}".format(name, list(MODELS)))
+    module = import_module(MODELS[name])
+    return getattr(module, name), module
+
+
+def load_reporters(module, reporters):
+    """
+    Name to reporter function, from name to the name of a function of
+    ``module``, or to a list of that name and arguments to bind.
+    """
+    functions = {}
+    for name, spec in reporters.items():
+        if isinstance(spec, str):
+            spec = [spec]
+        function = getattr(module, spec[0], None)
+        if not callable(function):
+            raise ValueError("Unknown reporter {!r} in {}".format(spec[0], module.__name__))
+        functions[name] = partial(function, *spec[1:]) if len(spec) > 1 else function
+    return functions
+
+
+def parse_params(params):
+    """
+    Model arguments from ``name=value`` strings, values read as Python
+    literals, or kept as strings when they are none.
+    """
+    kwargs = {}
+    for param in params:
+        name, sep, value = param.partition("=")
+        if not sep:
+            raise ValueError("Expected name=value, got {!r}".format(param))
+        try:
+            kwargs[name] = literal_eval(value)
+        except (ValueError, SyntaxError):
+            kwargs[name] = value
+    return kwargs
+
+
+class Timings:
+    """
+    Time of the phases of a run, and since this object was made,
+    printed to stderr.
+    """
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.last = self.start
+
+    def mark(self, label):
+        if self.enabled:
+            now = time.perf_counter()
+            print("{:<12}{:8.1f} ms{:8.1f} ms total".format(
+                label, (now - self.last) * 1000, (now - self.start) * 1000
+            ), file=sys.stderr)
+            self.last = now
+
+
+def simulate(args, timings):
+    model_cls, module = load_model(args.model)
+    timings.mark("import")
+    kwargs = parse_params(args.param)
+    model = model_cls(seed=args.seed, **kwargs)
+    timings.mark("build")
+    if model.running and args.max_steps > 0:
+        model.step()
+    timings.mark("first step")
+    while model.running and model.schedule.steps < args.max_steps:
+        model.step()
+    if hasattr(model, "collect"):
+        model.collect()
+    timings.mark("run")
+
+    series = model.datacollector.model_vars
+    if args.output:
+        steps = getattr(model, "collection_steps", None)
+        if steps is None:
+            # models collecting on every step
+            steps = range(len(next(iter(series.values()), [])))
+        with open(args.output, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["step"] + list(series))
+            writer.writerows(zip(steps, *series.values()))
+    # the final values, as one JSON object on stdout
+    final = {"steps": model.schedule.steps}
+    final.update({name: values[-1] for name, values in series.items() if values})
+    print(json.dumps(final, default=lambda value: value.item()))
+    timings.mark("write")
+
+
+def sweep(args, timings):
+    with open(args.config) as f:
+        config = json.load(f)
+    model_cls, module = load_model(config.pop("model", "MemeModel"))
+    reporters = config.pop("model_reporters", None)
+    if reporters is None:
+        reporters = DEFAULT_REPORTERS if model_cls.__name__ == "MemeModel" else {}
+    config["model_reporters"] = load_reporters(module, reporters)
+    for name in ("processes", "output", "seed", "cache"):
+        value = getattr(args, name)
+        if value is not None:
+            config[name] = value
+    if config.get("output") is None:
+        name = os.path.splitext(os.path.basename(args.config))[0]
+        config["output"] = "sweep_{}.csv".format(name)
+    from sweep import SweepRunner
+
+    timings.mark("import")
+    runner = SweepRunner(model_cls, **config)
+    runs = runner.run_all()
+    timings.mark("sweep")
+    print(json.dumps({"runs": runs, "cache_hits": runner.cache_hits, "output": runner.output}))
+
+
+def main(argv=None):
+    timings = Timings(False)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--timings", action="store_true", help="print the time of every phase to stderr"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    one = commands.add_parser("simulate", help="run one model")
+    one.add_argument("--model", default="MemeModel", choices=sorted(MODELS))
+    one.add_argument(
+        "--param", action="append", default=[], metavar="NAME=VALUE",
+        help="a model argument, the value a Python literal or a string",
+    )
+    one.add_argument("--seed", type=int, default=None)
+    one.add_argument("--max-steps", type=int, default=1000)
+    one.add_argument("--output", help="CSV file of the collected series")
+
+    many = commands.add_parser("sweep", help="run a sweep described by a JSON file")
+    many.add_argument("config")
+    many.add_argument("--processes", type=int)
+    many.add_argument("--output", help="CSV file of the reporters, instead of the config's")
+    many.add_argument("--seed", type=int, help="master seed, instead of the config's")
+    many.add_argument("--cache", help="RunCache directory")
+    args = parser.parse_args(argv)
+
+    timings.enabled = args.timings
+    if args.command == "simulate":
+        simulate(args, timings)
+    else:
+        sweep(args, timings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Model-level data collection without pandas.
+
+mesa's DataCollector imports pandas when it is imported, a few hundred
+milliseconds that every worker process and command-line run used to pay
+before its first step. The models only collect model-level reporters, and
+ModelCollector keeps that part of the DataCollector interface:
+``model_reporters``, ``model_vars``, ``collect`` and
+``get_model_vars_dataframe``, which imports pandas when called, and the
+empty agent side mesa's BatchRunner reads: ``agent_reporters`` is None.
+"""
+
+
+class ModelCollector:
+    """
+    Per-step values of model reporters, one list per reporter in
+    ``model_vars``, as read by mesa's ChartModule.
+
+    :param model_reporters: *dict*
+        Name to a function of the model.
+    """
+
+    # no agent-level reporters, as BatchRunner checks before asking for them
+    agent_reporters = None
+
+    def __init__(self, model_reporters=None):
+        self.model_reporters = dict(model_reporters or {})
+        self.model_vars = {name: [] for name in self.model_reporters}
+
+    def collect(self, model):
+        for name, reporter in self.model_reporters.items():
+            self.model_vars[name].append(reporter(model))
+
+    def get_model_vars_dataframe(self):
+        """
+        The collected values as a pandas DataFrame, one column per reporter.
+        """
+        import pandas as pd
+
+        return pd.DataFrame(self.model_vars)
+
+    def get_agent_vars_dataframe(self):
+        """
+        An empty DataFrame indexed like mesa's, there are no agent reporters.
+        """
+        import pandas as pd
+
+        return pd.DataFrame(columns=["Step", "AgentID"]).set_index(["Step", "AgentID"])
@@ -0,0 +1,191 @@
+"""
+Array-backed simulation engine for MemeModel.
+
+The engine keeps every node's state, countdown timers and spread chances in
+NumPy arrays and advances the whole population at once instead of calling
+``MemeAgent.step`` agent by agent. It takes the place of the scheduler in
+``MemeModel``, so ``model.schedule.steps`` and the reporters keep working.
+"""
+import numpy as np
+
+from graph import expand_neighbors
+from state import State, StateCounts
+
+
+# State flags as uint8, the dtype of the node state array
+BITS = {s: np.uint8(s) for s in State}
+BORED_ANY = BITS[State.BORED_A] | BITS[State.BORED_B]
+
+# the memes handled by the engine, keyed by their interested state
+MEMES = {
+    State.INTERESTED_A: (State.BORED_A, State.INTEREST_A),
+    State.INTERESTED_B: (State.BORED_B, State.INTEREST_B),
+}
+
+
+class VectorizedEngine:
+    """
+    Vectorized replacement for ``RandomActivation`` + ``MemeAgent``.
+
+    Each step is processed in waves. The first wave holds every node that is
+    interested in a meme when the step starts. A node infected during the step
+    joins the next wave when its (random) activation time comes after its
+    earliest infection, which mirrors an agent that is reached by the shuffled
+    ``RandomActivation`` order after it became interested. Within a wave all
+    spreaders act at once on the states left by the previous wave.
+
+    Spread and boredom keep the agent semantics: the interest countdown is
+    deducted once per non-bored neighbour and a meme only spreads once it has
+    reached zero, the boredom countdown is deducted once per activation.
+
+    The waves only read and change the node states through ``bored_of_any``,
+    ``interested_in``, ``set_interested``, ``set_bored`` and
+    ``boredom_chance``, meme by meme in the order of ``memes``, and index the
+    countdowns and spread chances by meme: memes.MultiMemeEngine runs the
+    same waves over any number of memes.
+
+    :param model: *MemeModel*
+        The model owning the engine, spreading runs on its CSR
+        adjacency index.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.steps = 0
+        self.time = 0
+        self.num_nodes = len(model.offsets) - 1
+        self.memes = tuple(MEMES)
+        self.rng = np.random.default_rng(model.random.getrandbits(64))
+        self.offsets, self.indices = model.offsets, model.indices
+
+        n = self.num_nodes
+        self.state = np.full(n, BITS[State.SUSCEPTIBLE], dtype=np.uint8)
+        self.spread_chance = {}
+        # whether a node got the interest discount on its spread chance
+        self.has_interest = {}
+        self.time_before_interested = {}
+        self.time_before_bored = {}
+        interest_chance = {
+            State.INTERESTED_A: model.interest_meme_A_chance,
+            State.INTERESTED_B: model.interest_meme_B_chance,
+        }
+        for meme, (_, interest) in MEMES.items():
+            has_interest = self.rng.random(n) < interest_chance[meme]
+            self.state[has_interest] |= BITS[interest]
+            self.has_interest[meme] = has_interest
+            # same discount values as MemeModel gives to its agents; the
+            # influencer flag is assigned afterwards and does not change them
+            self.spread_chance[meme] = (
+                model.meme_spread_chance * np.where(has_interest, 0.95, 0.1)
+            )
+            self.time_before_interested[meme] = np.ones(n, dtype=np.int64)
+            self.time_before_bored[meme] = self.rng.integers(2, 4, n)
+
+        influencers = self.sample_nodes(model.influencer_appearance)
+        self.state[influencers] |= BITS[State.INFLUENCER]
+
+        viral_size = {
+            State.INTERESTED_A: model.initial_viral_size_A,
+            State.INTERESTED_B: model.initial_viral_size_B,
+        }
+        for meme, (_, interest) in MEMES.items():
+            nodes = self.sample_nodes(viral_size[meme])
+            self.state[nodes] |= BITS[meme] | BITS[interest]
+            self.state[nodes] &= ~BITS[State.SUSCEPTIBLE]
+
+    def sample_nodes(self, size):
+        """Draw ``size`` distinct nodes uniformly."""
+        return self.rng.choice(self.num_nodes, size, replace=False)
+
+    def get_agent_count(self):
+        return self.num_nodes
+
+    def scan_counts(self):
+        """Count the nodes per state with a full scan of the state array."""
+        flags, n = np.unique(self.state, return_counts=True)
+        return StateCounts(dict(zip(flags.tolist(), n.tolist())))
+
+    def interested_nodes(self, meme):
+        """The nodes interested in a meme."""
+        return np.flatnonzero(self.state & BITS[meme])
+
+    def interested_in(self, meme, nodes):
+        """Whether each of the nodes is interested in a meme."""
+        return (self.state[nodes] & BITS[meme]) != 0
+
+    def bored_of_any(self, nodes):
+        """Whether each of the nodes is bored of some meme."""
+        return (self.state[nodes] & BORED_ANY) != 0
+
+    def boredom_chance(self, meme):
+        return self.model.maybe_bored
+
+    def set_interested(self, meme, nodes):
+        """Make distinct nodes interested in a meme."""
+        self.set_state(nodes, (self.state[nodes] & ~BITS[State.SUSCEPTIBLE]) | BITS[meme])
+
+    def set_bored(self, meme, nodes):
+        """Make distinct nodes interested in a meme bored of it."""
+        self.set_state(nodes, (self.state[nodes] & ~BITS[meme]) | BITS[MEMES[meme][0]])
+
+    def set_state(self, nodes, state):
+        """Change the state of several nodes, keeping the model counts in sync."""
+        counts = self.model.counts
+        delta = np.bincount(state, minlength=256) - np.bincount(self.state[nodes], minlength=256)
+        for flags in np.flatnonzero(delta).tolist():
+            counts[flags] += int(delta[flags])
+        self.state[nodes] = state
+
+    def try_to_spread_memes(self, meme, spreaders, activation):
+        """
+        Spread a meme from the spreaders to their non-bored neighbours.
+
+        :return: *tuple* of the newly interested nodes and the earliest
+            activation time at which each of them was reached.
+        """
+        owner, targets = expand_neighbors(self.offsets, self.indices, spreaders)
+        eligible = ~self.bored_of_any(targets)
+        owner, targets = owner[eligible], targets[eligible]
+
+        # the countdown is deducted once per neighbour, so the k-th neighbour
+        # can be reached once k + 1 deductions brought the timer to zero
+        n_eligible = np.bincount(owner, minlength=len(spreaders))
+        rank = np.arange(len(owner)) - np.repeat(np.cumsum(n_eligible) - n_eligible, n_eligible)
+        timer = self.time_before_interested[meme]
+        before = timer[spreaders]
+        timer[spreaders] = np.maximum(before - n_eligible, 0)
+
+        draws = self.rng.random(len(owner))
+        hit = (rank >= before[owner] - 1) & (draws < self.spread_chance[meme][spreaders][owner])
+        targets = targets[hit]
+        reached_at = activation[spreaders][owner[hit]]
+
+        # keep the earliest contact of every target that was not interested yet
+        order = np.lexsort((reached_at, targets))
+        targets, reached_at = targets[order], reached_at[order]
+        first = np.ones(len(targets), dtype=bool)
+        first[1:] = targets[1:] != targets[:-1]
+        new = first & ~self.interested_in(meme, targets)
+        targets, reached_at = targets[new], reached_at[new]
+
+        self.set_interested(meme, targets)
+        return targets, reached_at
+
+    def try_be_bored(self, meme, nodes):
+        """Make interested nodes bored of a meme once their countdown is over."""
+        timer = self.time_before_bored[meme]
+        left = np.maximum(timer[nodes] - 1, 0)
+        timer[nodes] = left
+        draws = self.rng.random(len(nodes))
+        self.set_bored(meme, nodes[(left == 0) & (draws < self.boredom_chance(meme))])
+
+    def step(self):
+        activation = self.rng.random(self.num_nodes)
+        wave = {meme: self.interested_nodes(meme) for meme in self.memes}
+        while any(len(nodes) for nodes in wave.values()):
+            for meme, nodes in wave.items():
+                targets, reached_at = self.try_to_spread_memes(meme, nodes, activation)
+                self.try_be_bored(meme, nodes)
+                wave[meme] = targets[activation[targets] > reached_at]
+        self.steps += 1
+        self.time += 1
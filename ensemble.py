@@ -0,0 +1,312 @@
+"""
+Replicate-batched simulation of MemeModel.
+
+Every experiment in ``experiment.ipynb`` is many replicates of the same
+configuration. EnsembleModel simulates K replicates at once with the
+vectorized engine: the replicates are laid side by side as one
+(replicates x nodes) state array over K disjoint copies of the network, so
+a step advances all of them with the same batched operations::
+
+    ensemble = EnsembleModel(replicates=50, num_nodes=250, n_groups=5)
+    ensemble.run(max_steps=100)
+    rows = ensemble.results({"peak_A": number_peak_meme_A, "num_steps": number_steps})
+
+Reporter functions from ``model.py`` work per replicate through
+``ensemble.replicate(r)``. The rows of ``results`` have the columns of
+mesa's tables in ``experiments/``: with variable parameters, those,
+"Run" from 0, the reporters sorted by name, then the other parameters
+(``batch_result_1.csv``); without, the reporters sorted by name, the
+parameters, then "Run" from 1 (``batch_result_0.csv``).
+"""
+import random
+
+import numpy as np
+
+from engine import VectorizedEngine
+from graph import build_csr, partition_sizes, random_partition_edges
+from state import State, StateCounts, to_flags
+
+
+def count_matrix(*states, how="any"):
+    """
+    Column vector selecting the state bitmasks matching ``states``, so that
+    ``histogram @ count_matrix(...)`` counts the matching nodes of every
+    replicate.
+    """
+    mask = to_flags(states)
+    flags = np.arange(256)
+    if how == "all":
+        return ((flags & mask) == mask).astype(np.int64)
+    return ((flags & mask) != 0).astype(np.int64)
+
+
+class EnsembleEngine(VectorizedEngine):
+    """
+    VectorizedEngine over the replicates of an EnsembleModel.
+
+    Keeps a (replicates x 256) histogram of nodes per state bitmask in
+    place of the model state counts.
+    """
+
+    def __init__(self, model):
+        self.replicates = model.replicates
+        super().__init__(model)
+        replicate = np.arange(self.num_nodes) // model.num_nodes
+        self.histogram = np.bincount(
+            replicate * 256 + self.state, minlength=self.replicates * 256
+        ).reshape(self.replicates, 256)
+
+    def sample_nodes(self, size):
+        """Draw ``size`` distinct nodes in every replicate."""
+        n = self.model.num_nodes
+        return np.concatenate([
+            r * n + self.rng.choice(n, size, replace=False) for r in range(self.replicates)
+        ])
+
+    def set_state(self, nodes, state):
+        codes = (nodes // self.model.num_nodes) * 256
+        size = self.replicates * 256
+        delta = np.bincount(codes + state, minlength=size) - np.bincount(
+            codes + self.state[nodes], minlength=size
+        )
+        self.histogram += delta.reshape(self.replicates, 256)
+        self.state[nodes] = state
+
+
+class ReplicateView:
+    """
+    One replicate of an EnsembleModel, seen through the attributes the
+    reporter functions of ``model.py`` read from a MemeModel.
+    """
+
+    def __init__(self, ensemble, replicate):
+        self.ensemble = ensemble
+        self.replicate = replicate
+        self.num_nodes = ensemble.num_nodes
+        self.step_counter = int(ensemble.step_counter[replicate])
+        self.running = bool(ensemble.running_replicates[replicate])
+        row = ensemble.schedule.histogram[replicate]
+        self.counts = StateCounts({flags: int(row[flags]) for flags in np.flatnonzero(row)})
+
+    def get_peak_meme_A(self):
+        return int(self.ensemble.peak_meme_A[self.replicate])
+
+    def get_peak_meme_B(self):
+        return int(self.ensemble.peak_meme_B[self.replicate])
+
+    def get_step_peak_meme_A(self):
+        return int(self.ensemble.step_meme_A[self.replicate])
+
+    def get_step_peak_meme_B(self):
+        return int(self.ensemble.step_meme_B[self.replicate])
+
+    def get_num_nodes(self):
+        return self.num_nodes
+
+
+class EnsembleModel:
+    """
+    K independent replicates of MemeModel simulated together.
+
+    The model parameters are those of MemeModel. The dynamics are the ones
+    of ``MemeModel(engine="vectorized")``.
+
+    :param replicates: *int*, default 50
+        The number of replicates.
+
+    :param shared_graph: *bool*, default True
+        Run every replicate on the same network. When False each replicate
+        draws its own network.
+
+    :param seed: *int*, default None
+        The seed of the ensemble random number generator.
+    """
+
+    # the parameters of the notebook experiments, in the order of their
+    # fixed_params, reported by default
+    PARAMETERS = (
+        "num_nodes",
+        "n_groups",
+        "initial_viral_size_A",
+        "initial_viral_size_B",
+        "meme_spread_chance",
+        "maybe_bored",
+        "influencer_appearance",
+        "influencer_spread_chance",
+        "interest_meme_A_chance",
+        "interest_meme_B_chance",
+    )
+
+    # per-step model variables, named as in MemeModel.datacollector
+    MODEL_VARS = {
+        "Percentage_spread": (State.BORED_A, State.BORED_B, State.INTERESTED_A, State.INTERESTED_B),
+        "Percentage_meme_A": (State.BORED_A, State.INTERESTED_A),
+        "Percentage_meme_B": (State.BORED_B, State.INTERESTED_B),
+    }
+
+    def __init__(
+        self,
+        replicates=50,
+        shared_graph=True,
+        num_nodes=100,
+        n_groups=2,
+        p_in=0.08,
+        p_out=0.003,
+        initial_viral_size_A=5,
+        initial_viral_size_B=5,
+        meme_spread_chance=0.3,
+        maybe_bored=0.3,
+        influencer_appearance=1,
+        influencer_spread_chance=0.6,
+        interest_meme_A_chance=0.5,
+        interest_meme_B_chance=0.5,
+        seed=None
+    ):
+        # constructor arguments, as reported by results
+        self.parameters = {
+            "num_nodes": num_nodes,
+            "n_groups": n_groups,
+            "p_in": p_in,
+            "p_out": p_out,
+            "initial_viral_size_A": initial_viral_size_A,
+            "initial_viral_size_B": initial_viral_size_B,
+            "meme_spread_chance": meme_spread_chance,
+            "maybe_bored": maybe_bored,
+            "influencer_appearance": influencer_appearance,
+            "influencer_spread_chance": influencer_spread_chance,
+            "interest_meme_A_chance": interest_meme_A_chance,
+            "interest_meme_B_chance": interest_meme_B_chance,
+        }
+        self.random = random.Random(seed)
+        self.replicates = replicates
+        self.num_nodes = num_nodes
+        self.group_sizes = partition_sizes(num_nodes, n_groups)
+        self.initial_viral_size_A = min(initial_viral_size_A, num_nodes)
+        self.initial_viral_size_B = min(initial_viral_size_B, num_nodes)
+        self.meme_spread_chance = meme_spread_chance
+        self.maybe_bored = maybe_bored
+        self.influencer_appearance = influencer_appearance
+        self.influencer_spread_chance = influencer_spread_chance
+        self.interest_meme_A_chance = interest_meme_A_chance
+        self.interest_meme_B_chance = interest_meme_B_chance
+
+        # K disjoint copies of the network, replicate r owns the nodes
+        # r * num_nodes .. (r + 1) * num_nodes - 1
+        rng = np.random.default_rng(self.random.getrandbits(64))
+        if shared_graph:
+            edges = random_partition_edges(self.group_sizes, p_in, p_out, rng)
+            offsets, indices = build_csr(num_nodes, edges)
+            self.offsets = np.concatenate(
+                [offsets[:-1] + r * len(indices) for r in range(replicates)]
+                + [[replicates * len(indices)]]
+            )
+            self.indices = np.concatenate([indices + r * num_nodes for r in range(replicates)])
+        else:
+            edges = np.concatenate([
+                random_partition_edges(self.group_sizes, p_in, p_out, rng) + r * num_nodes
+                for r in range(replicates)
+            ])
+            self.offsets, self.indices = build_csr(replicates * num_nodes, edges)
+
+        self.schedule = EnsembleEngine(self)
+        self.running_replicates = np.ones(replicates, dtype=bool)
+        self.step_counter = np.zeros(replicates, dtype=np.int64)
+        self.peak_meme_A = np.zeros(replicates, dtype=np.int64)
+        self.peak_meme_B = np.zeros(replicates, dtype=np.int64)
+        self.step_meme_A = np.zeros(replicates, dtype=np.int64)
+        self.step_meme_B = np.zeros(replicates, dtype=np.int64)
+        self.model_vars = {name: [] for name in self.MODEL_VARS}
+        self.collect()
+
+    @property
+    def running(self):
+        return bool(self.running_replicates.any())
+
+    def count(self, *states, how="any"):
+        """Number of nodes matching ``states`` in every replicate."""
+        return self.schedule.histogram @ count_matrix(*states, how=how)
+
+    def collect(self):
+        """
+        Record the per-step model variables of the running replicates,
+        stopped replicates get NaN.
+        """
+        total = self.count(*self.MODEL_VARS["Percentage_spread"])
+        for name, states in self.MODEL_VARS.items():
+            if name == "Percentage_spread":
+                value = total / self.num_nodes
+            else:
+                value = self.count(*states) / np.maximum(total, 1)
+            self.model_vars[name].append(np.where(self.running_replicates, value, np.nan))
+
+    def step(self):
+        running = self.running_replicates
+        self.schedule.step()
+        self.step_counter[running] += 1
+        self.collect()
+        # recording number of peak interested in a meme with step n
+        interested_A = self.count(State.INTERESTED_A)
+        interested_B = self.count(State.INTERESTED_B)
+        for interested, peak, step in (
+            (interested_A, self.peak_meme_A, self.step_meme_A),
+            (interested_B, self.peak_meme_B, self.step_meme_B),
+        ):
+            higher = running & (interested > peak)
+            peak[higher] = interested[higher]
+            step[higher] = self.step_counter[higher]
+        # a replicate stops when no one is actively spreading the meme; it
+        # then has no spreaders left and costs nothing to the next steps
+        self.running_replicates = running & (interested_A + interested_B > 0)
+
+    def run(self, max_steps=100):
+        """
+        Step until every replicate stopped or ``max_steps`` is reached.
+        """
+        while self.running and self.schedule.steps < max_steps:
+            self.step()
+
+    def replicate(self, r):
+        """
+        View of replicate ``r`` usable with the reporters of ``model.py``.
+        """
+        return ReplicateView(self, r)
+
+    def series(self, r, name="Percentage_spread"):
+        """
+        The per-step values of a model variable for replicate ``r``, as
+        ``MemeModel.datacollector`` would have collected them.
+        """
+        values = np.array([row[r] for row in self.model_vars[name]])
+        return values[:self.step_counter[r] + 1].tolist()
+
+    def results(self, model_reporters, variable_parameters=(), parameters=PARAMETERS):
+        """
+        Evaluate reporters on every replicate.
+
+        :param variable_parameters: *list* of *str*, default ()
+            The parameters a BatchRunner would have varied, put first.
+            Without any, the rows are laid out as the FixedBatchRunner
+            table, "Run" last.
+
+        :param parameters: *list* of *str*, default PARAMETERS
+            The other parameters to report, in their column order.
+
+        :return: *list* of *dict*, one row per replicate, its keys in the
+            column order of BatchRunner.
+        """
+        rows = []
+        for r in range(self.replicates):
+            view = self.replicate(r)
+            values = {name: reporter(view) for name, reporter in model_reporters.items()}
+            row = {name: self.parameters[name] for name in variable_parameters}
+            if variable_parameters:
+                row["Run"] = r
+            row.update((name, values[name]) for name in sorted(values))
+            row.update(
+                (name, self.parameters[name]) for name in parameters
+                if name not in variable_parameters
+            )
+            if not variable_parameters:
+                row["Run"] = r + 1
+            rows.append(row)
+        return rows
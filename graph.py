@@ -0,0 +1,138 @@
+"""
+Graph helpers shared by the simulation engines.
+"""
+import numpy as np
+
+
+def partition_sizes(num_nodes, n_groups):
+    """
+    Split the nodes evenly into groups, the odd nodes going to the last one.
+
+    e.g. 100 nodes with 3 groups makes [33, 33, 34].
+    """
+    node_list = [num_nodes // n_groups for _ in range(n_groups)]
+    node_list[-1] += num_nodes - sum(node_list)  # adding odd nodes to last group
+    return node_list
+
+
+def build_csr(num_nodes, edges):
+    """
+    Build a compressed sparse row (CSR) adjacency index from an edge array.
+
+    :param num_nodes: *int*
+        The number of nodes, labelled ``0 .. num_nodes - 1``.
+
+    :param edges: *numpy.ndarray*
+        ``(m, 2)`` array of undirected edges.
+
+    :return: *tuple* of ``(offsets, indices)`` int64 arrays. The neighbours
+        of node ``i`` are ``indices[offsets[i]:offsets[i + 1]]``.
+    """
+    source = np.concatenate([edges[:, 0], edges[:, 1]])
+    target = np.concatenate([edges[:, 1], edges[:, 0]])
+    indices = target[np.argsort(source, kind="stable")].astype(np.int64)
+    offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(source, minlength=num_nodes), out=offsets[1:])
+    return offsets, indices
+
+
+def sample_indices(total, p, rng):
+    """
+    Pick every integer in ``[0, total)`` independently with probability ``p``.
+
+    Uses geometric skipping, drawing the gaps between picks in batches, so
+    the cost is proportional to the number of picks rather than ``total``.
+
+    :return: *numpy.ndarray* of the picked integers, sorted.
+    """
+    if total <= 0 or p <= 0:
+        return np.empty(0, dtype=np.int64)
+    if p >= 1:
+        return np.arange(total, dtype=np.int64)
+    expected = total * p
+    batch = int(expected + 5 * np.sqrt(expected) + 16)
+    picks = []
+    position = -1
+    while True:
+        found = position + np.cumsum(rng.geometric(p, batch))
+        picks.append(found[found < total])
+        if found[-1] >= total:
+            break
+        position = found[-1]
+    return np.concatenate(picks)
+
+
+def triangle_pairs(k):
+    """
+    Map indices of the strict upper triangle to ``(row, column)`` pairs.
+
+    Index ``k`` enumerates the pairs ``r < c`` column by column, so
+    ``k = c * (c - 1) / 2 + r``.
+    """
+    c = ((1 + np.sqrt(1 + 8 * k.astype(np.float64))) // 2).astype(np.int64)
+    # correct the float square root near perfect squares
+    c -= c * (c - 1) // 2 > k
+    c += (c + 1) * c // 2 <= k
+    return k - c * (c - 1) // 2, c
+
+
+def random_partition_edges(sizes, p_in, p_out, rng):
+    """
+    Sample a random partition graph as an edge array in O(n + m).
+
+    Draws the same distribution as ``networkx.random_partition_graph``:
+    nodes of a group are linked with probability ``p_in``, nodes of
+    different groups with probability ``p_out``.
+
+    :param sizes: *list* of *int*
+        The size of each group, groups take consecutive node labels.
+
+    :param p_in: *float*
+        The probability of an edge inside a group.
+
+    :param p_out: *float*
+        The probability of an edge between groups.
+
+    :param rng: *numpy.random.Generator*
+        The source of randomness.
+
+    :return: *numpy.ndarray* ``(m, 2)`` of edges ``(u, v)`` with ``u < v``.
+    """
+    sizes = np.asarray(sizes, dtype=np.int64)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    # pairs inside the groups, the triangles of all groups laid end to end
+    triangles = sizes * (sizes - 1) // 2
+    ends = np.cumsum(triangles)
+    k = sample_indices(int(ends[-1]) if len(ends) else 0, p_in, rng)
+    group = np.searchsorted(ends, k, side="right")
+    r, c = triangle_pairs(k - (ends[group] - triangles[group]))
+    inside = np.column_stack([starts[group] + r, starts[group] + c])
+
+    # pairs between groups, sampled over the whole triangle and kept when
+    # their ends fall in different groups
+    num_nodes = int(sizes.sum())
+    group_of = np.repeat(np.arange(len(sizes)), sizes)
+    r, c = triangle_pairs(sample_indices(num_nodes * (num_nodes - 1) // 2, p_out, rng))
+    between = group_of[r] != group_of[c]
+    outside = np.column_stack([r[between], c[between]])
+
+    return np.concatenate([inside, outside])
+
+
+def expand_neighbors(offsets, indices, nodes):
+    """
+    Gather the neighbours of several nodes at once.
+
+    :param nodes: *numpy.ndarray*
+        The nodes whose neighbours are gathered.
+
+    :return: *tuple* of ``(owner, neighbors)`` arrays where ``owner[k]`` is the
+        position in ``nodes`` of the node adjacent to ``neighbors[k]``.
+        Neighbours of the same node are contiguous and in CSR order.
+    """
+    counts = offsets[nodes + 1] - offsets[nodes]
+    owner = np.repeat(np.arange(len(nodes)), counts)
+    # position of each entry inside its own node's neighbour list
+    local = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, indices[offsets[nodes][owner] + local]
@@ -0,0 +1,58 @@
+/*
+ * Counters and chart of live.LiveMetrics.
+ *
+ * Every frame carries the current counters and one chart point per step
+ * run since the previous frame, as [step, value, value, ...].
+ */
+var LiveMetricsModule = function(series, canvas_width, canvas_height, max_points) {
+
+    var text = $("<p class='lead'></p>")[0];
+    $("#elements").append(text);
+
+    var canvas = $("<canvas width='" + canvas_width + "' height='" + canvas_height + "' " +
+        "style='border:1px dotted'></canvas>")[0];
+    $("#elements").append(canvas);
+
+    var chart = new Chart(canvas.getContext("2d"), {
+        type: "line",
+        data: {
+            labels: [],
+            datasets: series.map(function(s) {
+                return {label: s.Label, borderColor: s.Color, fill: false, pointRadius: 0, data: []};
+            })
+        },
+        options: {
+            responsive: true,
+            animation: false,
+            tooltips: {mode: "index", intersect: false},
+            scales: {xAxes: [{display: true, ticks: {maxTicksLimit: 11}}], yAxes: [{display: true}]}
+        }
+    });
+
+    this.render = function(data) {
+        // the server steps on its own, show its step rather than the
+        // number of frames requested
+        stepDisplay.innerText = data.step;
+        $(text).html(Object.keys(data.counters).map(function(name) {
+            return name + ": " + data.counters[name];
+        }).join("<br>"));
+
+        data.points.forEach(function(point) {
+            chart.data.labels.push(point[0]);
+            chart.data.datasets.forEach(function(dataset, i) { dataset.data.push(point[i + 1]); });
+        });
+        var extra = chart.data.labels.length - max_points;
+        if (extra > 0) {
+            chart.data.labels.splice(0, extra);
+            chart.data.datasets.forEach(function(dataset) { dataset.data.splice(0, extra); });
+        }
+        chart.update();
+    };
+
+    this.reset = function() {
+        $(text).html("");
+        chart.data.labels = [];
+        chart.data.datasets.forEach(function(dataset) { dataset.data = []; });
+        chart.update();
+    };
+};
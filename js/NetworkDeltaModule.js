@@ -0,0 +1,176 @@
+/*
+ * Network view for portrayal.NetworkDeltaModule.
+ *
+ * The server sends a "topology" message once per model, with node
+ * positions, edges, node flags and the lookup tables turning flags into
+ * colours, then "delta" messages with the nodes whose flags changed. In
+ * the collapsed mode it sends "summary" messages instead, one node per
+ * partition group. The graph is drawn on a canvas; tooltips are only
+ * written for the node under the mouse.
+ */
+var NetworkDeltaModule = function(canvas_width, canvas_height, force_layout_below) {
+
+    var canvas = $("<canvas width='" + canvas_width + "' height='" + canvas_height + "' " +
+        "style='border:1px dotted'></canvas>")[0];
+    $("#elements").append(canvas);
+    var context = canvas.getContext("2d");
+
+    var tooltip = d3.select("body").append("div")
+        .attr("class", "tooltip")
+        .style("opacity", 0);
+
+    var transform = d3.zoomIdentity;
+    var graph = null;
+    var scale = Math.min(canvas_width, canvas_height) / 2.2;
+
+    var screenX = function(x) { return transform.applyX(canvas_width / 2 + x * scale); };
+    var screenY = function(y) { return transform.applyY(canvas_height / 2 + y * scale); };
+
+    d3.select(canvas).call(d3.zoom().on("zoom", function() {
+        transform = d3.event.transform;
+        draw();
+    }));
+
+    var nodeColor = function(i) {
+        if (graph.summary) {
+            // most common colour of the group
+            var counts = graph.counts[i];
+            return graph.node_colors[counts.indexOf(Math.max.apply(null, counts))];
+        }
+        return graph.node_colors[graph.color_index[graph.flags[i]]];
+    };
+
+    var nodeSize = function(i) {
+        if (graph.summary) {
+            return 4 + 20 * Math.sqrt(graph.sizes[i] / graph.max_size);
+        }
+        return graph.flags[i] & graph.influencer ? 9 : 5;
+    };
+
+    var draw = function() {
+        if (graph === null) {
+            return;
+        }
+        context.clearRect(0, 0, canvas_width, canvas_height);
+
+        // edges batched by colour, one path each
+        var batches = {};
+        for (var e = 0; e < graph.source.length; e++) {
+            var s = graph.source[e], t = graph.target[e];
+            var color = graph.summary ? "#E8E8E8" : graph.edge_colors[Math.max(
+                graph.edge_rank[graph.flags[s]], graph.edge_rank[graph.flags[t]]
+            )];
+            (batches[color] = batches[color] || []).push(e);
+        }
+        Object.keys(batches).forEach(function(color) {
+            context.beginPath();
+            batches[color].forEach(function(e) {
+                var s = graph.source[e], t = graph.target[e];
+                context.moveTo(screenX(graph.x[s]), screenY(graph.y[s]));
+                context.lineTo(screenX(graph.x[t]), screenY(graph.y[t]));
+            });
+            context.strokeStyle = color;
+            context.lineWidth = graph.summary ? 1 : 2;
+            context.stroke();
+        });
+
+        for (var i = 0; i < graph.x.length; i++) {
+            context.beginPath();
+            context.arc(screenX(graph.x[i]), screenY(graph.y[i]), nodeSize(i) * transform.k, 0, 2 * Math.PI);
+            context.fillStyle = nodeColor(i);
+            context.fill();
+        }
+    };
+
+    var tooltipHtml = function(i) {
+        if (graph.summary) {
+            var lines = ["group: " + i, "nodes: " + graph.sizes[i]];
+            graph.counts[i].forEach(function(count, c) {
+                if (count > 0) {
+                    lines.push("<span style='color:" + graph.node_colors[c] + "'>&#9679;</span> " + count);
+                }
+            });
+            return lines.join("<br>");
+        }
+        var names = graph.state_names
+            .filter(function(entry) { return graph.flags[i] & entry[0]; })
+            .map(function(entry) { return entry[1]; });
+        return "id: " + i + "<br>state: [" + names.join(", ") + "]";
+    };
+
+    d3.select(canvas)
+        .on("mousemove", function() {
+            if (graph === null) {
+                return;
+            }
+            var mouse = d3.mouse(canvas);
+            var x = (transform.invertX(mouse[0]) - canvas_width / 2) / scale;
+            var y = (transform.invertY(mouse[1]) - canvas_height / 2) / scale;
+            var i = graph.quadtree.find(x, y, 10 / scale / transform.k);
+            if (i === undefined) {
+                tooltip.style("opacity", 0);
+                return;
+            }
+            tooltip.html(tooltipHtml(i))
+                .style("opacity", .9)
+                .style("left", (d3.event.pageX) + "px")
+                .style("top", (d3.event.pageY) + "px");
+        })
+        .on("mouseout", function() {
+            tooltip.style("opacity", 0);
+        });
+
+    var indexNodes = function() {
+        graph.quadtree = d3.quadtree()
+            .x(function(i) { return graph.x[i]; })
+            .y(function(i) { return graph.y[i]; })
+            .addAll(d3.range(graph.x.length));
+    };
+
+    var forceLayout = function() {
+        // refine the server layout once, the positions are then kept
+        var nodes = graph.x.map(function(x, i) { return {x: x * scale, y: graph.y[i] * scale}; });
+        var links = graph.source.map(function(s, e) { return {source: s, target: graph.target[e]}; });
+        var simulation = d3.forceSimulation(nodes)
+            .force("charge", d3.forceManyBody().strength(-80).distanceMin(2))
+            .force("link", d3.forceLink(links))
+            .force("center", d3.forceCenter())
+            .stop();
+        for (var i = 0, n = Math.ceil(Math.log(simulation.alphaMin()) / Math.log(1 - simulation.alphaDecay())); i < n; ++i) {
+            simulation.tick();
+        }
+        var extent = d3.max(nodes, function(d) { return Math.max(Math.abs(d.x), Math.abs(d.y)); }) || 1;
+        graph.x = nodes.map(function(d) { return d.x / extent; });
+        graph.y = nodes.map(function(d) { return d.y / extent; });
+    };
+
+    this.render = function(data) {
+        if (data.type === "topology") {
+            graph = data;
+            graph.flags = Uint8Array.from(data.flags);
+            if (graph.x.length < force_layout_below) {
+                forceLayout();
+            }
+            indexNodes();
+        } else if (data.type === "delta") {
+            for (var k = 0; k < data.nodes.length; k++) {
+                graph.flags[data.nodes[k]] = data.flags[k];
+            }
+        } else if (data.type === "summary") {
+            if (data.x !== undefined) {
+                graph = data;
+                graph.summary = true;
+                graph.max_size = Math.max.apply(null, data.sizes);
+                indexNodes();
+            } else {
+                graph.counts = data.counts;
+            }
+        }
+        draw();
+    };
+
+    this.reset = function() {
+        graph = null;
+        context.clearRect(0, 0, canvas_width, canvas_height);
+    };
+};
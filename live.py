@@ -0,0 +1,233 @@
+"""
+Live server mode for long runs.
+
+mesa's ModularServer steps the model once per browser request and renders
+every element after each step, so the browser round trip sets the pace of
+the simulation. LiveServer advances the model in its own loop on the
+server's IOLoop, in slices bounded by ``steps_per_frame`` and
+``frame_budget`` seconds, and answers each browser request with a frame
+holding everything since the previous one. LiveMetrics publishes the state
+counters and one chart point per step, read from the model state counts
+rather than computed by scanning the population.
+
+With ``headless=True`` the network view is left out and only the metrics
+travel over the websocket.
+"""
+import time
+
+import tornado.escape
+import tornado.ioloop
+from mesa.visualization.ModularVisualization import (
+    ModularServer,
+    SocketHandler,
+    VisualizationElement,
+)
+from mesa.visualization.modules import NetworkModule
+
+from model import (
+    number_bored_A,
+    number_bored_B,
+    number_bored_both,
+    number_interest_A,
+    number_interest_B,
+    number_interested_A,
+    number_interested_B,
+    number_interested_both,
+    number_susceptible,
+    percentage_meme_A_spread,
+    percentage_meme_B_spread,
+    percentage_spread,
+)
+from portrayal import NetworkDeltaModule
+
+
+# chart series, in the order and colours of the server chart
+SERIES = {
+    "Susceptible": (number_susceptible, "#3CB043"),
+    "Interested_A": (number_interested_A, "#E3242B"),
+    "Interested_B": (number_interested_B, "#3944BC"),
+    "Interested_both": (number_interested_both, "#710193"),
+    "Bored_A": (number_bored_A, "#4E0707"),
+    "Bored_B": (number_bored_B, "#0A1172"),
+    "Bored_both": (number_bored_both, "#212121"),
+}
+
+
+class LiveMetrics(VisualizationElement):
+    """
+    Counters and chart points of a LiveServer frame.
+
+    ``observe`` records a chart point after every step; ``render`` hands
+    over the points recorded since the previous frame along with the
+    current counters.
+
+    :param max_points: *int*, default 2000
+        The number of points the browser chart keeps.
+    """
+
+    package_includes = ["Chart.min.js"]
+    local_includes = ["js/LiveMetricsModule.js"]
+
+    def __init__(self, canvas_height=200, canvas_width=500, max_points=2000):
+        self.js_code = "elements.push(new LiveMetricsModule({}, {}, {}, {}));".format(
+            tornado.escape.json_encode(
+                [{"Label": label, "Color": color} for label, (_, color) in SERIES.items()]
+            ),
+            canvas_width,
+            canvas_height,
+            max_points,
+        )
+        self._model = None
+        self._points = []
+
+    def observe(self, model):
+        if model is not self._model:
+            self._model = model
+            self._points = []
+        self._points.append(
+            [model.step_counter] + [reporter(model) for reporter, _ in SERIES.values()]
+        )
+
+    def render(self, model):
+        if model is not self._model:
+            self.observe(model)
+        points, self._points = self._points, []
+        return {
+            "step": model.step_counter,
+            "running": model.running,
+            "points": points,
+            "counters": {
+                "Interested A remaining": number_interested_A(model),
+                "Interested B remaining": number_interested_B(model),
+                "Total interest in Meme A": number_interest_A(model),
+                "Total interest in Meme B": number_interest_B(model),
+                "Peak interest in Meme A": "{} | On Step: {}".format(
+                    model.get_peak_meme_A(), model.get_step_peak_meme_A()
+                ),
+                "Peak interest in Meme B": "{} | On Step: {}".format(
+                    model.get_peak_meme_B(), model.get_step_peak_meme_B()
+                ),
+                "Percentage of spread": "{:.2f}%".format(percentage_spread(model) * 100),
+                "Percentage of spread A": "{:.2f}%".format(percentage_meme_A_spread(model) * 100),
+                "Percentage of spread B": "{:.2f}%".format(percentage_meme_B_spread(model) * 100),
+            },
+        }
+
+
+class LiveSocketHandler(SocketHandler):
+    """
+    Websocket of a LiveServer: a step request asks for the next frame and
+    keeps the simulation loop going.
+    """
+
+    def open(self):
+        super().open()
+        self.application.sockets.add(self)
+
+    def on_close(self):
+        self.application.sockets.discard(self)
+
+    def on_message(self, message):
+        msg = tornado.escape.json_decode(message)
+        if msg["type"] != "get_step":
+            return super().on_message(message)
+        application = self.application
+        application.last_request = time.perf_counter()
+        if not application.observed_steps:
+            # nothing ran since the previous frame, e.g. a single step
+            # request on a paused model: run one slice now
+            application.run_slice()
+        if not application.model.running and not application.observed_steps:
+            self.write_message({"type": "end"})
+        else:
+            application.observed_steps = 0
+            self.write_message(self.viz_state_message)
+
+
+class LiveServer(ModularServer):
+    """
+    ModularServer running the model in a loop of its own.
+
+    :param steps_per_frame: *int*, default 10
+        The largest number of steps run in one slice of the loop.
+
+    :param frame_budget: *float*, default 0.05
+        Seconds after which a slice stops stepping, so the server stays
+        responsive on big graphs.
+
+    :param interval: *float*, default 0.01
+        Seconds between two slices.
+
+    :param idle_timeout: *float*, default 1.0
+        The loop pauses when the browser asked for no frame for this long.
+
+    :param headless: *bool*, default False
+        Leave the network view out, only metrics are sent.
+    """
+
+    socket_handler = (r"/ws", LiveSocketHandler)
+    handlers = [
+        ModularServer.page_handler,
+        socket_handler,
+        ModularServer.static_handler,
+        ModularServer.local_handler,
+    ]
+
+    def __init__(
+        self,
+        model_cls,
+        visualization_elements,
+        name="Mesa Model",
+        model_params={},
+        steps_per_frame=10,
+        frame_budget=0.05,
+        interval=0.01,
+        idle_timeout=1.0,
+        headless=False
+    ):
+        if headless:
+            visualization_elements = [
+                element for element in visualization_elements
+                if not isinstance(element, (NetworkModule, NetworkDeltaModule))
+            ]
+        self.steps_per_frame = steps_per_frame
+        self.frame_budget = frame_budget
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.sockets = set()
+        self.last_request = 0.0
+        self.observed_steps = 0
+        super().__init__(model_cls, visualization_elements, name, model_params)
+
+    def reset_model(self):
+        super().reset_model()
+        self.observed_steps = 0
+        self.observe()
+
+    def observe(self):
+        for element in self.visualization_elements:
+            if hasattr(element, "observe"):
+                element.observe(self.model)
+
+    def run_slice(self):
+        """
+        Step the model up to ``steps_per_frame`` times within
+        ``frame_budget`` seconds.
+        """
+        deadline = time.perf_counter() + self.frame_budget
+        for _ in range(self.steps_per_frame):
+            if not self.model.running or self.model.schedule.steps >= self.max_steps:
+                break
+            self.model.step()
+            self.observe()
+            self.observed_steps += 1
+            if time.perf_counter() > deadline:
+                break
+
+    def loop(self):
+        if self.sockets and time.perf_counter() - self.last_request < self.idle_timeout:
+            self.run_slice()
+
+    def launch(self, port=None, open_browser=True):
+        tornado.ioloop.PeriodicCallback(self.loop, self.interval * 1000).start()
+        super().launch(port, open_browser)
@@ -0,0 +1,320 @@
+"""
+Competition between any number of memes.
+
+MemeModel follows exactly two memes, A and B, through the bits of a State
+flag. MultiMemeModel follows ``memes`` of them with one row per meme in
+(memes x nodes) arrays: interest, interested, bored, the two countdowns and
+the spread chances. A step runs the waves of engine.VectorizedEngine, meme
+after meme::
+
+    model = MultiMemeModel(memes=20, num_nodes=10000, n_groups=40, seed=0)
+    while model.running and model.schedule.steps < 100:
+        model.step()
+    model.datacollector.get_model_vars_dataframe()
+
+Reporters are generated per meme (see ``meme_reporters``), labelled A, B,
+..., Z, AA, AB, ... With ``memes=2`` and the same seed the model runs
+exactly like ``MemeModel(engine="vectorized")``.
+"""
+import random
+import string
+from functools import partial
+
+import numpy as np
+
+from cache import GraphCache
+from collector import ModelCollector
+from engine import VectorizedEngine
+from graph import build_csr, partition_sizes, random_partition_edges
+
+
+def meme_label(meme):
+    """Spreadsheet-style label of a meme index: A, ..., Z, AA, AB, ..."""
+    label = ""
+    meme += 1
+    while meme:
+        meme, letter = divmod(meme - 1, 26)
+        label = string.ascii_uppercase[letter] + label
+    return label
+
+
+def per_meme(value, memes):
+    """A parameter given once for all memes or once per meme, as an array."""
+    values = np.asarray(value)
+    if values.ndim and len(values) != memes:
+        raise ValueError("Expected one value per meme ({}), got {}".format(memes, len(values)))
+    return np.broadcast_to(values, (memes,)).copy()
+
+
+#############################
+# FUNCTIONS TO COLLECT DATA #
+#############################
+
+
+def number_interested(model, meme):
+    return int(model.interested_count[meme])
+
+
+def number_bored(model, meme):
+    return int(model.bored_count[meme])
+
+
+def number_interest(model, meme):
+    return int(model.interest_count[meme])
+
+
+def number_peak_meme(model, meme):
+    return int(model.peak_meme[meme])
+
+
+def step_peak_meme(model, meme):
+    return int(model.step_meme[meme])
+
+
+def number_susceptible(model):
+    return model.susceptible_count
+
+
+def number_people_interested(model):
+    return model.num_nodes - model.susceptible_count
+
+
+def percentage_spread(model):
+    return number_people_interested(model) / model.num_nodes
+
+
+def percentage_meme_spread(model, meme):
+    return (
+        number_interested(model, meme) + number_bored(model, meme)
+    ) / number_people_interested(model)
+
+
+def meme_reporters(memes, reporters=None):
+    """
+    Reporters of every meme, named after the reporters of MemeModel.
+
+    :param reporters: *dict*, default None
+        Prefix to per-meme reporter function, e.g.
+        ``{"Bored": number_bored}`` gives ``Bored_A``, ``Bored_B``, ...
+        When None, the ``Percentage_meme`` reporters of the model
+        datacollector.
+
+    :return: *dict* of name to single-argument reporter.
+    """
+    if reporters is None:
+        reporters = {"Percentage_meme": percentage_meme_spread}
+    return {
+        "{}_{}".format(prefix, meme_label(meme)): partial(reporter, meme=meme)
+        for prefix, reporter in reporters.items()
+        for meme in range(memes)
+    }
+
+
+####################################
+# END OF COLLECTING DATA FUNCTIONS #
+####################################
+
+
+class MultiMemeEngine(VectorizedEngine):
+    """
+    VectorizedEngine over (memes x nodes) arrays.
+
+    The memes are numbered from 0 and take their turn in every wave in that
+    order, as A and B do: a node a meme makes bored cannot be reached by the
+    memes after it in the same wave. The waves are those of
+    VectorizedEngine, reading and changing the per-meme rows here instead
+    of State flags.
+
+    :param model: *MultiMemeModel*
+        The model owning the engine.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.steps = 0
+        self.time = 0
+        self.memes = range(model.memes)
+        self.num_nodes = n = len(model.offsets) - 1
+        self.rng = np.random.default_rng(model.random.getrandbits(64))
+        self.offsets, self.indices = model.offsets, model.indices
+
+        memes = model.memes
+        self.interest = np.zeros((memes, n), dtype=bool)
+        self.interested = np.zeros((memes, n), dtype=bool)
+        self.bored = np.zeros((memes, n), dtype=bool)
+        self.bored_any = np.zeros(n, dtype=bool)
+        self.susceptible = np.ones(n, dtype=bool)
+        self.influencer = np.zeros(n, dtype=bool)
+        self.spread_chance = np.empty((memes, n))
+        self.time_before_interested = np.ones((memes, n), dtype=np.int64)
+        self.time_before_bored = np.empty((memes, n), dtype=np.int64)
+        # drawn in the order of VectorizedEngine
+        for meme in self.memes:
+            self.interest[meme] = self.rng.random(n) < model.interest_chance[meme]
+            # the influencer flag does not change the discount, as in MemeModel
+            self.spread_chance[meme] = model.meme_spread_chance[meme] * np.where(
+                self.interest[meme], 0.95, 0.1
+            )
+            self.time_before_bored[meme] = self.rng.integers(2, 4, n)
+
+        self.influencer[self.sample_nodes(model.influencer_appearance)] = True
+        for meme in self.memes:
+            nodes = self.sample_nodes(model.initial_viral_size[meme])
+            self.interested[meme, nodes] = True
+            self.interest[meme, nodes] = True
+            self.susceptible[nodes] = False
+
+    def interested_nodes(self, meme):
+        return np.flatnonzero(self.interested[meme])
+
+    def interested_in(self, meme, nodes):
+        return self.interested[meme, nodes]
+
+    def bored_of_any(self, nodes):
+        return self.bored_any[nodes]
+
+    def boredom_chance(self, meme):
+        return self.model.maybe_bored[meme]
+
+    def set_interested(self, meme, nodes):
+        model = self.model
+        self.interested[meme, nodes] = True
+        model.interested_count[meme] += len(nodes)
+        fresh = nodes[self.susceptible[nodes]]
+        self.susceptible[fresh] = False
+        model.susceptible_count -= len(fresh)
+
+    def set_bored(self, meme, nodes):
+        model = self.model
+        self.interested[meme, nodes] = False
+        self.bored[meme, nodes] = True
+        self.bored_any[nodes] = True
+        model.interested_count[meme] -= len(nodes)
+        model.bored_count[meme] += len(nodes)
+
+
+class MultiMemeModel:
+    """
+    A meme model with any number of competing memes.
+
+    The parameters are those of MemeModel; the per-meme ones take either one
+    value for every meme or a sequence with one value per meme.
+
+    :param memes: *int*, default 2
+        The number of memes.
+
+    :param num_nodes: *int*, default 100
+        The number of nodes that will be simulated in the model.
+
+    :param n_groups: *int*, default 2
+        The number of groups of the partition graph.
+
+    :param p_in: *float*, default 0.08
+        The probability of an edge inside a group.
+
+    :param p_out: *float*, default 0.003
+        The probability of an edge between two groups.
+
+    :param initial_viral_size: *int* or *sequence*, default 5
+        The initial number of nodes interested in each meme.
+
+    :param meme_spread_chance: *float* or *sequence*, default 0.3
+        The base probability of each meme to spread to other nodes.
+
+    :param maybe_bored: *float* or *sequence*, default 0.3
+        The probability of a node to be bored of each meme.
+
+    :param influencer_appearance: *int*, default 1
+        The number of influencer(s).
+
+    :param influencer_spread_chance: *float*, default 0.6
+        Recorded only, as in MemeModel's vectorized engine.
+
+    :param interest_chance: *float* or *sequence*, default 0.5
+        The probability of a node to develop interest in each meme.
+
+    :param graph_seed: *int*, default None
+        The seed of the network alone, as in MemeModel.
+
+    :param graph_cache: *GraphCache* or *str*, default None
+        A cache.GraphCache, or its directory, as in MemeModel.
+
+    :param seed: *int*, default None
+        The seed of the model random number generator.
+    """
+
+    def __init__(
+        self,
+        memes=2,
+        num_nodes=100,
+        n_groups=2,
+        p_in=0.08,
+        p_out=0.003,
+        initial_viral_size=5,
+        meme_spread_chance=0.3,
+        maybe_bored=0.3,
+        influencer_appearance=1,
+        influencer_spread_chance=0.6,
+        interest_chance=0.5,
+        graph_seed=None,
+        graph_cache=None,
+        seed=None
+    ):
+        self.random = random.Random(seed)
+        self.memes = memes
+        self.labels = [meme_label(meme) for meme in range(memes)]
+        self.num_nodes = num_nodes
+        self.group_sizes = partition_sizes(num_nodes, n_groups)
+        self.p_in = p_in
+        self.p_out = p_out
+        self.initial_viral_size = np.minimum(per_meme(initial_viral_size, memes), num_nodes)
+        self.meme_spread_chance = per_meme(meme_spread_chance, memes)
+        self.maybe_bored = per_meme(maybe_bored, memes)
+        self.influencer_appearance = influencer_appearance
+        self.influencer_spread_chance = influencer_spread_chance
+        self.interest_chance = per_meme(interest_chance, memes)
+
+        # drawn in the order of MemeModel, so seeds give the same networks
+        drawn_seed = self.random.getrandbits(64)
+        self.graph_seed = drawn_seed if graph_seed is None else graph_seed
+        if graph_cache is not None:
+            if isinstance(graph_cache, str):
+                graph_cache = GraphCache(graph_cache)
+            self.offsets, self.indices, self.edges = graph_cache.get(
+                num_nodes, n_groups, p_in, p_out, self.graph_seed
+            )
+        else:
+            self.edges = random_partition_edges(
+                self.group_sizes, p_in, p_out, np.random.default_rng(self.graph_seed)
+            )
+            self.offsets, self.indices = build_csr(num_nodes, self.edges)
+
+        self.schedule = MultiMemeEngine(self)
+        engine = self.schedule
+        self.interested_count = engine.interested.sum(axis=1)
+        self.bored_count = np.zeros(memes, dtype=np.int64)
+        self.interest_count = engine.interest.sum(axis=1)
+        self.susceptible_count = int(engine.susceptible.sum())
+
+        self.peak_meme = np.zeros(memes, dtype=np.int64)
+        self.step_meme = np.zeros(memes, dtype=np.int64)
+        self.step_counter = 0
+
+        self.datacollector = ModelCollector(
+            dict({"Percentage_spread": percentage_spread}, **meme_reporters(memes))
+        )
+        self.running = True
+        self.datacollector.collect(self)
+
+    def step(self):
+        self.schedule.step()
+        self.step_counter += 1
+        self.datacollector.collect(self)
+        # recording number of peak interested in every meme
+        interested = self.interested_count
+        higher = interested > self.peak_meme
+        self.peak_meme[higher] = interested[higher]
+        self.step_meme[higher] = self.step_counter
+        # stop condition is when no one is actively spreading a meme
+        if not interested.any():
+            self.running = False
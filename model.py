@@ -1,13 +1,21 @@
-import networkx as nx
+import gc
+import random
 
-from state import State
+import numpy as np
+
+from state import State, StateCounts
 
 from agent import MemeAgent
+from cache import GraphCache
+from collector import ModelCollector
+from engine import VectorizedEngine
+from graph import build_csr, partition_sizes, random_partition_edges
+from scheduler import CalendarActivation, FrontierActivation
+from streams import PythonUniforms, UniformStream, stream_sequence
+from streams import advance, mt19937_of, words_to_uniforms
 
 from mesa import Model
 from mesa.time import RandomActivation
-from mesa.datacollection import DataCollector
-from mesa.space import NetworkGrid
 
 
 #############################
@@ -16,14 +24,15 @@ from mesa.space import NetworkGrid
 
 
 def number_state(model, state):
-    return sum([1 for a in model.grid.get_all_cell_contents() if state in a.state])
+    return model.counts.count_all(state)
 
 
 def number_state_dual(model, state1, state2):
-    return sum([
-        1 for a in model.grid.get_all_cell_contents()
-        if state1 in a.state and state2 in a.state
-    ])
+    return model.counts.count_all(state1, state2)
+
+
+def number_state_any(model, *states):
+    return model.counts.count_any(*states)
 
 
 def number_steps(model):
@@ -87,17 +96,13 @@ def number_interest_both(model):
 
 
 def number_people_interested(model):
-    return sum(
-        [
-            1 for a in model.grid.get_all_cell_contents()
-            if State.BORED_A in a.state or State.BORED_B in a.state
-            or State.INTERESTED_A in a.state or State.INTERESTED_B in a.state
-        ]
+    return number_state_any(
+        model, State.BORED_A, State.BORED_B, State.INTERESTED_A, State.INTERESTED_B
     )
 
 
 def number_actual_nodes(model):
-    return sum([1 for a in model.grid.get_all_cell_contents()])
+    return sum(model.counts.values())
 
 
 def percentage_spread(model):
@@ -105,20 +110,14 @@ def percentage_spread(model):
 
 
 def percentage_meme_A_spread(model):
-    return sum(
-        [
-            1 for a in model.grid.get_all_cell_contents()
-            if State.BORED_A in a.state or State.INTERESTED_A in a.state
-        ]
+    return number_state_any(
+        model, State.BORED_A, State.INTERESTED_A
     ) / number_people_interested(model)
 
 
 def percentage_meme_B_spread(model):
-    return sum(
-        [
-            1 for a in model.grid.get_all_cell_contents()
-            if State.BORED_B in a.state or State.INTERESTED_B in a.state
-        ]
+    return number_state_any(
+        model, State.BORED_B, State.INTERESTED_B
     ) / number_people_interested(model)
 
 
@@ -142,6 +141,12 @@ class MemeModel(Model):
         numbers will be added in the last group.
         e.g. 100 nodes with 3 groups makes [33, 33, 34].
         Range between 2 - 10 with 1 incremental.
+
+    :param p_in: *float*, default 0.08
+        The probability of an edge between two nodes of the same group.
+
+    :param p_out: *float*, default 0.003
+        The probability of an edge between two nodes of different groups.
     
     :param initial_viral_size_A: *int*, default 5
         The initial number of nodes that is interested to Meme A.
@@ -174,13 +179,98 @@ class MemeModel(Model):
     :interest_meme_B_chance: *int*, default 0.5
         The probability of a node to develop interest to Meme B.
         Range between 0 - 1 with 0.1 incremental.
+
+    :param engine: *str*, default "agent"
+        The simulation backend. "agent" steps every MemeAgent through
+        the mesa scheduler, "vectorized" advances all nodes at once
+        with NumPy arrays (see engine.VectorizedEngine), "sharded" splits
+        them between processes along the groups (see
+        sharded.ShardedEngine).
+
+    :param activation: *str*, default "random"
+        How the agent engine activates agents. "random" steps every
+        agent in random order (mesa RandomActivation), "frontier" only
+        steps the agents interested in a meme (see
+        scheduler.FrontierActivation), with the same distribution of
+        outcomes. "calendar" also schedules boredom as events instead of
+        polling the countdowns, and skips the agents with nobody left to
+        spread to (see scheduler.CalendarActivation).
+
+    :param graph_seed: *int*, default None
+        The seed of the network alone. When None it is drawn from the
+        model random number generator, so each seed makes its own network.
+        With a fixed graph_seed every run reuses the same network while the
+        model seed still re-randomises interests, influencers and the
+        initially interested nodes.
+
+    :param graph_cache: *GraphCache* or *str*, default None
+        A cache.GraphCache, or its directory, to load the network from
+        memory-mapped arrays instead of generating it when it was
+        generated before with the same parameters and graph seed.
+
+    :param rng: *str*, default "python"
+        Where the agent engine draws the numbers deciding spreading and
+        boredom. "python" draws them one at a time from the model
+        random.Random, "numpy" in blocks from a NumPy Generator seeded
+        from ``seed`` (see streams.UniformStream). The vectorized engine
+        always draws in bulk.
+
+    :param shards: *int*, default None
+        The number of processes of the sharded engine, all cores when
+        None.
+
+    :param collect_every: *int*, default 1
+        Collect the datacollector reporters on every ``collect_every``-th
+        step, from step 0, and on the step the run stops. With 0 they are
+        only collected when the run stops, or when ``collect`` is called,
+        e.g. by a SweepRunner at ``max_steps``: runs that only need their
+        final reporters pay nothing per step. ``collection_steps`` holds
+        the step of every collected row.
+
+    :param collect_reporters: *list* of *str*, default None
+        The names of ``MODEL_REPORTERS`` the datacollector collects, all of
+        them when None.
+
+    :param seed: *int*, default None
+        The seed of the model random number generator.
+
+    :param debug: *bool*, default False
+        Cross-check the state counts behind the reporters against a
+        full scan of the population after every step.
+
+    :param profile: *bool* or *StepProfiler*, default False
+        Record the time of every phase of a step and count the hot-path
+        operations in ``self.profiler`` (see profiling.StepProfiler).
     
     """
 
+    ENGINES = ("agent", "vectorized", "sharded")
+
+    # the reporters the datacollector can collect every step, by name
+    MODEL_REPORTERS = {
+        # "Susceptible": number_susceptible,
+        # "Interested_A": number_interested_A,
+        # "Interested_B": number_interested_B,
+        # "Interested_both": number_interested_both,
+        # "Bored_A": number_bored_A,
+        # "Bored_B": number_bored_B,
+        # "Bored_both": number_bored_both,
+        # "Interest_A": number_interest_A,
+        # "Interest_B": number_interest_B,
+        # "Interest_both": number_interest_both
+        "Percentage_spread": percentage_spread,
+        "Percentage_meme_A": percentage_meme_A_spread,
+        "Percentage_meme_B": percentage_meme_B_spread,
+    }
+    ACTIVATIONS = ("random", "frontier", "calendar")
+    RNGS = ("python", "numpy")
+
     def __init__(
         self,
         num_nodes=100,
         n_groups=2,
+        p_in=0.08,
+        p_out=0.003,
         initial_viral_size_A=5,
         initial_viral_size_B=5,
         meme_spread_chance=0.3,
@@ -188,17 +278,97 @@ class MemeModel(Model):
         influencer_appearance=1,
         influencer_spread_chance=0.6,
         interest_meme_A_chance=0.5,
-        interest_meme_B_chance=0.5
+        interest_meme_B_chance=0.5,
+        engine="agent",
+        activation="random",
+        graph_seed=None,
+        graph_cache=None,
+        rng="python",
+        shards=None,
+        collect_every=1,
+        collect_reporters=None,
+        seed=None,
+        debug=False,
+        profile=False
     ) -> None:
+        if engine not in self.ENGINES:
+            raise ValueError(
+                "Unknown engine {!r}, expected one of {}".format(engine, self.ENGINES)
+            )
+        if activation not in self.ACTIVATIONS:
+            raise ValueError(
+                "Unknown activation {!r}, expected one of {}".format(
+                    activation, self.ACTIVATIONS
+                )
+            )
+        if rng not in self.RNGS:
+            raise ValueError(
+                "Unknown rng {!r}, expected one of {}".format(rng, self.RNGS)
+            )
+        unknown = set(collect_reporters or ()) - set(self.MODEL_REPORTERS)
+        if unknown:
+            raise ValueError(
+                "Unknown reporters {}, expected some of {}".format(
+                    sorted(unknown), list(self.MODEL_REPORTERS)
+                )
+            )
+        # mesa seeds a generator on the class, shared by every model alive;
+        # each model gets its own so models can run side by side
+        self.random = random.Random(seed)
+        self.rng = rng
+        self.uniforms = self.make_uniforms(seed)
+        # constructor arguments, kept for snapshots
+        self.parameters = {
+            "num_nodes": num_nodes,
+            "n_groups": n_groups,
+            "p_in": p_in,
+            "p_out": p_out,
+            "initial_viral_size_A": initial_viral_size_A,
+            "initial_viral_size_B": initial_viral_size_B,
+            "meme_spread_chance": meme_spread_chance,
+            "maybe_bored": maybe_bored,
+            "influencer_appearance": influencer_appearance,
+            "influencer_spread_chance": influencer_spread_chance,
+            "interest_meme_A_chance": interest_meme_A_chance,
+            "interest_meme_B_chance": interest_meme_B_chance,
+            "engine": engine,
+            "activation": activation,
+            "graph_seed": graph_seed,
+            "rng": rng,
+            "shards": shards,
+            "collect_every": collect_every,
+            "collect_reporters": collect_reporters,
+            "seed": seed,
+        }
         # init model variables
+        self.engine = engine
+        self.activation = activation
+        self.debug = debug
         self.num_nodes = num_nodes
-        node_list = [num_nodes // n_groups for _ in range(n_groups)]
-        node_list[-1] += num_nodes - sum(node_list)  # adding odd nodes to last group
-        p_in = 0.08
-        p_out = 0.003
-        self.G = nx.random_partition_graph(node_list, p_in, p_out)
-        self.grid = NetworkGrid(self.G)
-        self.schedule = RandomActivation(self)
+        node_list = partition_sizes(num_nodes, n_groups)
+        self.group_sizes = node_list
+        self.p_in = p_in
+        self.p_out = p_out
+        # always drawn, so a fixed graph seed leaves the rest of the run
+        # with the same random stream
+        drawn_seed = self.random.getrandbits(64)
+        self.graph_seed = drawn_seed if graph_seed is None else graph_seed
+        # CSR adjacency index, the neighbours of node i are
+        # indices[offsets[i]:offsets[i + 1]]
+        if graph_cache is not None:
+            if isinstance(graph_cache, str):
+                graph_cache = GraphCache(graph_cache)
+            self.offsets, self.indices, self.edges = graph_cache.get(
+                num_nodes, n_groups, p_in, p_out, self.graph_seed
+            )
+        else:
+            self.edges = random_partition_edges(
+                node_list, p_in, p_out, np.random.default_rng(self.graph_seed)
+            )
+            self.offsets, self.indices = build_csr(num_nodes, self.edges)
+        # networkx graph and grid, only built for the visualization server
+        self._G = None
+        self._grid = None
         self.initial_viral_size_A = (
             initial_viral_size_A if initial_viral_size_A <= num_nodes else num_nodes
         )
@@ -210,23 +380,13 @@ class MemeModel(Model):
         self.influencer_appearance = influencer_appearance
         self.influencer_spread_chance = influencer_spread_chance
 
-        self.datacollector = DataCollector(
-            {
-                # "Susceptible": number_susceptible,
-                # "Interested_A": number_interested_A,
-                # "Interested_B": number_interested_B,
-                # "Interested_both": number_interested_both,
-                # "Bored_A": number_bored_A,
-                # "Bored_B": number_bored_B,
-                # "Bored_both": number_bored_both,
-                # "Interest_A": number_interest_A,
-                # "Interest_B": number_interest_B,
-                # "Interest_both": number_interest_both
-                "Percentage_spread": percentage_spread,
-                "Percentage_meme_A": percentage_meme_A_spread,
-                "Percentage_meme_B": percentage_meme_B_spread
-            }
+        self.collect_every = collect_every
+        self.collect_reporters = list(collect_reporters or self.MODEL_REPORTERS)
+        self.datacollector = ModelCollector(
+            {name: self.MODEL_REPORTERS[name] for name in self.collect_reporters}
         )
+        # the step_counter of every row of the datacollector
+        self.collection_steps = []
 
         # probability used in determining user interest
         # TODO: make parameterised
@@ -240,77 +400,629 @@ class MemeModel(Model):
         self.step_meme_A = 0
         self.step_meme_B = 0
 
-        # create agents
-        for i, node in enumerate(self.G.nodes()):
-            state = {State.SUSCEPTIBLE}
-            # we determine the discount value for each agent interest
-            if self.random.random() < self.interest_meme_A_chance:
-                interest_A = 0.95
-                state.add(State.INTEREST_A)
+        # number of nodes per state, updated on every state transition
+        self.counts = StateCounts()
+        if self.engine == "vectorized":
+            self.schedule = VectorizedEngine(self)
+        elif self.engine == "sharded":
+            from sharded import ShardedEngine
+
+            self.schedule = ShardedEngine(self, shards)
+        else:
+            if self.activation == "frontier":
+                self.schedule = FrontierActivation(self)
+            elif self.activation == "calendar":
+                self.schedule = CalendarActivation(self)
             else:
-                interest_A = 0.1
-            if self.random.random() < self.interest_meme_B_chance:
-                interest_B = 0.95
-                state.add(State.INTEREST_B)
-            else:
-                interest_B = 0.1
-            a = MemeAgent(
-                    i,
-                    self,
-                    state,
-                    self.meme_spread_chance,
-                    self.maybe_bored,
-                    interest_A,
-                    interest_B,
-                    self.influencer_spread_chance
-                )
-            self.schedule.add(a)
-            # add the agent to the node
-            self.grid.place_agent(a, node)
+                self.schedule = RandomActivation(self)
+            self.create_agents()
+            if self.activation != "random":
+                self.schedule.reset_frontier()
+        self.counts = self.scan_counts()
+
+        self.running = True
+        if self.collect_every:
+            self.collect()
+
+        self.profiler = None
+        if profile:
+            self.enable_profiling(None if profile is True else profile)
+
+    def enable_profiling(self, profiler=None):
+        """
+        Start profiling the steps of the model.
+
+        :param profiler: *StepProfiler*, default None
+            The profiler to attach, a new one when None.
+
+        :return: *StepProfiler*
+        """
+        from profiling import StepProfiler
+
+        return (profiler or StepProfiler()).attach(self)
+
+    def disable_profiling(self):
+        if self.profiler is not None:
+            self.profiler.detach()
+
+    def make_uniforms(self, seed):
+        """
+        The source of the spread and boredom numbers of the agents.
+        """
+        if self.rng == "numpy":
+            return UniformStream(stream_sequence(seed))
+        return PythonUniforms(self)
+
+    def expected_draws(self):
+        """
+        The most spread and boredom numbers the agents can draw in the
+        next step: the total degree of the interested agents plus one
+        boredom check each, per meme.
+        """
+        schedule = self.schedule
+        if hasattr(schedule, "frontier"):
+            if not schedule.frontier:
+                return 0
+            nodes = np.fromiter(schedule.frontier, dtype=np.int64, count=len(schedule.frontier))
+            return 2 * int((self.degrees[nodes] + 1).sum())
+        interested = self.counts.count_any(State.INTERESTED_A, State.INTERESTED_B)
+        return int(2 * interested * (len(self.indices) / max(self.num_nodes, 1) + 1))
+
+    def create_agents(self):
+        """
+        Create one MemeAgent per node for the agent engine.
+        """
+        uniform_A, uniform_B, bored_A, bored_B = self.draw_agent_numbers()
+        # we determine the discount value for each agent interest
+        interest_A = uniform_A < self.interest_meme_A_chance
+        interest_B = uniform_B < self.interest_meme_B_chance
+        # kept apart from the INTEREST flags, which the initial viral nodes
+        # get without the discount
+        self.has_interest = {State.INTERESTED_A: interest_A, State.INTERESTED_B: interest_B}
+        flags = (
+            int(State.SUSCEPTIBLE)
+            | np.where(interest_A, int(State.INTEREST_A), 0)
+            | np.where(interest_B, int(State.INTEREST_B), 0)
+        )
+        # no agent is an influencer yet, they all get the ordinary chances;
+        # the cyclic collector would scan the agents again and again while
+        # they are being created
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            self.node_agents = MemeAgent.bulk(
+                self,
+                flags.tolist(),
+                (self.meme_spread_chance * np.where(interest_A, 0.95, 0.1)).tolist(),
+                (self.meme_spread_chance * np.where(interest_B, 0.95, 0.1)).tolist(),
+                bored_A.tolist(),
+                bored_B.tolist(),
+            )
+        finally:
+            if collecting:
+                gc.enable()
+        add = self.schedule.add
+        for a in self.node_agents:
+            add(a)
+
+        # neighbour agents laid out along the CSR index, so spreading walks
+        # a list slice instead of going through a graph adjacency
+        self.neighbor_offsets = self.offsets.tolist()
+        self.neighbor_agents = [self.node_agents[node] for node in self.indices.tolist()]
+        self.degrees = np.diff(self.offsets)
 
         # initiate influencer in the nodes
         # TODO: find a way to sample nodes with certain edges
-        influencer_nodes = self.random.sample(self.G.nodes(), self.influencer_appearance)
-        influencers = self.grid.get_cell_list_contents(influencer_nodes)
-        for inf in influencers:
-            inf.state.add(State.INFLUENCER)
+        nodes = range(self.num_nodes)
+        for node in self.random.sample(nodes, self.influencer_appearance):
+            self.node_agents[node].flags |= int(State.INFLUENCER)
 
         # some nodes are already interested in a meme depending on viral size
-        interested_nodes_A = self.random.sample(self.G.nodes(), self.initial_viral_size_A)
-        agents_A = self.grid.get_cell_list_contents(interested_nodes_A)
-        interested_nodes_B = self.random.sample(self.G.nodes(), self.initial_viral_size_B)
-        agents_B = self.grid.get_cell_list_contents(interested_nodes_B)
-        for aa in agents_A:
-            aa.state.add(State.INTERESTED_A)
-            if State.INTEREST_A not in aa.state:
-                aa.state.add(State.INTEREST_A)
-            if State.SUSCEPTIBLE in aa.state:
-                aa.state.remove(State.SUSCEPTIBLE)
-        for ab in agents_B:
-            ab.state.add(State.INTERESTED_B)
-            if State.INTEREST_B not in ab.state:
-                ab.state.add(State.INTEREST_B)
-            if State.SUSCEPTIBLE in ab.state:
-                ab.state.remove(State.SUSCEPTIBLE)
-
-        self.running = True
-        self.datacollector.collect(self)
+        interested_nodes_A = self.random.sample(nodes, self.initial_viral_size_A)
+        interested_nodes_B = self.random.sample(nodes, self.initial_viral_size_B)
+        for node in interested_nodes_A:
+            aa = self.node_agents[node]
+            aa.flags = int((aa.flags & ~State.SUSCEPTIBLE) | State.INTERESTED_A | State.INTEREST_A)
+        for node in interested_nodes_B:
+            ab = self.node_agents[node]
+            ab.flags = int((ab.flags & ~State.SUSCEPTIBLE) | State.INTERESTED_B | State.INTEREST_B)
+
+    def draw_agent_numbers(self, chunk=1 << 16):
+        """
+        The numbers the agents of ``create_agents`` draw from
+        ``self.random``, decoded in bulk.
+
+        Node after node, the agents used to draw ``random()`` for their
+        interest in A and B, then ``randrange(1, 2)`` twice and
+        ``randrange(2, 4)`` twice for their countdowns. That is two words
+        per float, then one word per randrange attempt until one has its
+        top bit clear: the 4th such word after the floats ends the node,
+        and bit 30 of the 3rd and 4th gives the boredom countdowns. The
+        words are read ahead ``chunk`` nodes at a time and ``self.random``
+        is left past the last one used, exactly as the single draws would.
+
+        :return: *tuple* of ``(uniform_A, uniform_B, bored_A, bored_B)``
+            arrays, one value per node.
+        """
+        n = self.num_nodes
+        bit_generator = mt19937_of(self.random)
+        words = np.empty(0, dtype=np.uint64)
+        # the stream position of words[0]
+        base = 0
+        done, parts = 0, []
+        while done < n:
+            # about 12 words per node, with some room
+            words = np.concatenate([words, bit_generator.random_raw(14 * chunk + 64)])
+            top_clear = words < 1 << 31
+            accepted = np.flatnonzero(top_clear)
+            # the accepted words before every position
+            rank = np.concatenate(([0], np.cumsum(top_clear)))
+            # start of the next node, for a node starting at every position
+            # whose words are all read, -1 otherwise
+            after = rank[4:] + 3
+            following = np.full(len(words) + 1, -1, dtype=np.int64)
+            whole = after < len(accepted)
+            following[:len(after)][whole] = accepted[after[whole]] + 1
+
+            # the one sequential part: hop from node to node
+            local = []
+            append = local.append
+            position = 0
+            for _ in range(n - done):
+                start = following[position]
+                if start < 0:
+                    break
+                append(position)
+                position = start
+            position = int(position)
+            local = np.array(local, dtype=np.int64)
+            last = accepted[rank[local + 4] + 3] if len(local) else local
+            parts.append((
+                words_to_uniforms(words[local], words[local + 1]),
+                words_to_uniforms(words[local + 2], words[local + 3]),
+                2 + ((words[accepted[rank[local + 4] + 2]] >> 30) & 1).astype(np.int64),
+                2 + ((words[last] >> 30) & 1).astype(np.int64),
+            ))
+            done += len(local)
+            words = words[position:]
+            base += position
+        advance(self.random, base)
+        if not parts:
+            return tuple(np.empty(0) for _ in range(4))
+        return tuple(np.concatenate(values) for values in zip(*parts))
+
+    @property
+    def G(self):
+        """
+        The network as a networkx graph, built on first use.
+        """
+        if self._G is None:
+            self._build_graph()
+        return self._G
+
+    @property
+    def grid(self):
+        """
+        mesa NetworkGrid over ``G``, built on first use.
+        """
+        if self._G is None:
+            self._build_graph()
+        return self._grid
+
+    def _build_graph(self):
+        # with the agent engine every node holds its agent, as placed by
+        # mesa's NetworkGrid, which is what the visualization server draws
+        import networkx as nx
+        from mesa.space import NetworkGrid
+
+        self._G = nx.Graph()
+        self._G.add_nodes_from(range(self.num_nodes))
+        self._G.add_edges_from(self.edges.tolist())
+        self._grid = NetworkGrid(self._G)
+        if self.engine == "agent":
+            for agent in self.node_agents:
+                self._grid.place_agent(agent, agent.pos)
 
     def step(self):
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start_step()
+        if self.rng == "numpy" and self.engine == "agent":
+            self.uniforms.reserve(self.expected_draws())
         self.schedule.step()
         self.step_counter += 1
-        # collect data
-        self.datacollector.collect(self)
+        if profiler is not None:
+            profiler.lap("schedule")
+        if self.debug:
+            self.check_counts()
+            if profiler is not None:
+                profiler.restart()
         # recording number of peak interested in a meme with step n
-        if number_interested_A(self) > self.peak_meme_A:
-            self.peak_meme_A = number_interested_A(self)
+        interested_A = number_interested_A(self)
+        interested_B = number_interested_B(self)
+        if interested_A > self.peak_meme_A:
+            self.peak_meme_A = interested_A
             self.step_meme_A = self.step_counter
-        if number_interested_B(self) > self.peak_meme_B:
-            self.peak_meme_B = number_interested_B(self)
+        if interested_B > self.peak_meme_B:
+            self.peak_meme_B = interested_B
             self.step_meme_B = self.step_counter
         # stop condition is when no one is actively spreading the meme
-        if number_interested_A(self) + number_interested_B(self) == 0:
+        if interested_A + interested_B == 0:
             self.running = False
+        if profiler is not None:
+            profiler.lap("peaks")
+        # collect data, on the steps of the collection policy and at the end
+        every = self.collect_every
+        if not self.running or (every and self.step_counter % every == 0):
+            self.collect()
+        if profiler is not None:
+            profiler.lap("collect")
+            profiler.end_step()
+
+    def collect(self):
+        """
+        Collect the datacollector reporters for the current step, unless
+        they were already collected on it.
+        """
+        if self.collection_steps and self.collection_steps[-1] == self.step_counter:
+            return
+        self.datacollector.collect(self)
+        self.collection_steps.append(self.step_counter)
+
+    def state_changed(self, agent, old, new):
+        """
+        Keep the state counts and the frontier in sync with an agent
+        changing state from ``old`` to ``new`` flags.
+        """
+        self.counts.move(old, new)
+        if self.activation != "random":
+            self.schedule.state_changed(agent, old, new)
+
+    def scan_counts(self):
+        """
+        Count the nodes per state with a full scan of the population.
+        """
+        if self.engine != "agent":
+            return self.schedule.scan_counts()
+        return StateCounts(a.flags for a in self.node_agents)
+
+    def check_counts(self):
+        """
+        Make sure the maintained state counts, and the frontier and
+        calendar of the frontier and calendar activations, match a full
+        scan.
+        """
+        expected = {flags: n for flags, n in self.scan_counts().items() if n}
+        actual = {flags: n for flags, n in self.counts.items() if n}
+        if actual != expected:
+            raise RuntimeError(
+                "State counts out of sync on step {}: {} != {}".format(
+                    self.step_counter, actual, expected
+                )
+            )
+        if self.activation == "frontier":
+            interested = {
+                a.unique_id for a in self.schedule.agents
+                if a.flags & (State.INTERESTED_A | State.INTERESTED_B)
+            }
+            if set(self.schedule.frontier) != interested:
+                raise RuntimeError(
+                    "Frontier out of sync on step {}".format(self.step_counter)
+                )
+        if self.activation == "calendar":
+            schedule = self.schedule
+            pending = {}
+            for due in schedule.calendar.values():
+                for uid, memes in due.items():
+                    pending[uid] = pending.get(uid, 0) | memes
+            for a in self.node_agents:
+                uid = a.unique_id
+                interested = a.flags & (State.INTERESTED_A | State.INTERESTED_B)
+                spreading = schedule.spreading.get(uid, 0)
+                waiting = interested
+                if a.maybe_bored_A <= 0:
+                    waiting &= ~State.INTERESTED_A
+                if a.maybe_bored_B <= 0:
+                    waiting &= ~State.INTERESTED_B
+                if (
+                    spreading & ~interested
+                    or (uid in schedule.frontier) != bool(spreading)
+                    or waiting & ~pending.get(uid, 0)
+                ):
+                    raise RuntimeError(
+                        "Calendar out of sync for agent {} on step {}".format(
+                            uid, self.step_counter
+                        )
+                    )
+
+    def snapshot(self):
+        """
+        Capture the simulation state in plain values and NumPy arrays.
+
+        The snapshot holds the parameters, the network as an edge array,
+        the state flags, spread chances, interest discounts and countdown
+        timers of every node, the peak trackers, the step counters, the
+        random number generator states and the collected model variables,
+        at a few bytes per node.
+        It can be pickled and sent to worker processes, where
+        ``MemeModel.from_snapshot`` resumes it; a SweepRunner can branch a
+        run this way with
+        ``functools.partial(MemeModel.from_snapshot, snapshot)`` as model
+        class, the swept parameters and run seeds becoming overrides.
+
+        :return: *dict*
+        """
+        if self.engine == "sharded":
+            raise ValueError("Cannot snapshot a model with the sharded engine")
+        # node labels fit in 32 bits for any network this model can hold
+        label = np.int32 if self.num_nodes < 2 ** 31 else np.int64
+        snapshot = {
+            "parameters": dict(self.parameters),
+            "edges": np.asarray(self.edges, dtype=label),
+            "random": self.random.getstate(),
+            "uniforms": self.uniforms.getstate() if self.rng == "numpy" else None,
+            "running": self.running,
+            "steps": self.schedule.steps,
+            "step_counter": self.step_counter,
+            "peaks": (self.peak_meme_A, self.peak_meme_B, self.step_meme_A, self.step_meme_B),
+            "model_vars": {
+                name: np.array(values, dtype=np.float64)
+                for name, values in self.datacollector.model_vars.items()
+            },
+            "collection_steps": np.array(self.collection_steps, dtype=np.int64),
+        }
+        if self.engine == "vectorized":
+            engine = self.schedule
+            snapshot["rng"] = engine.rng.bit_generator.state
+            snapshot["flags"] = engine.state.copy()
+            for meme, name in ((State.INTERESTED_A, "A"), (State.INTERESTED_B, "B")):
+                snapshot["spread_chance_" + name] = engine.spread_chance[meme].copy()
+                snapshot["has_interest_" + name] = engine.has_interest[meme].copy()
+                snapshot["interested_timer_" + name] = engine.time_before_interested[meme].astype(np.int8)
+                snapshot["bored_timer_" + name] = engine.time_before_bored[meme].astype(np.int8)
+            return snapshot
+        agents = self.node_agents
+        snapshot["flags"] = np.array([a.flags for a in agents], dtype=np.uint8)
+        for meme, name in ((State.INTERESTED_A, "A"), (State.INTERESTED_B, "B")):
+            snapshot["spread_chance_" + name] = np.array(
+                [getattr(a, "meme_{}_spread_chance".format(name)) for a in agents]
+            )
+            snapshot["has_interest_" + name] = self.has_interest[meme].copy()
+            snapshot["interested_timer_" + name] = np.array(
+                [getattr(a, "TIME_BEFORE_INTERESTED_" + name) for a in agents], dtype=np.int8
+            )
+            snapshot["bored_timer_" + name] = np.array(
+                [getattr(a, "TIME_BEFORE_BORED_" + name) for a in agents], dtype=np.int8
+            )
+        if self.activation != "random":
+            # the frontier order decides the order turns are drawn in
+            snapshot["frontier"] = np.array(list(self.schedule.frontier), dtype=label)
+        if self.activation == "calendar":
+            schedule = self.schedule
+            snapshot["spreading"] = np.array(list(schedule.spreading.items()), dtype=label).reshape(-1, 2)
+            snapshot["calendar"] = np.array([
+                (step, uid, memes)
+                for step, due in schedule.calendar.items() for uid, memes in due.items()
+            ], dtype=np.int64).reshape(-1, 3)
+            snapshot["draws_from"] = np.array([
+                (uid, meme, start) for (uid, meme), start in schedule.draws_from.items()
+            ], dtype=np.int64).reshape(-1, 3)
+        return snapshot
+
+    def restore(self, snapshot):
+        """
+        Bring the model back to the state captured by ``snapshot``.
+
+        The model must have the engine, activation, rng and number of nodes of
+        the snapshot.
+        """
+        parameters = snapshot["parameters"]
+        for name in ("engine", "activation", "rng", "num_nodes"):
+            value = parameters[name]
+            if value != getattr(self, name):
+                raise ValueError(
+                    "Cannot restore a snapshot with {} {!r} into a model with {!r}".format(
+                        name, value, getattr(self, name)
+                    )
+                )
+        self.parameters = dict(parameters)
+        self.group_sizes = partition_sizes(self.num_nodes, parameters["n_groups"])
+        self.p_in = parameters["p_in"]
+        self.p_out = parameters["p_out"]
+        self.graph_seed = parameters["graph_seed"]
+        self.initial_viral_size_A = min(parameters["initial_viral_size_A"], self.num_nodes)
+        self.initial_viral_size_B = min(parameters["initial_viral_size_B"], self.num_nodes)
+        for name in (
+            "meme_spread_chance",
+            "maybe_bored",
+            "influencer_appearance",
+            "influencer_spread_chance",
+            "interest_meme_A_chance",
+            "interest_meme_B_chance",
+        ):
+            setattr(self, name, parameters[name])
+
+        self.edges = np.asarray(snapshot["edges"], dtype=np.int64)
+        self.offsets, self.indices = build_csr(self.num_nodes, self.edges)
+        self._G = None
+        self._grid = None
+
+        self.random.setstate(snapshot["random"])
+        if self.rng == "numpy":
+            self.uniforms.setstate(snapshot["uniforms"])
+        self.running = snapshot["running"]
+        self.schedule.steps = self.schedule.time = snapshot["steps"]
+        self.step_counter = snapshot["step_counter"]
+        self.peak_meme_A, self.peak_meme_B, self.step_meme_A, self.step_meme_B = snapshot["peaks"]
+        self.datacollector.model_vars = {
+            name: values.tolist() for name, values in snapshot["model_vars"].items()
+        }
+        self.collection_steps = snapshot["collection_steps"].tolist()
+
+        if self.engine == "vectorized":
+            engine = self.schedule
+            engine.offsets, engine.indices = self.offsets, self.indices
+            engine.rng.bit_generator.state = snapshot["rng"]
+            engine.state = snapshot["flags"].copy()
+            for meme, name in ((State.INTERESTED_A, "A"), (State.INTERESTED_B, "B")):
+                engine.spread_chance[meme] = snapshot["spread_chance_" + name].copy()
+                engine.has_interest[meme] = snapshot["has_interest_" + name].copy()
+                engine.time_before_interested[meme] = snapshot["interested_timer_" + name].astype(np.int64)
+                engine.time_before_bored[meme] = snapshot["bored_timer_" + name].astype(np.int64)
+        else:
+            self.neighbor_offsets = self.offsets.tolist()
+            self.neighbor_agents = [self.node_agents[node] for node in self.indices.tolist()]
+            self.degrees = np.diff(self.offsets)
+            self.has_interest = {
+                State.INTERESTED_A: snapshot["has_interest_A"].copy(),
+                State.INTERESTED_B: snapshot["has_interest_B"].copy(),
+            }
+            columns = [snapshot["flags"].tolist()]
+            for name in ("A", "B"):
+                columns += [
+                    snapshot["spread_chance_" + name].tolist(),
+                    snapshot["interested_timer_" + name].tolist(),
+                    snapshot["bored_timer_" + name].tolist(),
+                ]
+            for a, (flags, spread_A, interested_A, bored_A, spread_B, interested_B, bored_B) in zip(
+                self.node_agents, zip(*columns)
+            ):
+                a.flags = flags
+                a.meme_A_spread_chance = spread_A
+                a.meme_B_spread_chance = spread_B
+                a.maybe_bored_A = a.maybe_bored_B = self.maybe_bored
+                a.TIME_BEFORE_INTERESTED_A = interested_A
+                a.TIME_BEFORE_INTERESTED_B = interested_B
+                a.TIME_BEFORE_BORED_A = bored_A
+                a.TIME_BEFORE_BORED_B = bored_B
+            if self.activation != "random":
+                self.schedule.frontier = dict.fromkeys(snapshot["frontier"].tolist())
+            if self.activation == "calendar":
+                self.schedule.spreading = dict(snapshot["spreading"].tolist())
+                self.schedule.calendar = {}
+                for step, uid, memes in snapshot["calendar"].tolist():
+                    self.schedule.calendar.setdefault(step, {})[uid] = memes
+                self.schedule.draws_from = {
+                    (uid, meme): start for uid, meme, start in snapshot["draws_from"].tolist()
+                }
+        self.counts = self.scan_counts()
+
+    @classmethod
+    def from_snapshot(cls, snapshot, **overrides):
+        """
+        A new model resumed from ``snapshot``, with ``overrides`` applied
+        through ``update_parameters``.
+        """
+        parameters = dict(snapshot["parameters"], p_in=0, p_out=0)
+        model = cls(**parameters)
+        model.restore(snapshot)
+        if overrides:
+            model.update_parameters(**overrides)
+        return model
+
+    def fork(self, **overrides):
+        """
+        A copy of the model in its current state, going on independently,
+        with ``overrides`` applied through ``update_parameters``.
+
+        e.g. ``model.fork(maybe_bored=0.5, seed=1)``
+        """
+        return self.from_snapshot(self.snapshot(), **overrides)
+
+    def update_parameters(self, **overrides):
+        """
+        Change parameters of a model in the middle of a run.
+
+        :param maybe_bored: *float*
+            The new probability of every node to be bored of a meme.
+
+        :param meme_spread_chance: *float*
+            The new base spread chance, every node keeping its interest
+            discount.
+
+        :param influencer_appearance: *int*
+            Add or remove influencers at random until there are this many.
+            As at construction, the influencer flag does not change the
+            spread chances.
+
+        :param influencer_spread_chance: *float*
+            Recorded only, as at construction.
+
+        :param seed: *int*
+            Reseed the random number generators, so that forks of the same
+            snapshot go on differently.
+        """
+        unknown = set(overrides) - {
+            "maybe_bored",
+            "meme_spread_chance",
+            "influencer_appearance",
+            "influencer_spread_chance",
+            "seed",
+        }
+        if unknown:
+            raise ValueError(
+                "Cannot change {} in a running model".format(", ".join(sorted(unknown)))
+            )
+        if self.engine == "sharded":
+            # the shard processes hold their own copies of the parameters
+            raise ValueError("Cannot change the parameters of a model with the sharded engine")
+        self.parameters.update(overrides)
+        vectorized = self.engine == "vectorized"
+        if "seed" in overrides:
+            self.random = random.Random(overrides["seed"])
+            self.uniforms = self.make_uniforms(overrides["seed"])
+            if vectorized:
+                self.schedule.rng = np.random.default_rng(self.random.getrandbits(64))
+        if "maybe_bored" in overrides:
+            self.maybe_bored = overrides["maybe_bored"]
+            if not vectorized:
+                for a in self.node_agents:
+                    a.maybe_bored_A = a.maybe_bored_B = self.maybe_bored
+            if self.activation == "calendar":
+                self.schedule.reschedule_boredom()
+        if "meme_spread_chance" in overrides:
+            old, new = self.meme_spread_chance, overrides["meme_spread_chance"]
+            self.meme_spread_chance = new
+            # nodes get new * 0.95 when interested in the meme, new * 0.1 otherwise
+            if vectorized:
+                chances = self.schedule.spread_chance
+                for meme, has_interest in self.schedule.has_interest.items():
+                    chances[meme] = new * np.where(has_interest, 0.95, 0.1)
+            else:
+                chance_A = new * np.where(self.has_interest[State.INTERESTED_A], 0.95, 0.1)
+                chance_B = new * np.where(self.has_interest[State.INTERESTED_B], 0.95, 0.1)
+                for a, spread_A, spread_B in zip(self.node_agents, chance_A.tolist(), chance_B.tolist()):
+                    a.meme_A_spread_chance = spread_A
+                    a.meme_B_spread_chance = spread_B
+        if "influencer_spread_chance" in overrides:
+            self.influencer_spread_chance = overrides["influencer_spread_chance"]
+        if "influencer_appearance" in overrides:
+            self.influencer_appearance = overrides["influencer_appearance"]
+            self.set_influencers(self.influencer_appearance)
+
+    def set_influencers(self, number):
+        """
+        Add or remove influencers at random until there are ``number``.
+        """
+        if self.engine == "vectorized":
+            flags = self.schedule.state
+        else:
+            flags = np.array([a.flags for a in self.node_agents], dtype=np.uint8)
+        influencer = int(State.INFLUENCER)
+        current = np.flatnonzero(flags & influencer).tolist()
+        others = np.flatnonzero(~flags & influencer).tolist()
+        if number > len(current):
+            nodes = self.random.sample(others, number - len(current))
+        else:
+            nodes = self.random.sample(current, len(current) - number)
+        # the picked nodes all lack, or all have, the flag: toggle it
+        if self.engine == "vectorized":
+            nodes = np.array(nodes, dtype=np.int64)
+            self.schedule.set_state(nodes, flags[nodes] ^ np.uint8(influencer))
+        else:
+            for node in nodes:
+                a = self.node_agents[node]
+                a.set_flags(a.flags ^ influencer)
 
     def get_peak_meme_A(self):
         return self.peak_meme_A
@@ -0,0 +1,208 @@
+"""
+Network portrayal for the visualization server.
+
+``server.network_portrayal`` builds every node and edge of the graph, with
+colours and tooltips, on every tick, and the browser lays the whole graph
+out again. NetworkDeltaModule sends the topology and a layout once per
+model, then on every tick only the nodes whose state flags changed; the
+browser derives node and edge colours from the flags with lookup tables
+built here from ``node_color`` / ``edge_color``, and writes tooltips only
+for the node under the mouse.
+
+Above ``collapse_above`` nodes each partition group is drawn as a single
+summary node sized by the group and coloured by its most common node
+colour, with edges weighted by the number of links between groups.
+"""
+import numpy as np
+from mesa.visualization.ModularVisualization import VisualizationElement
+
+from state import State
+
+
+NODE_COLORS = ["#3CB043", "#710193", "#E3242B", "#3944BC", "#212121", "#4E0707", "#0A1172"]
+# edge colours, from the lowest to the highest priority
+EDGE_COLORS = ["#E8E8E8", "#1338BE", "#D21404", "#710193"]
+
+
+def node_color(flags):
+    """
+    The node color of an agent with the given State flags.
+    """
+    interested_A = flags & State.INTERESTED_A
+    interested_B = flags & State.INTERESTED_B
+    bored_A = flags & State.BORED_A
+    bored_B = flags & State.BORED_B
+    if flags & State.SUSCEPTIBLE:
+        return "#3CB043"
+    if interested_A and interested_B:
+        return "#710193"
+    if interested_A:
+        return "#E3242B"
+    if interested_B:
+        return "#3944BC"
+    if bored_A and bored_B:
+        return "#212121"
+    if bored_A:
+        return "#4E0707"
+    if bored_B:
+        return "#0A1172"
+
+
+def edge_color(flags1, flags2):
+    """
+    The color of an edge between agents with the given State flags.
+    """
+    both = State.INTERESTED_A | State.INTERESTED_B
+    if (flags1 & both) == both or (flags2 & both) == both:
+        return "#710193"
+    if (flags1 | flags2) & State.INTERESTED_A:
+        return "#D21404"
+    if (flags1 | flags2) & State.INTERESTED_B:
+        return "#1338BE"
+    return "#E8E8E8"
+
+
+# per-flags lookup tables: the index of the node colour, and the rank of
+# the edge colour a node imposes, an edge taking the highest rank of its ends
+NODE_COLOR_INDEX = np.array(
+    [NODE_COLORS.index(node_color(flags) or NODE_COLORS[0]) for flags in range(256)],
+    dtype=np.int8,
+)
+EDGE_RANK = np.array(
+    [EDGE_COLORS.index(edge_color(flags, 0)) for flags in range(256)], dtype=np.int8
+)
+
+
+def node_flags(model):
+    """
+    The State flags of every node as a uint8 array, whatever the engine.
+    """
+    if model.engine != "agent":
+        return model.schedule.state.copy()
+    return np.fromiter((a.flags for a in model.node_agents), np.uint8, model.num_nodes)
+
+
+def partition_layout(group_sizes, seed=0):
+    """
+    Node positions for a partition graph, in O(n): the groups sit on a
+    circle and each group's nodes are scattered over a disc sized by the
+    group.
+
+    :return: *tuple* of ``(x, y)`` arrays in ``[-1, 1]``.
+    """
+    rng = np.random.default_rng(seed)
+    sizes = np.asarray(group_sizes)
+    n_groups = len(sizes)
+    angle = 2 * np.pi * np.arange(n_groups) / n_groups
+    ring = 0.0 if n_groups == 1 else 0.6
+    spread = np.sqrt(sizes / sizes.sum()) * (0.4 if n_groups > 1 else 1.0)
+    group = np.repeat(np.arange(n_groups), sizes)
+    radius = spread[group] * np.sqrt(rng.random(len(group)))
+    theta = 2 * np.pi * rng.random(len(group))
+    x = ring * np.cos(angle[group]) + radius * np.cos(theta)
+    y = ring * np.sin(angle[group]) + radius * np.sin(theta)
+    return x, y
+
+
+class NetworkDeltaModule(VisualizationElement):
+    """
+    Network view sending the topology once and state changes per tick.
+
+    :param canvas_height: *int*, default 500
+
+    :param canvas_width: *int*, default 500
+
+    :param collapse_above: *int*, default 5000
+        Draw one summary node per partition group when the model has
+        more nodes than this.
+
+    :param force_layout_below: *int*, default 1000
+        Refine the partition layout with a d3 force layout in the browser,
+        once per model, when the model has fewer nodes than this.
+    """
+
+    package_includes = ["d3.min.js"]
+    local_includes = ["js/NetworkDeltaModule.js"]
+
+    def __init__(
+        self, canvas_height=500, canvas_width=500, collapse_above=5000, force_layout_below=1000
+    ):
+        self.canvas_height = canvas_height
+        self.canvas_width = canvas_width
+        self.collapse_above = collapse_above
+        self.force_layout_below = force_layout_below
+        self.js_code = "elements.push(new NetworkDeltaModule({}, {}, {}));".format(
+            self.canvas_width, self.canvas_height, self.force_layout_below
+        )
+        self._model = None
+        self._flags = None
+
+    def render(self, model):
+        flags = node_flags(model)
+        if model is not self._model:
+            # a new model, after a reset: send the whole graph again
+            self._model = model
+            self._flags = flags
+            if model.num_nodes > self.collapse_above:
+                return self.summary(model, flags, topology=True)
+            return self.topology(model, flags)
+        if model.num_nodes > self.collapse_above:
+            return self.summary(model, flags)
+        changed = np.flatnonzero(flags != self._flags)
+        self._flags = flags
+        return {
+            "type": "delta",
+            "nodes": changed.tolist(),
+            "flags": flags[changed].tolist(),
+        }
+
+    def topology(self, model, flags):
+        x, y = partition_layout(model.group_sizes)
+        edges = np.asarray(model.edges)
+        return {
+            "type": "topology",
+            "node_colors": NODE_COLORS,
+            "edge_colors": EDGE_COLORS,
+            "color_index": NODE_COLOR_INDEX.tolist(),
+            "edge_rank": EDGE_RANK.tolist(),
+            "state_names": [[int(s), s.name] for s in State],
+            "influencer": int(State.INFLUENCER),
+            "x": np.round(x, 4).tolist(),
+            "y": np.round(y, 4).tolist(),
+            "source": edges[:, 0].tolist(),
+            "target": edges[:, 1].tolist(),
+            "flags": flags.tolist(),
+        }
+
+    def summary(self, model, flags, topology=False):
+        """
+        One node per partition group, with the number of nodes of every
+        colour in its tooltip.
+        """
+        sizes = np.asarray(model.group_sizes)
+        n_groups = len(sizes)
+        group = np.repeat(np.arange(n_groups), sizes)
+        colors = np.bincount(
+            group * len(NODE_COLORS) + NODE_COLOR_INDEX[flags],
+            minlength=n_groups * len(NODE_COLORS),
+        ).reshape(n_groups, len(NODE_COLORS))
+        message = {
+            "type": "summary",
+            "node_colors": NODE_COLORS,
+            "counts": colors.tolist(),
+        }
+        if topology:
+            angle = 2 * np.pi * np.arange(n_groups) / n_groups
+            edges = np.asarray(model.edges)
+            pairs = np.sort(group[edges], axis=1)
+            pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+            links, weight = np.unique(pairs, axis=0, return_counts=True)
+            message.update({
+                "x": np.round(0.7 * np.cos(angle), 4).tolist(),
+                "y": np.round(0.7 * np.sin(angle), 4).tolist(),
+                "sizes": sizes.tolist(),
+                "source": links[:, 0].tolist(),
+                "target": links[:, 1].tolist(),
+                "weight": weight.tolist(),
+            })
+        return message
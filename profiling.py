@@ -0,0 +1,311 @@
+"""
+Opt-in profiling of MemeModel steps.
+
+A StepProfiler attached to a model records the wall time of every phase of
+``MemeModel.step``:
+
+- ``schedule``: the whole ``schedule.step()``, of which
+- ``spread`` and ``bored``: the time spent spreading memes and getting bored,
+- ``collect``: ``datacollector.collect``,
+- ``peaks``: the peak tracking and stop condition,
+
+and counts the hot-path operations: neighbour lists read
+(``neighbor_lookups``) and their entries (``neighbors_visited``), random
+numbers drawn (``rng_draws``), state transitions (``transitions``) and
+state count queries behind the reporters (``reporter_scans``)::
+
+    model = MemeModel(num_nodes=10000, profile=True)
+    while model.running:
+        model.step()
+    model.profiler.report()
+    model.profiler.to_frame()
+
+A model without a profiler only pays one ``is not None`` test per phase.
+Attaching swaps in counting versions of the agents, random number
+generators and state counts, which draw the same numbers, so a profiled run
+follows the same path as an unprofiled one; the timers of the agent engine
+add their own cost to ``schedule``.
+"""
+import logging
+import random
+import time
+
+import numpy as np
+
+from agent import MemeAgent
+from state import StateCounts
+
+
+logger = logging.getLogger(__name__)
+
+PHASES = ("schedule", "spread", "bored", "collect", "peaks")
+COUNTERS = ("neighbor_lookups", "neighbors_visited", "rng_draws", "transitions", "reporter_scans")
+
+
+class CountingRandom(random.Random):
+    """
+    random.Random counting the numbers drawn.
+
+    Overrides getrandbits as well as random, so that integers are drawn
+    the way the base class draws them and sequences stay the same.
+    """
+
+    def __init__(self, source, counters):
+        super().__init__()
+        self.setstate(source.getstate())
+        self.counters = counters
+
+    def random(self):
+        self.counters["rng_draws"] += 1
+        return super().random()
+
+    def getrandbits(self, k):
+        self.counters["rng_draws"] += 1
+        return super().getrandbits(k)
+
+
+class CountingGenerator:
+    """
+    Wrapper of a numpy Generator counting the numbers drawn.
+    """
+
+    def __init__(self, rng, counters):
+        self.rng = rng
+        self.counters = counters
+
+    def _count(self, size):
+        if size is None:
+            self.counters["rng_draws"] += 1
+        else:
+            self.counters["rng_draws"] += int(np.prod(size))
+
+    def random(self, size=None):
+        self._count(size)
+        return self.rng.random(size)
+
+    def integers(self, low, high=None, size=None):
+        self._count(size)
+        return self.rng.integers(low, high, size)
+
+    def choice(self, a, size=None, replace=True):
+        self._count(size)
+        return self.rng.choice(a, size, replace=replace)
+
+    def __getattr__(self, name):
+        return getattr(self.rng, name)
+
+
+class CountingStateCounts(StateCounts):
+    """
+    StateCounts counting the queries of the reporters.
+    """
+
+    def count_all(self, *states):
+        self.profiler.counters["reporter_scans"] += 1
+        return super().count_all(*states)
+
+    def count_any(self, *states):
+        self.profiler.counters["reporter_scans"] += 1
+        return super().count_any(*states)
+
+
+class ProfiledMemeAgent(MemeAgent):
+    """
+    MemeAgent timing and counting its spread and boredom.
+    """
+
+    __slots__ = ()
+
+    def try_to_spread_memes(self, state):
+        profiler = self.model.profiler
+        start = time.perf_counter()
+        offsets = self.model.neighbor_offsets
+        profiler.counters["neighbor_lookups"] += 1
+        profiler.counters["neighbors_visited"] += offsets[self.pos + 1] - offsets[self.pos]
+        super().try_to_spread_memes(state)
+        profiler.phases["spread"] += time.perf_counter() - start
+
+    def spread_to_remaining(self, state):
+        profiler = self.model.profiler
+        start = time.perf_counter()
+        offsets = self.model.neighbor_offsets
+        profiler.counters["neighbor_lookups"] += 1
+        profiler.counters["neighbors_visited"] += offsets[self.pos + 1] - offsets[self.pos]
+        remaining = super().spread_to_remaining(state)
+        profiler.phases["spread"] += time.perf_counter() - start
+        return remaining
+
+    def try_be_bored(self, state):
+        profiler = self.model.profiler
+        start = time.perf_counter()
+        super().try_be_bored(state)
+        profiler.phases["bored"] += time.perf_counter() - start
+
+
+class StepProfiler:
+    """
+    Per-phase wall time and operation counters of a model's steps.
+
+    :param log_every: *int*, default None
+        Log a summary line every ``log_every`` steps on the
+        ``profiling`` logger.
+    """
+
+    def __init__(self, log_every=None):
+        self.log_every = log_every
+        self.model = None
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.steps = []
+        self._start = None
+        self._step_phases = None
+        self._step_counters = None
+        self._originals = {}
+
+    def attach(self, model):
+        """
+        Start profiling ``model``.
+        """
+        if model.engine == "sharded":
+            # the steps run in the shard processes, out of reach of the counters
+            raise ValueError("Cannot profile a model with the sharded engine")
+        self.model = model
+        model.profiler = self
+        self._originals["random"] = model.random
+        model.random = CountingRandom(model.random, self.counters)
+        self._originals["counts"] = model.counts.__class__
+        model.counts.__class__ = CountingStateCounts
+        model.counts.profiler = self
+        if model.engine == "vectorized":
+            self._instrument_engine(model.schedule)
+        else:
+            for agent in model.node_agents:
+                agent.__class__ = ProfiledMemeAgent
+            if model.rng == "numpy":
+                # counted as drawn in blocks, ahead of their use
+                self._originals["uniforms"] = model.uniforms.rng
+                model.uniforms.rng = CountingGenerator(model.uniforms.rng, self.counters)
+            state_changed = model.state_changed
+
+            def counted_state_changed(agent, old, new):
+                self.counters["transitions"] += 1
+                state_changed(agent, old, new)
+
+            model.state_changed = counted_state_changed
+        return self
+
+    def _instrument_engine(self, engine):
+        self._originals["rng"] = engine.rng
+        engine.rng = CountingGenerator(engine.rng, self.counters)
+        spread, bored, set_state = engine.try_to_spread_memes, engine.try_be_bored, engine.set_state
+
+        def timed_spread(meme, spreaders, activation):
+            start = time.perf_counter()
+            self.counters["neighbor_lookups"] += len(spreaders)
+            self.counters["neighbors_visited"] += int(
+                (engine.offsets[spreaders + 1] - engine.offsets[spreaders]).sum()
+            )
+            result = spread(meme, spreaders, activation)
+            self.phases["spread"] += time.perf_counter() - start
+            return result
+
+        def timed_bored(meme, nodes):
+            start = time.perf_counter()
+            bored(meme, nodes)
+            self.phases["bored"] += time.perf_counter() - start
+
+        def counted_set_state(nodes, state):
+            self.counters["transitions"] += int((engine.state[nodes] != state).sum())
+            set_state(nodes, state)
+
+        engine.try_to_spread_memes = timed_spread
+        engine.try_be_bored = timed_bored
+        engine.set_state = counted_set_state
+
+    def detach(self):
+        """
+        Stop profiling, the model gets its plain objects back.
+        """
+        model = self.model
+        original = self._originals.pop("random")
+        original.setstate(model.random.getstate())
+        model.random = original
+        model.counts.__class__ = self._originals.pop("counts")
+        del model.counts.profiler
+        if model.engine == "vectorized":
+            engine = model.schedule
+            engine.rng = self._originals.pop("rng")
+            for name in ("try_to_spread_memes", "try_be_bored", "set_state"):
+                del engine.__dict__[name]
+        else:
+            for agent in model.node_agents:
+                agent.__class__ = MemeAgent
+            if model.rng == "numpy":
+                model.uniforms.rng = self._originals.pop("uniforms")
+            del model.state_changed
+        model.profiler = None
+
+    def start_step(self):
+        self._step_phases = dict(self.phases)
+        self._step_counters = dict(self.counters)
+        self._start = time.perf_counter()
+
+    def restart(self):
+        """
+        Leave the time since the previous lap out of every phase.
+        """
+        self._start = time.perf_counter()
+
+    def lap(self, phase):
+        """
+        Add the time since the previous lap to ``phase``.
+        """
+        now = time.perf_counter()
+        self.phases[phase] += now - self._start
+        self._start = now
+
+    def end_step(self):
+        row = {"step": self.model.step_counter}
+        for phase in PHASES:
+            row[phase] = self.phases[phase] - self._step_phases[phase]
+        for counter in COUNTERS:
+            row[counter] = self.counters[counter] - self._step_counters[counter]
+        self.steps.append(row)
+        if self.log_every and len(self.steps) % self.log_every == 0:
+            logger.info(self.summary())
+
+    def report(self):
+        """
+        Totals of the profiled steps.
+
+        :return: *dict* with the number of ``steps``, the cumulative
+            ``phases`` (seconds) and ``counters``.
+        """
+        return {
+            "steps": len(self.steps),
+            "phases": dict(self.phases),
+            "counters": dict(self.counters),
+        }
+
+    def summary(self):
+        """
+        One line with the mean time per step of every phase and the
+        counter totals.
+        """
+        steps = max(len(self.steps), 1)
+        return "step {}: ".format(self.model.step_counter) + " ".join(
+            "{}={:.3f}ms".format(phase, self.phases[phase] * 1000 / steps) for phase in PHASES
+        ) + " | " + " ".join(
+            "{}={}".format(counter, self.counters[counter]) for counter in COUNTERS
+        )
+
+    def to_frame(self):
+        """
+        Per-step phase times (seconds) and counters as a pandas DataFrame
+        indexed by step.
+        """
+        import pandas as pd
+
+        return pd.DataFrame(self.steps, columns=["step"] + list(PHASES) + list(COUNTERS)).set_index(
+            "step"
+        )
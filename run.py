@@ -1,3 +1,24 @@
-from server import server
+import argparse
 
-server.launch(open_browser=False)
\ No newline at end of file
+from server import live_server, server
+
+
+parser = argparse.ArgumentParser(description="Run the meme model server.")
+parser.add_argument(
+    "--live", action="store_true", help="step the model in a server-side loop"
+)
+parser.add_argument(
+    "--headless", action="store_true", help="live mode without the network view"
+)
+parser.add_argument("--steps-per-frame", type=int, default=10)
+parser.add_argument("--frame-budget", type=float, default=0.05)
+# `mesa runserver` runs this file with its own command line
+args, _ = parser.parse_known_args()
+
+if args.live or args.headless:
+    server = live_server(
+        headless=args.headless,
+        steps_per_frame=args.steps_per_frame,
+        frame_budget=args.frame_budget,
+    )
+server.launch(open_browser=False)
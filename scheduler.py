@@ -0,0 +1,255 @@
+"""
+Schedulers for MemeModel.
+"""
+import heapq
+import math
+
+from mesa.time import RandomActivation
+
+from state import State
+
+
+INTERESTED_ANY = int(State.INTERESTED_A | State.INTERESTED_B)
+INTERESTED_A = int(State.INTERESTED_A)
+# interested state to the bored state it ends in
+MEMES = {
+    INTERESTED_A: int(State.BORED_A),
+    int(State.INTERESTED_B): int(State.BORED_B),
+}
+
+
+class FrontierActivation(RandomActivation):
+    """
+    Random activation of the interested agents only.
+
+    MemeAgent.step does nothing unless the agent is interested in a meme,
+    so the scheduler keeps the interested agents (the frontier) and only
+    activates those, making a step cost scale with the frontier instead of
+    the whole population.
+
+    The shuffled order of RandomActivation amounts to giving every agent a
+    uniformly random turn within the step. Here each frontier agent draws
+    its turn when the step starts, and an agent becoming interested during
+    the step draws its turn at that moment: it still acts in this step when
+    the turn falls after the current one. Agents outside the frontier do
+    nothing on their turn, so the order of activations is distributed as
+    with RandomActivation.
+
+    :param model: *MemeModel*
+        The model owning the schedule. It reports agents' state changes
+        through ``state_changed``.
+    """
+
+    def __init__(self, model):
+        super().__init__(model)
+        # unique_id of the interested agents, kept in insertion order so a
+        # seeded run draws turns in a reproducible order
+        self.frontier = {}
+        self._queue = None
+        self._turns = {}
+        self._now = 0.0
+
+    def reset_frontier(self):
+        """
+        Rebuild the frontier from the current state of every agent.
+        """
+        self.frontier = {
+            uid: None for uid, agent in self._agents.items() if agent.flags & INTERESTED_ANY
+        }
+
+    def remove(self, agent):
+        super().remove(agent)
+        self.frontier.pop(agent.unique_id, None)
+
+    def state_changed(self, agent, old, new):
+        """
+        Add or remove an agent from the frontier after a state transition.
+        """
+        uid = agent.unique_id
+        if new & INTERESTED_ANY:
+            if old & INTERESTED_ANY:
+                return
+            self.frontier[uid] = None
+            self.join(uid)
+        elif old & INTERESTED_ANY:
+            del self.frontier[uid]
+
+    def join(self, uid):
+        """
+        Give an agent joining the frontier during a step its turn.
+
+        :return: *bool* whether the agent still acts in the current step,
+            or in the next one when called between steps.
+        """
+        if self._queue is None:
+            return True
+        if uid not in self._turns:
+            turn = self.model.random.random()
+            self._turns[uid] = turn
+            if turn > self._now:
+                heapq.heappush(self._queue, (turn, uid))
+        return self._turns[uid] > self._now
+
+    def actors(self):
+        """The agents that get a turn when the step starts."""
+        return self.frontier
+
+    def activate(self, agent):
+        agent.step()
+
+    def step(self):
+        """
+        Activate the interested agents once, in random order.
+        """
+        random = self.model.random
+        self._turns = {uid: random.random() for uid in self.actors()}
+        self._queue = [(turn, uid) for uid, turn in self._turns.items()]
+        heapq.heapify(self._queue)
+        while self._queue:
+            self._now, uid = heapq.heappop(self._queue)
+            self.activate(self._agents[uid])
+        self._queue = None
+        self._turns = {}
+        self.steps += 1
+        self.time += 1
+
+
+class CalendarActivation(FrontierActivation):
+    """
+    Frontier activation with boredom handled by an event calendar.
+
+    MemeAgent polls its boredom countdown on every activation and draws a
+    random number each time, the countdown only letting the draws count once
+    it reached zero. Here, when an agent becomes interested in a meme, the
+    number of activations until it gets bored is drawn at once: the
+    countdown plus a geometric number of draws, and the agent is put in the
+    calendar for the step that activation falls on.
+
+    The frontier only holds the agents that can still spread a meme. The
+    neighbours a meme can reach only ever lose that ability (they get
+    interested in it or bored), so an agent none of whose neighbours can
+    catch its meme any more leaves the frontier and only comes back for its
+    turn on the step it gets bored. The tail of a run, where the remaining
+    interested agents are surrounded by bored or interested ones, then costs
+    next to nothing.
+
+    Outcomes are distributed as with FrontierActivation; the random numbers
+    drawn differ, so runs with the same seed do not match.
+
+    The draws depend on the boredom chances: after changing them, call
+    ``reschedule_boredom``.
+    """
+
+    def __init__(self, model):
+        super().__init__(model)
+        # unique_id to the bitmask of the memes the agent can still spread
+        self.spreading = {}
+        # step to {unique_id: bitmask of the memes the agent gets bored of}
+        self.calendar = {}
+        # (unique_id, meme) to the step of the first draw of the boredom
+        # chance, once the countdown ran out, for every interested agent
+        self.draws_from = {}
+
+    def reset_frontier(self):
+        self.spreading = {}
+        self.calendar = {}
+        self.draws_from = {}
+        for uid, agent in self._agents.items():
+            interested = agent.flags & INTERESTED_ANY
+            if interested:
+                self.spreading[uid] = interested
+                for meme in MEMES:
+                    if interested & meme:
+                        self.schedule_boredom(agent, meme, self.steps)
+        self.frontier = dict.fromkeys(self.spreading)
+
+    def remove(self, agent):
+        super().remove(agent)
+        self.spreading.pop(agent.unique_id, None)
+        for meme in MEMES:
+            self.draws_from.pop((agent.unique_id, meme), None)
+
+    def schedule_boredom(self, agent, meme, first):
+        """
+        Put an agent that became interested in ``meme`` in the calendar.
+
+        :param first: *int*
+            The step of the agent's first activation since.
+        """
+        countdown = agent.TIME_BEFORE_BORED_A if meme == INTERESTED_A else agent.TIME_BEFORE_BORED_B
+        # activations with the countdown running, then draws
+        start = first + max(countdown, 1) - 1
+        self.draws_from[agent.unique_id, meme] = start
+        self.schedule_draws(agent, meme, start)
+
+    def schedule_draws(self, agent, meme, start):
+        """
+        Put an agent in the calendar for the first of its draws from step
+        ``start`` on below its boredom chance for ``meme``.
+        """
+        chance = agent.maybe_bored_A if meme == INTERESTED_A else agent.maybe_bored_B
+        if chance <= 0:
+            return
+        draws = 1
+        if chance < 1:
+            draws += int(math.log(1.0 - self.model.uniforms.random()) / math.log(1.0 - chance))
+        due = self.calendar.setdefault(start + draws - 1, {})
+        due[agent.unique_id] = due.get(agent.unique_id, 0) | meme
+
+    def reschedule_boredom(self):
+        """
+        Redraw the calendar with the current boredom chances of the agents.
+
+        The draws are independent, so an agent whose countdown ran out
+        starts over from the current step, as if it had been drawing with
+        the new chance all along.
+        """
+        self.calendar = {}
+        for (uid, meme), start in self.draws_from.items():
+            self.schedule_draws(self._agents[uid], meme, max(start, self.steps))
+
+    def state_changed(self, agent, old, new):
+        uid = agent.unique_id
+        gained = new & ~old & INTERESTED_ANY
+        lost = old & ~new & INTERESTED_ANY
+        if gained:
+            self.spreading[uid] = self.spreading.get(uid, 0) | gained
+            self.frontier[uid] = None
+            first = self.steps if self.join(uid) else self.steps + 1
+            for meme in MEMES:
+                if gained & meme:
+                    self.schedule_boredom(agent, meme, first)
+        if lost:
+            self.stop_spreading(uid, lost)
+            for meme in MEMES:
+                if lost & meme:
+                    self.draws_from.pop((uid, meme), None)
+
+    def stop_spreading(self, uid, memes):
+        left = self.spreading.get(uid, 0) & ~memes
+        if left:
+            self.spreading[uid] = left
+        else:
+            self.spreading.pop(uid, None)
+            self.frontier.pop(uid, None)
+
+    def actors(self):
+        actors = dict(self.frontier)
+        actors.update(self.calendar.get(self.steps, {}))
+        return actors
+
+    def activate(self, agent):
+        uid = agent.unique_id
+        due = self.calendar.get(self.steps, {}).get(uid, 0)
+        for meme, bored in MEMES.items():
+            if not agent.flags & meme:
+                continue
+            if self.spreading.get(uid, 0) & meme:
+                if not agent.spread_to_remaining(State(meme)):
+                    self.stop_spreading(uid, meme)
+            if due & meme:
+                agent.set_flags((agent.flags & ~meme) | bored)
+
+    def step(self):
+        super().step()
+        self.calendar.pop(self.steps - 1, None)
@@ -1,53 +1,19 @@
 from mesa.visualization.ModularVisualization import ModularServer
 from mesa.visualization.UserParam import UserSettableParameter
 from mesa.visualization.modules import ChartModule
-from mesa.visualization.modules import NetworkModule
 from mesa.visualization.modules import TextElement
 from model import MemeModel, number_interested_B, number_interested_A
 from model import number_interest_A, number_interest_B, percentage_spread
 from model import number_peak_meme_A, number_peak_meme_B, step_peak_meme_A, step_peak_meme_B
 from model import percentage_meme_A_spread, percentage_meme_B_spread
+from portrayal import NetworkDeltaModule, edge_color, node_color
 from state import State
 
 
 def network_portrayal(G):
     # the model ensures there is always 1 agent per node
-
-    def node_color(agent):
-        """
-        A method to define the node color.
-        The color of the node will change depending on the state
-        of the agent has.
-        """
-        if State.SUSCEPTIBLE in agent.state:
-            return "#3CB043"
-        if State.INTERESTED_A in agent.state and State.INTERESTED_B in agent.state:
-            return "#710193"
-        if State.INTERESTED_A in agent.state:
-            return "#E3242B"
-        if State.INTERESTED_B in agent.state:
-            return "#3944BC"
-        if State.BORED_A in agent.state and State.BORED_B in agent.state:
-            return "#212121"
-        if State.BORED_A in agent.state:
-            return "#4E0707"
-        if State.BORED_B in agent.state:
-            return "#0A1172"
-
-    def edge_color(agent1, agent2):
-        """
-        A method to define the edge color.
-        The color of the edge will change depending on the state
-        of the agent has.
-        """
-        if (State.INTERESTED_A in agent1.state and State.INTERESTED_B in agent1.state) \
-            or (State.INTERESTED_A in agent2.state and State.INTERESTED_B in agent2.state):
-            return "#710193"
-        if State.INTERESTED_A in agent1.state or State.INTERESTED_A in agent2.state:
-            return "#D21404"
-        if State.INTERESTED_B in agent1.state or State.INTERESTED_B in agent2.state:
-            return "#1338BE"
-        return "#E8E8E8"
+    # full portrayal for mesa's NetworkModule; the server uses the
+    # incremental portrayal.NetworkDeltaModule instead
 
     def edge_width():
         return 2
@@ -64,7 +30,7 @@ def network_portrayal(G):
         portrayal["nodes"].append(
             {
             "size": size,
-            "color": node_color(agents[0]),
+            "color": node_color(agents[0].flags),
             "tooltip": "id: {}<br>state: {}".format(
                 agents[0].unique_id, [s.name for s in agents[0].state]
             ),
@@ -75,7 +41,7 @@ def network_portrayal(G):
         {
             "source": source,
             "target": target,
-            "color": edge_color(*get_agents(source, target)),
+            "color": edge_color(*(agent.flags for agent in get_agents(source, target))),
             "width": edge_width(),
         }
         for (source, target) in G.edges
@@ -83,7 +49,7 @@ def network_portrayal(G):
 
     return portrayal
 
-network = NetworkModule(network_portrayal, 500, 500, library="d3")
+network = NetworkDeltaModule(500, 500)
 chart = ChartModule(
     [
         {"Label": "Susceptible", "Color": "#3CB043"},
@@ -225,3 +191,25 @@ server = ModularServer(
 )
 
 server.port = 8521
+
+
+def live_server(headless=False, **kwargs):
+    """
+    Server stepping the model in its own loop and streaming metrics, see
+    live.LiveServer for the keyword arguments.
+
+    :param headless: *bool*, default False
+        Leave the network view out.
+    """
+    from live import LiveMetrics, LiveServer
+
+    live = LiveServer(
+        MemeModel,
+        [network, LiveMetrics()],
+        "Meme Model",
+        model_params,
+        headless=headless,
+        **kwargs
+    )
+    live.port = server.port
+    return live
@@ -0,0 +1,303 @@
+"""
+One large run stepped by several processes.
+
+The partition graph has dense groups and few edges between them. A
+ShardedEngine hands whole groups to worker processes, the shards. The
+node states, countdowns, spread chances and the CSR adjacency live in
+shared memory, and every shard runs the waves of VectorizedEngine on its
+own nodes::
+
+    model = MemeModel(num_nodes=2000000, n_groups=8000, p_out=3e-7,
+                      engine="sharded", shards=8, seed=0)
+    while model.running and model.schedule.steps < 100:
+        model.step()
+    model.schedule.close()
+
+Only spread events over boundary edges travel between processes. A
+shard reads the state of remote neighbours from a copy frozen at the start
+of the step. It sends its hits on remote nodes to the coordinator, which
+applies them at the step barrier; those nodes start spreading on the next
+step. Every shard returns its state count changes, so the model reporters
+and peaks are reduced once per step.
+
+Shards draw from independent children of the model seed's SeedSequence.
+A run therefore depends on the seed and the number of shards, not on the
+timing of the processes. Cross-shard spread lags by up to one step, so
+runs are distributed close to, but not exactly like, the vectorized
+engine.
+"""
+import multiprocessing
+import os
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from engine import BITS, BORED_ANY, MEMES, VectorizedEngine
+from graph import expand_neighbors
+from state import State
+
+
+# per-meme arrays are stacked in this order in shared memory
+MEME_ORDER = tuple(MEMES)
+
+
+def balanced_shards(group_sizes, shards):
+    """
+    Split consecutive groups into at most ``shards`` node ranges of about
+    the same size.
+
+    :return: *list* of ``(start, end)`` node ranges.
+    """
+    ends = np.cumsum(group_sizes)
+    total = int(ends[-1]) if len(ends) else 0
+    bounds = [0]
+    for s in range(1, shards):
+        # the first group boundary past an equal share of the nodes
+        cut = int(ends[np.searchsorted(ends, total * s / shards)])
+        if bounds[-1] < cut < total:
+            bounds.append(cut)
+    bounds.append(total)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class SharedArrays:
+    """
+    NumPy arrays in named shared memory blocks, rebuilt by name in other
+    processes.
+    """
+
+    def __init__(self, specs=None):
+        self.blocks = {}
+        self.arrays = {}
+        self.owner = specs is None
+        for name, (block, shape, dtype) in (specs or {}).items():
+            self._attach(name, shared_memory.SharedMemory(name=block), shape, dtype)
+
+    def _attach(self, name, block, shape, dtype):
+        self.blocks[name] = block
+        self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    def share(self, name, values):
+        """Copy ``values`` into a new block, and return the shared array."""
+        values = np.ascontiguousarray(values)
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        self._attach(name, block, values.shape, values.dtype)
+        self.arrays[name][...] = values
+        return self.arrays[name]
+
+    def specs(self):
+        return {
+            name: (self.blocks[name].name, array.shape, array.dtype.str)
+            for name, array in self.arrays.items()
+        }
+
+    def close(self):
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+            if self.owner:
+                block.unlink()
+        self.blocks = {}
+
+
+class Counts:
+    """The ``model`` of a shard: state count changes and boredom chance."""
+
+    def __init__(self, maybe_bored):
+        self.maybe_bored = maybe_bored
+        self.counts = np.zeros(256, dtype=np.int64)
+
+
+class ShardEngine(VectorizedEngine):
+    """
+    VectorizedEngine restricted to the nodes ``start:end`` of shared
+    arrays, run inside a shard process.
+    """
+
+    def __init__(self, arrays, start, end, maybe_bored, sequence):
+        self.model = Counts(maybe_bored)
+        self.steps = 0
+        self.time = 0
+        self.start, self.end = start, end
+        self.rng = np.random.default_rng(sequence)
+        self.offsets, self.indices = arrays["offsets"], arrays["indices"]
+        self.num_nodes = len(self.offsets) - 1
+        self.state, self.frozen = arrays["state"], arrays["frozen"]
+        self.spread_chance = dict(zip(MEME_ORDER, arrays["spread_chance"]))
+        self.time_before_interested = dict(zip(MEME_ORDER, arrays["time_before_interested"]))
+        self.time_before_bored = dict(zip(MEME_ORDER, arrays["time_before_bored"]))
+        self.outbox = []
+
+    def try_to_spread_memes(self, meme, spreaders, activation):
+        """
+        VectorizedEngine.try_to_spread_memes, with remote neighbours read
+        from the frozen states and their hits put in the outbox.
+        """
+        owner, targets = expand_neighbors(self.offsets, self.indices, spreaders)
+        local = (targets >= self.start) & (targets < self.end)
+        flags = np.where(local, self.state[targets], self.frozen[targets])
+        eligible = (flags & BORED_ANY) == 0
+        owner, targets, local = owner[eligible], targets[eligible], local[eligible]
+
+        n_eligible = np.bincount(owner, minlength=len(spreaders))
+        rank = np.arange(len(owner)) - np.repeat(np.cumsum(n_eligible) - n_eligible, n_eligible)
+        timer = self.time_before_interested[meme]
+        before = timer[spreaders]
+        timer[spreaders] = np.maximum(before - n_eligible, 0)
+
+        draws = self.rng.random(len(owner))
+        hit = (rank >= before[owner] - 1) & (draws < self.spread_chance[meme][spreaders][owner])
+        self.outbox.append((MEME_ORDER.index(meme), targets[hit & ~local]))
+        hit &= local
+        targets = targets[hit]
+        reached_at = activation[spreaders[owner[hit]] - self.start]
+
+        order = np.lexsort((reached_at, targets))
+        targets, reached_at = targets[order], reached_at[order]
+        first = np.ones(len(targets), dtype=bool)
+        first[1:] = targets[1:] != targets[:-1]
+        new = first & ((self.state[targets] & BITS[meme]) == 0)
+        targets, reached_at = targets[new], reached_at[new]
+
+        self.set_state(targets, (self.state[targets] & ~BITS[State.SUSCEPTIBLE]) | BITS[meme])
+        return targets, reached_at
+
+    def step(self):
+        self.model.counts[:] = 0
+        self.outbox = []
+        start, end = self.start, self.end
+        activation = self.rng.random(end - start)
+        wave = {
+            meme: start + np.flatnonzero(self.state[start:end] & BITS[meme]) for meme in MEMES
+        }
+        while any(len(nodes) for nodes in wave.values()):
+            for meme, nodes in wave.items():
+                targets, reached_at = self.try_to_spread_memes(meme, nodes, activation)
+                self.try_be_bored(meme, nodes)
+                wave[meme] = targets[activation[targets - start] > reached_at]
+        self.steps += 1
+        self.time += 1
+
+
+def shard_main(connection, specs, start, end, maybe_bored, sequence):
+    """
+    Body of a shard process: step on every "step" message, answering with
+    the state count changes and the remote hits, until "close".
+    """
+    arrays = SharedArrays(specs)
+    engine = ShardEngine(arrays.arrays, start, end, maybe_bored, sequence)
+    try:
+        while connection.recv() == "step":
+            engine.step()
+            connection.send((engine.model.counts, engine.outbox))
+    finally:
+        engine = None
+        arrays.close()
+        connection.close()
+
+
+def stop_shards(pid, connections, processes, arrays):
+    if os.getpid() != pid:
+        # a forked process collecting its copy of the engine: the shards
+        # and blocks are not its own
+        return
+    for connection in connections:
+        try:
+            connection.send("close")
+        except (BrokenPipeError, OSError):
+            pass
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+    arrays.close()
+
+
+class ShardedEngine(VectorizedEngine):
+    """
+    Coordinator of the shard processes of a MemeModel.
+
+    The initial states are drawn as in VectorizedEngine, then moved to
+    shared memory. ``state`` stays readable from the model process
+    between steps, for the reporters and the portrayal. The shards stop
+    with ``close``, or when the engine is garbage collected.
+
+    :param model: *MemeModel*
+        The model owning the engine.
+
+    :param shards: *int*, default None
+        The number of shard processes, all cores when None. There are never
+        more shards than groups.
+    """
+
+    def __init__(self, model, shards=None):
+        super().__init__(model)
+        self.arrays = SharedArrays()
+        share = self.arrays.share
+        self.offsets = share("offsets", self.offsets)
+        self.indices = share("indices", self.indices)
+        self.state = share("state", self.state)
+        self.frozen = share("frozen", self.state)
+        for name in ("spread_chance", "time_before_interested", "time_before_bored"):
+            stacked = share(name, np.stack([getattr(self, name)[meme] for meme in MEME_ORDER]))
+            setattr(self, name, dict(zip(MEME_ORDER, stacked)))
+
+        self.ranges = balanced_shards(model.group_sizes, shards or os.cpu_count())
+        sequences = np.random.SeedSequence(
+            int(self.rng.integers(2 ** 63))
+        ).spawn(len(self.ranges))
+        self.connections, self.processes = [], []
+        for (start, end), sequence in zip(self.ranges, sequences):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=shard_main,
+                args=(child, self.arrays.specs(), start, end, model.maybe_bored, sequence),
+                daemon=True,
+            )
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+        self._finalizer = weakref.finalize(
+            self, stop_shards, os.getpid(), self.connections, self.processes, self.arrays
+        )
+
+    def step(self):
+        np.copyto(self.frozen, self.state)
+        for connection in self.connections:
+            connection.send("step")
+        counts = self.model.counts
+        remote = {meme: [] for meme in MEME_ORDER}
+        for connection in self.connections:
+            delta, outbox = connection.recv()
+            for flags in np.flatnonzero(delta).tolist():
+                counts[flags] += int(delta[flags])
+            for meme, targets in outbox:
+                remote[MEME_ORDER[meme]].append(targets)
+        # the barrier: remote hits on nodes still reachable, meme by meme
+        for meme, targets in remote.items():
+            if not targets:
+                continue
+            targets = np.unique(np.concatenate(targets))
+            targets = targets[(self.state[targets] & (BITS[meme] | BORED_ANY)) == 0]
+            self.set_state(targets, (self.state[targets] & ~BITS[State.SUSCEPTIBLE]) | BITS[meme])
+        self.steps += 1
+        self.time += 1
+
+    def close(self):
+        """
+        Stop the shard processes and free the shared memory; ``state`` is
+        kept as a private copy.
+        """
+        if self._finalizer.alive:
+            # private copies, the shared views must be gone before the
+            # blocks are closed
+            self.state = self.state.copy()
+            self.frozen = None
+            self.offsets, self.indices = self.offsets.copy(), self.indices.copy()
+            for name in ("spread_chance", "time_before_interested", "time_before_bored"):
+                setattr(self, name, {
+                    meme: values.copy() for meme, values in getattr(self, name).items()
+                })
+            self._finalizer()
@@ -1,11 +1,96 @@
-from enum import Enum
-
-class State(Enum):
-    SUSCEPTIBLE = 0
-    INTERESTED_A = 1
-    INTERESTED_B = 2
-    BORED_A = 3
-    BORED_B = 4
-    INTEREST_A = 5
-    INTEREST_B = 6
-    INFLUENCER = 7
+from collections import Counter
+from enum import IntFlag
+from functools import reduce
+from operator import or_
+
+
+class State(IntFlag):
+    """
+    The states a node can be in, one bit each so a node's whole state
+    fits in a single integer.
+    """
+    SUSCEPTIBLE = 1
+    INTERESTED_A = 2
+    INTERESTED_B = 4
+    BORED_A = 8
+    BORED_B = 16
+    INTEREST_A = 32
+    INTEREST_B = 64
+    INFLUENCER = 128
+
+
+def to_flags(states):
+    """
+    Fold an iterable of State into a plain integer bitmask.
+    """
+    return reduce(or_, (int(s) for s in states), 0)
+
+
+class StateView:
+    """
+    Set-like view over the bitmask of an agent.
+
+    Keeps the ``State.X in agent.state`` / ``agent.state.add(State.X)``
+    call sites working on top of the integer representation.
+
+    :param agent: *MemeAgent*
+        The agent whose ``flags`` are viewed.
+    """
+
+    __slots__ = ("agent",)
+
+    def __init__(self, agent):
+        self.agent = agent
+
+    def __contains__(self, state):
+        return bool(self.agent.flags & state)
+
+    def __iter__(self):
+        flags = self.agent.flags
+        return (s for s in State if flags & s)
+
+    def __len__(self):
+        return bin(self.agent.flags).count("1")
+
+    def __eq__(self, other):
+        if isinstance(other, int):
+            return self.agent.flags == other
+        return self.agent.flags == to_flags(other)
+
+    def __repr__(self):
+        return "{" + ", ".join("State." + s.name for s in self) + "}"
+
+    def add(self, state):
+        self.agent.set_flags(self.agent.flags | int(state))
+
+    def discard(self, state):
+        self.agent.set_flags(self.agent.flags & ~int(state))
+
+    def remove(self, state):
+        if not self.agent.flags & state:
+            raise KeyError(state)
+        self.discard(state)
+
+
+class StateCounts(Counter):
+    """
+    Number of nodes per state bitmask.
+
+    The model updates it on every state transition, so reporters read
+    population totals from the handful of distinct bitmasks instead of
+    scanning every agent.
+    """
+
+    def move(self, old, new):
+        self[old] -= 1
+        self[new] += 1
+
+    def count_all(self, *states):
+        """Number of nodes having every one of the given states."""
+        mask = to_flags(states)
+        return sum(n for flags, n in self.items() if flags & mask == mask)
+
+    def count_any(self, *states):
+        """Number of nodes having at least one of the given states."""
+        mask = to_flags(states)
+        return sum(n for flags, n in self.items() if flags & mask)
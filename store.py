@@ -0,0 +1,188 @@
+"""
+Chunked columnar storage of per-step model variables.
+
+Instead of keeping one DataFrame per run in memory, SeriesStore buffers the
+per-step series (``Percentage_spread``, ``Percentage_meme_A``, ...) of a
+bounded number of runs and writes them as one chunk directory of ``.npy``
+columns::
+
+    store/
+        index.csv               run, chunk, start, length, seed, parameters (JSON)
+        00000/offsets.npy       where each run starts in the columns
+        00000/Percentage_spread.npy
+        ...
+
+The series of a SweepRunner carry a ``step`` column, the step every row was
+collected on. SeriesReader memory-maps the columns back, so a sweep can be
+analysed without re-running it or loading it whole.
+"""
+import csv
+import json
+import os
+
+import numpy as np
+
+
+INDEX = "index.csv"
+INDEX_COLUMNS = ["run", "chunk", "start", "length", "seed"]
+
+
+def to_json(value):
+    # NumPy scalars, e.g. parameter values from np.linspace, as Python ones
+    return json.dumps(value, default=lambda value: value.item())
+
+
+class SeriesStore:
+    """
+    Write per-step series of many runs in chunks.
+
+    Usable as a SweepRunner sink: ``write`` takes a run result carrying a
+    ``series`` dict.
+
+    :param path: *str*
+        The store directory, created if needed. An existing index is
+        replaced.
+
+    :param chunk_runs: *int*, default 256
+        The number of runs buffered before a chunk is written.
+    """
+
+    def __init__(self, path, chunk_runs=256):
+        self.path = path
+        self.chunk_runs = chunk_runs
+        self.chunk = 0
+        self._buffer = []
+        self._parameters = None
+        os.makedirs(path, exist_ok=True)
+        self._index = open(os.path.join(path, INDEX), "w", newline="")
+        self._writer = csv.writer(self._index)
+
+    def append(self, run, series, params=None, seed=None):
+        """
+        Add the series of one run.
+
+        :param series: *dict*
+            Variable name to the list of its per-step values.
+        """
+        params = params or {}
+        if self._parameters is None:
+            self._parameters = list(params)
+            self._writer.writerow(INDEX_COLUMNS + self._parameters)
+        self._buffer.append((run, series, params, seed))
+        if len(self._buffer) >= self.chunk_runs:
+            self.flush()
+
+    def write(self, result):
+        self.append(result["run"], result["series"], result["params"], result["seed"])
+
+    def flush(self):
+        """
+        Write the buffered runs as a new chunk.
+        """
+        if not self._buffer:
+            return
+        directory = os.path.join(self.path, "{:05d}".format(self.chunk))
+        os.makedirs(directory, exist_ok=True)
+        names = list(self._buffer[0][1])
+        lengths = [len(series[names[0]]) for _, series, _, _ in self._buffer]
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        np.save(os.path.join(directory, "offsets.npy"), offsets)
+        for name in names:
+            values = np.concatenate([
+                np.asarray(series[name], dtype=np.float64) for _, series, _, _ in self._buffer
+            ])
+            np.save(os.path.join(directory, name + ".npy"), values)
+        for (run, _, params, seed), start, length in zip(self._buffer, offsets, lengths):
+            self._writer.writerow(
+                [run, self.chunk, int(start), length, to_json(seed)]
+                + [to_json(params[name]) for name in self._parameters]
+            )
+        self._index.flush()
+        self._buffer = []
+        self.chunk += 1
+
+    def close(self):
+        self.flush()
+        self._index.close()
+
+
+class SeriesReader:
+    """
+    Lazy reader of a SeriesStore.
+
+    Only the index is read up front; columns are memory-mapped the first
+    time a chunk is accessed.
+
+    :param path: *str*
+        The store directory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._chunks = {}
+        with open(os.path.join(path, INDEX), newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, None) or INDEX_COLUMNS
+            self.parameters = header[len(INDEX_COLUMNS):]
+            self.index = {}
+            for row in reader:
+                run, chunk, start, length = (int(value) for value in row[:4])
+                self.index[run] = {
+                    "chunk": chunk,
+                    "start": start,
+                    "length": length,
+                    "seed": json.loads(row[4]),
+                    "params": {
+                        name: json.loads(value)
+                        for name, value in zip(self.parameters, row[len(INDEX_COLUMNS):])
+                    },
+                }
+
+    def __len__(self):
+        return len(self.index)
+
+    def runs(self, **params):
+        """
+        The run ids whose parameters match all of ``params``.
+        """
+        return [
+            run for run, entry in self.index.items()
+            if all(entry["params"].get(name) == value for name, value in params.items())
+        ]
+
+    def column(self, chunk, name):
+        key = (chunk, name)
+        if key not in self._chunks:
+            self._chunks[key] = np.load(
+                os.path.join(self.path, "{:05d}".format(chunk), name + ".npy"), mmap_mode="r"
+            )
+        return self._chunks[key]
+
+    def series(self, run, name="Percentage_spread"):
+        """
+        Memory-mapped per-step values of a variable for one run.
+        """
+        entry = self.index[run]
+        start = entry["start"]
+        return self.column(entry["chunk"], name)[start:start + entry["length"]]
+
+    def steps(self, run):
+        """
+        The step every row of a run was collected on.
+        """
+        return self.series(run, "step").astype(np.int64)
+
+    def iter_series(self, name="Percentage_spread", **params):
+        """
+        Yield ``(run, values)`` for every run matching ``params``.
+        """
+        for run in self.runs(**params):
+            yield run, self.series(run, name)
+
+    def to_lists(self, name="Percentage_spread", **params):
+        """
+        The series of the matching runs as lists, the shape the notebook
+        builds from ``BatchRunner.get_collector_model()``.
+        """
+        return [values.tolist() for _, values in self.iter_series(name, **params)]
@@ -0,0 +1,167 @@
+"""
+Uniform random numbers for the spreading and boredom of MemeAgent.
+
+Agents draw one uniform number per neighbour they try to spread a meme to
+and one per boredom check. With ``MemeModel(rng="python")``, the default,
+those come one call at a time from the model's ``random.Random``, as they
+always did. With ``rng="numpy"`` they come from a UniformStream, which draws
+them in blocks from a NumPy Generator; before every step the model reserves
+as many numbers as the frontier can use (its total degree plus one boredom
+check per agent), and agents take a slice per neighbour list.
+
+Seed to trajectory mapping with ``rng="numpy"``:
+
+- ``random.Random(seed)`` still draws the network seed, the initial states,
+  the activation order and the countdowns;
+- the spread and boredom numbers are the output, in order, of
+  ``Generator(PCG64(SeedSequence(seed, spawn_key=(STREAM_KEY,))))``.
+
+Blocks are carved out of that one sequence and numbers left at the end of a
+step are kept for the next, so the block sizes never change a run.
+
+Runs that need their own streams derive them from a SeedSequence rather
+than by adding offsets to a seed: SweepRunner gives every run a seed
+spawned from its master seed, and ``UniformStream.spawn`` hands out
+independent child streams, e.g. one per worker of a single run.
+
+``random.Random`` and NumPy's ``MT19937`` are the same Mersenne Twister.
+``mt19937_of`` reads the 32-bit words a random.Random is about to use in
+bulk, and ``advance`` moves it past them, so that code drawing a known
+pattern per node, like the construction of the agents, can decode all
+nodes' numbers at once and leave the generator where the single calls
+would have.
+"""
+import numpy as np
+
+
+# spawn key of the uniform stream under the model seed, keeping it apart
+# from any other stream derived from the same seed
+STREAM_KEY = 0
+
+
+def stream_sequence(seed):
+    """The SeedSequence of the uniform stream of a model seed."""
+    return np.random.SeedSequence(seed, spawn_key=(STREAM_KEY,))
+
+
+# random.random() builds a double from two words, as genrand_res53 does
+WORD_SHIFTS = (5, 6)
+RES53 = 1.0 / 9007199254740992.0
+
+
+def mt19937_of(source):
+    """
+    A NumPy MT19937 in the state of the random.Random ``source``, drawing
+    with ``random_raw`` the words ``source.getrandbits(32)`` would return.
+    """
+    internal = source.getstate()[1]
+    bit_generator = np.random.MT19937()
+    bit_generator.state = {
+        "bit_generator": "MT19937",
+        "state": {"key": np.array(internal[:-1], dtype=np.uint32), "pos": internal[-1]},
+    }
+    return bit_generator
+
+
+def advance(source, words):
+    """
+    Move the random.Random ``source`` past its next ``words`` words.
+    """
+    bit_generator = mt19937_of(source)
+    bit_generator.random_raw(words)
+    state = bit_generator.state["state"]
+    version, _, gauss_next = source.getstate()
+    source.setstate((version, tuple(state["key"].tolist()) + (int(state["pos"]),), gauss_next))
+
+
+def words_to_uniforms(high, low):
+    """
+    The numbers random.random() makes of the word pairs ``(high, low)``.
+    """
+    return ((high >> WORD_SHIFTS[0]) * 67108864.0 + (low >> WORD_SHIFTS[1])) * RES53
+
+
+class PythonUniforms:
+    """
+    Uniform numbers drawn from the model's random.Random one at a time.
+
+    ``take`` is lazy, so draws interleave with what the caller does
+    between them exactly as single calls would.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def reserve(self, n):
+        pass
+
+    def random(self):
+        return self.model.random.random()
+
+    def take(self, n):
+        random = self.model.random.random
+        return (random() for _ in range(n))
+
+
+class UniformStream:
+    """
+    Uniform numbers drawn in blocks from a NumPy Generator.
+
+    :param sequence: *SeedSequence*
+        The seed of the stream.
+
+    :param block_size: *int*, default 4096
+        The smallest number of values drawn at once.
+    """
+
+    def __init__(self, sequence, block_size=4096):
+        self.sequence = sequence
+        self.block_size = block_size
+        self.rng = np.random.Generator(np.random.PCG64(sequence))
+        self.block = []
+        self.position = 0
+
+    def reserve(self, n):
+        """
+        Make sure the next ``n`` numbers are drawn.
+        """
+        left = len(self.block) - self.position
+        if left < n:
+            self.block = self.block[self.position:] + self.rng.random(
+                max(n - left, self.block_size)
+            ).tolist()
+            self.position = 0
+
+    def random(self):
+        if self.position == len(self.block):
+            self.reserve(1)
+        value = self.block[self.position]
+        self.position += 1
+        return value
+
+    def take(self, n):
+        """
+        The next ``n`` numbers, as a list.
+        """
+        if self.position + n > len(self.block):
+            self.reserve(n)
+        start = self.position
+        self.position += n
+        return self.block[start:self.position]
+
+    def spawn(self, n):
+        """
+        ``n`` independent streams, children of this one's seed.
+        """
+        return [UniformStream(child, self.block_size) for child in self.sequence.spawn(n)]
+
+    def getstate(self):
+        return {
+            "bit_generator": self.rng.bit_generator.state,
+            "block": np.array(self.block[self.position:], dtype=np.float64),
+        }
+
+    def setstate(self, state):
+        self.rng.bit_generator.state = state["bit_generator"]
+        self.block = state["block"].tolist()
+        self.position = 0
@@ -0,0 +1,487 @@
+"""
+Parallel, seeded parameter sweeps.
+
+A replacement for mesa's BatchRunner / FixedBatchRunner taking the same
+``fixed_parameters`` / ``variable_parameters`` / ``model_reporters`` shape.
+Runs are spread over a process pool, every run gets a seed derived from a
+master seed and its place in the sweep, and results are written to disk in
+run order as soon as they are available, the final reporters to a CSV file
+and the per-step series to a SeriesStore::
+
+    runner = SweepRunner(
+        MemeModel,
+        fixed_parameters={"num_nodes": 250, "n_groups": 5},
+        variable_parameters={"influencer_appearance": [1, 3, 5, 7]},
+        iterations=50,
+        max_steps=100,
+        model_reporters={"peak_A": number_peak_meme_A},
+        seed=42,
+        output="experiments/sweep_influencer.csv",
+        series_output="experiments/sweep_influencer",
+    )
+    runner.run_all()
+
+With ``aggregate`` the per-step mean and confidence interval of some model
+variables are folded run by run, grouped by variable parameter value, and
+read back from ``runner.aggregator`` once the sweep is done::
+
+    runner = SweepRunner(..., aggregate=["Percentage_spread"])
+    runner.run_all()
+    curves = runner.aggregator.curves("Percentage_spread")
+
+With ``precision`` the number of replicates adapts to every configuration:
+replicates keep coming until the confidence interval of the mean of the
+chosen reporters is narrow enough, between ``min_iterations`` and
+``iterations`` replicates::
+
+    runner = SweepRunner(
+        ...,
+        iterations=200,
+        min_iterations=10,
+        precision={"percentage_spread": 0.01, "peak_A": 2.0},
+    )
+    runner.run_all()
+    runner.replicates  # replicates used by every configuration
+
+With ``cache`` every run is first looked up in a cache.RunCache, so a
+sweep run again with the same parameters, seeds and model code reads its
+results back instead of simulating them.
+
+The output is identical for a given master seed whatever the number of
+worker processes.
+"""
+import csv
+import os
+import queue
+from itertools import product
+from multiprocessing import Pool
+
+import numpy as np
+
+from aggregate import StepStatistics, SweepAggregator
+from cache import RunCache
+from store import SeriesStore
+
+
+def run_seed(master_seed, config, iteration):
+    """
+    Seed of one run, derived from the master seed and the run position.
+
+    :param config: *int*
+        Index of the parameter combination in the sweep.
+
+    :param iteration: *int*
+        Index of the replicate for that combination.
+    """
+    sequence = np.random.SeedSequence(master_seed, spawn_key=(config, iteration))
+    return int(sequence.generate_state(1)[0])
+
+
+def run_task(task):
+    """
+    Run one model to completion or ``max_steps`` and collect its reporters.
+
+    Module-level so it can be sent to worker processes.
+    """
+    result = {
+        "run": task["run"],
+        "config": task["config"],
+        "iteration": task["iteration"],
+        "seed": task["seed"],
+        "params": task["kwargs"],
+        "cached": False,
+    }
+    cache = task.get("cache")
+    key = None
+    if cache is not None:
+        key = cache.key(
+            task["model_cls"], dict(task["kwargs"], **task["options"]), task["seed"], task["max_steps"]
+        )
+    if key is not None:
+        hit = cache.get(key, task["model_reporters"], task["series"])
+        if hit is not None:
+            result["reporters"], series = hit
+            result["cached"] = True
+            if task["series"]:
+                result["series"] = series
+            return result
+
+    model = task["model_cls"](seed=task["seed"], **task["kwargs"], **task["options"])
+    while model.running and model.schedule.steps < task["max_steps"]:
+        model.step()
+    if hasattr(model, "collect"):
+        # the final row of a model collecting every k steps or at the end
+        model.collect()
+    result["reporters"] = {
+        name: reporter(model) for name, reporter in task["model_reporters"].items()
+    }
+    series = dict(model.datacollector.model_vars)
+    # the step of every row, not its position with collect_every other than 1
+    steps = getattr(model, "collection_steps", None)
+    if steps is None:
+        steps = range(len(next(iter(series.values()), [])))
+    series["step"] = list(steps)
+    if task["series"]:
+        result["series"] = series
+    if key is not None:
+        # the series are stored even when not asked for, so a later sweep
+        # wanting them still hits
+        cache.put(key, task["model_reporters"], result["reporters"], series)
+    return result
+
+
+class ReportWriter:
+    """
+    Append the final reporters of each run as a CSV row.
+
+    Columns follow the BatchRunner tables in ``experiments/``: reporters,
+    model parameters, then the run number and its seed.
+
+    :param path: *str*
+        The CSV file to write, replaced if it exists.
+    """
+
+    def __init__(self, path, reporters, parameters):
+        self.path = path
+        self.columns = list(reporters) + list(parameters) + ["Run", "seed"]
+        self._file = open(path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.columns)
+
+    def write(self, result):
+        row = dict(result["reporters"], **result["params"])
+        row["Run"] = result["run"]
+        row["seed"] = result["seed"]
+        self._writer.writerow([row[column] for column in self.columns])
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class Replicates:
+    """
+    The replicates of one configuration in an adaptive sweep.
+
+    Results are accepted in iteration order, so the replicates kept do not
+    depend on which worker finished first; results arriving after the
+    configuration converged are dropped.
+    """
+
+    def __init__(self, runner, config, kwargs):
+        self.runner = runner
+        self.config = config
+        self.kwargs = kwargs
+        self.launched = 0
+        self.finished = {}
+        self.accepted = []
+        self.statistics = {name: StepStatistics() for name in runner.precision}
+        self.done = False
+
+    @property
+    def outstanding(self):
+        return self.launched - len(self.accepted) - len(self.finished)
+
+    def launch(self):
+        task = self.runner.task(None, self.config, self.launched, self.kwargs)
+        self.launched += 1
+        return task
+
+    def finish(self, result):
+        if self.done:
+            return
+        self.finished[result["iteration"]] = result
+        while not self.done and len(self.accepted) in self.finished:
+            result = self.finished.pop(len(self.accepted))
+            self.accepted.append(result)
+            for name, statistics in self.statistics.items():
+                statistics.add([result["reporters"][name]])
+            self.done = len(self.accepted) >= self.runner.iterations or (
+                len(self.accepted) >= self.runner.min_iterations and self.converged()
+            )
+        if self.done:
+            self.finished = {}
+
+    def half_widths(self):
+        """Half width of the confidence interval of every reporter mean."""
+        widths = {}
+        for name, statistics in self.statistics.items():
+            lower, upper = statistics.ci(self.runner.level)
+            widths[name] = float(upper[0] - lower[0]) / 2
+        return widths
+
+    def converged(self):
+        return all(
+            width <= self.runner.precision[name] for name, width in self.half_widths().items()
+        )
+
+
+class SweepRunner:
+    """
+    Run a model over a grid of parameters on a pool of processes.
+
+    :param model_cls: *type*
+        The model class, it must accept a ``seed`` argument.
+
+    :param fixed_parameters: *dict*
+        Parameters shared by every run.
+
+    :param variable_parameters: *dict*
+        Parameter name to the list of values to sweep; runs cover the
+        product of all lists.
+
+    :param iterations: *int*, default 1
+        The number of replicates of every parameter combination, the
+        largest number with ``precision``.
+
+    :param max_steps: *int*, default 1000
+        Upper bound on the steps of a run.
+
+    :param model_reporters: *dict*
+        Name to reporter function, evaluated once at the end of each run.
+        Reporters must be picklable (module-level functions).
+
+    :param model_options: *dict*, default None
+        Model arguments of every run that are not parameters of the
+        experiment, e.g. ``{"collect_every": 0}``: passed to the models
+        but not reported with the parameters.
+
+    :param seed: *int*, default 0
+        The master seed every run seed is derived from.
+
+    :param processes: *int*, default None
+        The number of worker processes, all cores when None. With 1 the
+        runs happen in the calling process, as runs of the sharded engine
+        must.
+
+    :param output: *str*, default None
+        CSV file the reporters are streamed to.
+
+    :param series_output: *str*, default None
+        SeriesStore directory the per-step model variables of the
+        datacollector are streamed to, in chunks of ``chunk_runs`` runs,
+        with the ``step`` of every row.
+
+    :param aggregate: *list*, default None
+        Datacollector model variables whose per-step statistics are
+        aggregated across runs, grouped by the variable parameters, in
+        ``self.aggregator``. The models must collect on every step.
+
+    :param sinks: *list*, default None
+        Extra objects with ``write(result)`` / ``close()`` receiving every
+        run result in run order. Sinks with a true ``needs_series``
+        attribute get the per-step series of the runs too.
+
+    :param precision: *dict*, default None
+        Reporter name to the largest half width of the confidence interval
+        of its mean. Every configuration then runs replicates until all
+        are met, within ``min_iterations`` and ``iterations``; the
+        number used is in ``self.replicates``.
+
+    :param min_iterations: *int*, default 10
+        The smallest number of replicates with ``precision``, so the
+        variance is not judged on a handful of runs.
+
+    :param level: *float*, default 0.95
+        The confidence level of the intervals of ``precision``.
+
+    :param cache: *RunCache* or *str*, default None
+        A cache.RunCache, or its directory, looked up before every run and
+        filled after it. ``self.cache_hits`` counts the runs read back.
+    """
+
+    def __init__(
+        self,
+        model_cls,
+        fixed_parameters=None,
+        variable_parameters=None,
+        iterations=1,
+        max_steps=1000,
+        model_reporters=None,
+        model_options=None,
+        seed=0,
+        processes=None,
+        output=None,
+        series_output=None,
+        chunk_runs=256,
+        aggregate=None,
+        sinks=None,
+        precision=None,
+        min_iterations=10,
+        level=0.95,
+        cache=None
+    ):
+        self.model_cls = model_cls
+        self.fixed_parameters = dict(fixed_parameters or {})
+        self.variable_parameters = dict(variable_parameters or {})
+        self.iterations = iterations
+        self.max_steps = max_steps
+        self.model_reporters = dict(model_reporters or {})
+        self.model_options = dict(model_options or {})
+        self.seed = seed
+        self.processes = processes or os.cpu_count()
+        self.output = output
+        self.series_output = series_output
+        self.chunk_runs = chunk_runs
+        self.sinks = list(sinks or [])
+        self.precision = dict(precision or {})
+        unknown = set(self.precision) - set(self.model_reporters)
+        if unknown:
+            raise ValueError(
+                "precision needs model reporters for {}".format(", ".join(sorted(unknown)))
+            )
+        engines = set(self.variable_parameters.get("engine", ()))
+        engines.add(self.fixed_parameters.get("engine", self.model_options.get("engine")))
+        if "sharded" in engines and self.processes != 1:
+            # pool workers are daemonic and cannot start the shard processes
+            raise ValueError(
+                "The sharded engine starts its own processes: run its sweeps with processes=1"
+            )
+        self.min_iterations = min(min_iterations, iterations)
+        self.level = level
+        self.replicates = None
+        if isinstance(cache, str):
+            cache = RunCache(cache)
+        self.cache = cache
+        self.cache_hits = 0
+        self.aggregator = None
+        if aggregate:
+            self.aggregator = SweepAggregator(self.variable_parameters, aggregate)
+            self.sinks.append(self.aggregator)
+
+    def configurations(self):
+        """
+        Every combination of the variable parameters, merged with the
+        fixed ones, in the order BatchRunner runs them.
+        """
+        names = list(self.variable_parameters)
+        for values in product(*self.variable_parameters.values()):
+            kwargs = dict(zip(names, values))
+            kwargs.update(self.fixed_parameters)
+            yield kwargs
+
+    def needs_series(self):
+        return self.series_output is not None or any(
+            getattr(sink, "needs_series", False) for sink in self.sinks
+        )
+
+    def task(self, run, config, iteration, kwargs):
+        return {
+            "run": run,
+            "config": config,
+            "iteration": iteration,
+            "seed": run_seed(self.seed, config, iteration),
+            "kwargs": kwargs,
+            "options": self.model_options,
+            "model_cls": self.model_cls,
+            "max_steps": self.max_steps,
+            "model_reporters": self.model_reporters,
+            "series": self.needs_series(),
+            "cache": self.cache,
+        }
+
+    def tasks(self):
+        run = 0
+        for config, kwargs in enumerate(self.configurations()):
+            for iteration in range(self.iterations):
+                yield self.task(run, config, iteration, kwargs)
+                run += 1
+
+    def results(self):
+        """
+        Yield run results in run order while the pool works ahead.
+        """
+        if self.precision:
+            yield from self.adaptive_results()
+            return
+        if self.processes == 1:
+            yield from map(run_task, self.tasks())
+            return
+        with Pool(self.processes) as pool:
+            yield from pool.imap(run_task, self.tasks())
+
+    def adaptive_results(self):
+        """
+        Yield the accepted replicates of every configuration, configuration
+        by configuration, numbering runs as they are yielded.
+
+        Workers are kept busy with the configurations that have the fewest
+        replicates under way, so a configuration may run a few replicates
+        past the one it converges on; those are dropped.
+        """
+        configurations = [
+            Replicates(self, config, kwargs)
+            for config, kwargs in enumerate(self.configurations())
+        ]
+        self.replicates = [0] * len(configurations)
+        run = 0
+
+        def emit(replicates):
+            nonlocal run
+            self.replicates[replicates.config] = len(replicates.accepted)
+            for result in replicates.accepted:
+                result["run"] = run
+                run += 1
+                yield result
+            replicates.accepted = []
+
+        if self.processes == 1:
+            for replicates in configurations:
+                while not replicates.done:
+                    replicates.finish(run_task(replicates.launch()))
+                yield from emit(replicates)
+            return
+
+        finished = queue.Queue()
+        running = 0
+        emitted = 0
+        with Pool(self.processes) as pool:
+            while emitted < len(configurations):
+                while running < self.processes:
+                    waiting = [
+                        r for r in configurations
+                        if not r.done and r.launched < self.iterations
+                    ]
+                    if not waiting:
+                        break
+                    replicates = min(waiting, key=lambda r: r.outstanding)
+                    pool.apply_async(
+                        run_task,
+                        (replicates.launch(),),
+                        callback=finished.put,
+                        error_callback=finished.put,
+                    )
+                    running += 1
+                result = finished.get()
+                running -= 1
+                if isinstance(result, BaseException):
+                    raise result
+                configurations[result["config"]].finish(result)
+                while emitted < len(configurations) and configurations[emitted].done:
+                    yield from emit(configurations[emitted])
+                    emitted += 1
+
+    def run_all(self):
+        """
+        Run the whole sweep, handing every result to the sinks.
+
+        :return: *int* the number of runs.
+        """
+        sinks = list(self.sinks)
+        if self.output is not None:
+            parameters = list(self.variable_parameters) + list(self.fixed_parameters)
+            sinks.append(ReportWriter(self.output, self.model_reporters, parameters))
+        if self.series_output is not None:
+            sinks.append(SeriesStore(self.series_output, self.chunk_runs))
+        count = 0
+        self.cache_hits = 0
+        try:
+            for result in self.results():
+                self.cache_hits += result["cached"]
+                for sink in sinks:
+                    sink.write(result)
+                count += 1
+        finally:
+            for sink in sinks:
+                sink.close()
+        return count
@@ -0,0 +1,64 @@
+import pytest
+
+from model import MemeModel, number_bored_A, number_bored_B
+from validate import BASELINE, VARIANTS, compare, ks_2samp
+
+
+def bored(model):
+    return number_bored_A(model) + number_bored_B(model)
+
+
+@pytest.mark.parametrize("variant", ["activation", "calendar"])
+def test_activation_matches_random_activation(variant):
+    rows = compare(*VARIANTS[variant], seeds=30)
+    failed = [(name, p) for name, _, _, _, p, ok in rows if not ok]
+    assert not failed
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_calendar_stays_in_sync(seed):
+    model = MemeModel(seed=seed, activation="calendar", debug=True, **BASELINE)
+    while model.running and model.schedule.steps < 100:
+        model.step()
+    assert not model.running
+
+
+def test_calendar_follows_maybe_bored_to_zero():
+    for seed in range(5):
+        model = MemeModel(seed=seed, activation="calendar", **BASELINE)
+        for _ in range(3):
+            model.step()
+        fork = model.fork(maybe_bored=0.0)
+        fork.debug = True
+        for _ in range(20):
+            fork.step()
+        assert bored(fork) == bored(model)
+
+
+def test_calendar_follows_maybe_bored_from_zero():
+    params = dict(BASELINE, maybe_bored=0.0)
+    for seed in range(5):
+        model = MemeModel(seed=seed, activation="calendar", **params)
+        for _ in range(3):
+            model.step()
+        fork = model.fork(maybe_bored=0.3)
+        fork.debug = True
+        while fork.running and fork.schedule.steps < 200:
+            fork.step()
+        assert not fork.running
+
+
+def test_calendar_fork_matches_random_activation():
+    finals = {}
+    for activation in ("random", "calendar"):
+        finals[activation] = []
+        for seed in range(30):
+            model = MemeModel(seed=seed, activation=activation, **BASELINE)
+            for _ in range(3):
+                model.step()
+            fork = model.fork(maybe_bored=0.1, seed=seed)
+            while fork.running and fork.schedule.steps < 200:
+                fork.step()
+            finals[activation].append(bored(fork))
+    _, p = ks_2samp(finals["random"], finals["calendar"])
+    assert p > 0.01
@@ -0,0 +1,77 @@
+import os
+import shutil
+
+import numpy as np
+
+from cache import GraphCache, RunCache
+from graph import partition_sizes, random_partition_edges
+from model import number_peak_meme_A, number_peak_meme_B
+
+
+def test_graph_cache_stores_the_generated_graph(tmp_path):
+    cache = GraphCache(str(tmp_path))
+    offsets, indices, edges = cache.get(300, 3, 0.08, 0.003, seed=1)
+    expected = random_partition_edges(
+        partition_sizes(300, 3), 0.08, 0.003, np.random.default_rng(1)
+    )
+    assert np.array_equal(edges, expected)
+    assert isinstance(edges, np.memmap)
+    assert len(cache.entries()) == 1
+    again = cache.get(300, 3, 0.08, 0.003, seed=1)
+    assert all(np.array_equal(a, b) for a, b in zip(again, (offsets, indices, edges)))
+
+
+def test_graph_cache_regenerates_removed_graphs(tmp_path):
+    cache = GraphCache(str(tmp_path))
+    _, _, edges = cache.get(300, 3, 0.08, 0.003, seed=1)
+    # another worker evicting the graph halfway
+    (directory,) = cache.entries()
+    os.remove(os.path.join(directory, "indices.npy"))
+    _, _, again = cache.get(300, 3, 0.08, 0.003, seed=1)
+    assert np.array_equal(again, edges)
+    assert isinstance(again, np.memmap)
+    shutil.rmtree(directory)
+    _, _, again = cache.get(300, 3, 0.08, 0.003, seed=1)
+    assert np.array_equal(again, edges)
+
+
+def test_graph_cache_skips_entries_removed_while_listed(tmp_path, monkeypatch):
+    cache = GraphCache(str(tmp_path), max_bytes=0)
+    cache.get(300, 3, 0.08, 0.003, seed=1)
+    listdir = os.listdir
+    monkeypatch.setattr(os, "listdir", lambda path: listdir(path) + ["gone"])
+    cache.get(300, 3, 0.08, 0.003, seed=2)
+    assert len(cache.entries()) == 1
+
+
+def test_run_cache_round_trip(tmp_path):
+    cache = RunCache(str(tmp_path))
+    cache.put("run", {"peak_A": number_peak_meme_A}, {"peak_A": 7}, {"Percentage_spread": [0.1]})
+    assert cache.get("run", {"peak_A": number_peak_meme_A}, series=True) == (
+        {"peak_A": 7}, {"Percentage_spread": [0.1]}
+    )
+    assert cache.get("run", {"peak_A": number_peak_meme_B}) is None
+    assert cache.get("other", {"peak_A": number_peak_meme_A}) is None
+
+
+def test_run_cache_never_serves_unnamed_reporters(tmp_path):
+    cache = RunCache(str(tmp_path))
+    cache.put("run", {"peak_A": lambda model: 1}, {"peak_A": 1})
+    assert cache.get("run", {"peak_A": lambda model: 2}) is None
+
+
+def test_run_cache_skips_entries_removed_by_other_workers(tmp_path, monkeypatch):
+    cache = RunCache(str(tmp_path), max_bytes=0)
+    cache.put("first", {"peak_A": number_peak_meme_A}, {"peak_A": 1})
+    listdir = os.listdir
+    monkeypatch.setattr(os, "listdir", lambda path: listdir(path) + ["gone.pkl"])
+    cache.put("second", {"peak_A": number_peak_meme_A}, {"peak_A": 2})
+    assert [os.path.basename(path) for path in cache.entries()] == ["second.pkl"]
+    utime = os.utime
+
+    def evicted(path, *args):
+        os.remove(path)
+        utime(path, *args)
+
+    monkeypatch.setattr(os, "utime", evicted)
+    assert cache.get("second", {"peak_A": number_peak_meme_A}) is None
@@ -0,0 +1,36 @@
+import csv
+import json
+
+import cli
+
+
+def test_sweep_writes_parameters_but_not_options(tmp_path, monkeypatch, capsys):
+    config = tmp_path / "small.json"
+    config.write_text(json.dumps({
+        "fixed_parameters": {"num_nodes": 100, "n_groups": 2},
+        "variable_parameters": {"influencer_appearance": [1, 3]},
+        "iterations": 2,
+        "max_steps": 20,
+        "model_reporters": {"peak_A": "number_peak_meme_A"},
+        "model_options": {"collect_every": 0},
+    }))
+    monkeypatch.chdir(tmp_path)
+    cli.main(["sweep", str(config), "--processes", "1"])
+    assert json.loads(capsys.readouterr().out)["runs"] == 4
+    with open(tmp_path / "sweep_small.csv") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == ["peak_A", "influencer_appearance", "num_nodes", "n_groups", "Run", "seed"]
+    assert [row["Run"] for row in rows] == ["0", "1", "2", "3"]
+
+
+def test_simulate_writes_collected_steps(tmp_path, capsys):
+    output = tmp_path / "run.csv"
+    cli.main([
+        "simulate", "--param", "num_nodes=100", "--param", "collect_every=5",
+        "--seed", "1", "--max-steps", "30", "--output", str(output),
+    ])
+    final = json.loads(capsys.readouterr().out)
+    with open(output) as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]["step"] == "0"
+    assert int(rows[-1]["step"]) == final["steps"]
@@ -0,0 +1,26 @@
+from mesa.batchrunner import BatchRunner
+
+from model import MemeModel, number_peak_meme_A
+
+
+def test_batch_runner_reads_model_collector():
+    runner = BatchRunner(
+        MemeModel,
+        variable_parameters={"influencer_appearance": [0, 2]},
+        fixed_parameters={"num_nodes": 100, "n_groups": 2},
+        iterations=2,
+        max_steps=20,
+        model_reporters={"peak_A": number_peak_meme_A},
+        display_progress=False,
+    )
+    runner.run_all()
+
+    results = runner.get_model_vars_dataframe()
+    assert len(results) == 4
+    assert list(results.columns[:2]) == ["influencer_appearance", "Run"]
+    collected = runner.get_collector_model()
+    assert len(collected) == 4
+    for key, frame in collected.items():
+        assert list(frame.columns) == list(MemeModel.MODEL_REPORTERS)
+        assert 1 <= len(frame) <= 21
+    assert runner.get_collector_agents() == {}
@@ -0,0 +1,35 @@
+import random
+
+import numpy as np
+import pytest
+
+from model import MemeModel
+
+
+def agent_draws(source, n):
+    """The numbers MemeAgent drew one by one, node after node."""
+    draws = []
+    for _ in range(n):
+        uniform_A, uniform_B = source.random(), source.random()
+        source.randrange(1, 2, 1)
+        source.randrange(1, 2, 1)
+        draws.append((uniform_A, uniform_B, source.randrange(2, 4, 1), source.randrange(2, 4, 1)))
+    return draws
+
+
+@pytest.mark.parametrize("seed", [0, 1, 12345])
+def test_bulk_draws_match_single_draws(seed):
+    n = 5000
+    model = MemeModel(num_nodes=10, seed=seed)
+    model.num_nodes = n
+    model.random = random.Random(seed)
+    # small chunks, so the draws cross many chunk boundaries
+    uniform_A, uniform_B, bored_A, bored_B = model.draw_agent_numbers(chunk=97)
+    reference = random.Random(seed)
+    expected = np.array(agent_draws(reference, n))
+    assert np.array_equal(uniform_A, expected[:, 0])
+    assert np.array_equal(uniform_B, expected[:, 1])
+    assert np.array_equal(bored_A, expected[:, 2])
+    assert np.array_equal(bored_B, expected[:, 3])
+    # the generator is left where the single draws leave it
+    assert model.random.random() == reference.random()
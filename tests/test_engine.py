@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from model import MemeModel
+from state import State
+from validate import BASELINE, VARIANTS, compare
+
+
+@pytest.mark.parametrize("variant", ["vectorized", "rng"])
+def test_variant_matches_the_agent_engine(variant):
+    rows = compare(*VARIANTS[variant], seeds=30)
+    failed = [(name, p) for name, _, _, _, p, ok in rows if not ok]
+    assert not failed
+
+
+@pytest.mark.parametrize("params", [
+    {"engine": "agent"},
+    {"engine": "agent", "rng": "numpy"},
+    {"engine": "vectorized"},
+])
+def test_counts_stay_in_sync(params):
+    for seed in range(3):
+        model = MemeModel(seed=seed, debug=True, **dict(BASELINE, **params))
+        while model.running and model.schedule.steps < 100:
+            model.step()
+        assert not model.running
+
+
+def test_vectorized_states_are_consistent():
+    model = MemeModel(seed=3, engine="vectorized", **BASELINE)
+    for _ in range(30):
+        model.step()
+        state = model.schedule.state
+        for interested, bored in ((State.INTERESTED_A, State.BORED_A), (State.INTERESTED_B, State.BORED_B)):
+            assert not np.any((state & int(interested) != 0) & (state & int(bored) != 0))
+        # a node left the susceptible state once interested in a meme
+        reached = state & int(State.INTERESTED_A | State.INTERESTED_B | State.BORED_A | State.BORED_B) != 0
+        assert np.array_equal(reached, state & int(State.SUSCEPTIBLE) == 0)
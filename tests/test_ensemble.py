@@ -0,0 +1,61 @@
+import csv
+import os
+from ast import literal_eval
+
+import pytest
+
+from ensemble import EnsembleModel
+from model import number_bored_A, number_bored_B, number_bored_both, number_interest_A
+from model import number_interest_B, number_interest_both, number_peak_meme_A, number_peak_meme_B
+from model import number_steps, number_susceptible, step_peak_meme_A, step_peak_meme_B
+from model import percentage_meme_A_spread, percentage_meme_B_spread, percentage_spread
+
+
+EXPERIMENTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "experiments")
+
+# the reporters of the notebook experiments
+REPORTERS = {
+    "susceptible": number_susceptible,
+    "num_steps": number_steps,
+    "peak_A": number_peak_meme_A,
+    "step_peak_A": step_peak_meme_A,
+    "peak_B": number_peak_meme_B,
+    "step_peak_B": step_peak_meme_B,
+    "bored_A": number_bored_A,
+    "bored_B": number_bored_B,
+    "bored_both": number_bored_both,
+    "interest_A": number_interest_A,
+    "interest_B": number_interest_B,
+    "interest_both": number_interest_both,
+    "percentage_spread": percentage_spread,
+    "percentage_meme_A_spread": percentage_meme_A_spread,
+    "percentage_meme_B_spread": percentage_meme_B_spread,
+}
+
+
+@pytest.mark.parametrize("table, variable", [
+    ("batch_result_0.csv", []),
+    ("batch_result_1.csv", ["n_groups"]),
+    ("batch_result_2.csv", ["influencer_appearance"]),
+    ("batch_result_3.csv", ["initial_viral_size_A"]),
+])
+def test_results_match_batch_runner_tables(table, variable):
+    with open(os.path.join(EXPERIMENTS, table)) as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        expected = [dict(zip(header, row)) for row, _ in zip(reader, range(3))]
+    parameters = {
+        name: literal_eval(value) for name, value in expected[0].items()
+        if name in EnsembleModel.PARAMETERS
+    }
+    ensemble = EnsembleModel(replicates=3, seed=0, **parameters)
+    ensemble.run(max_steps=100)
+    rows = ensemble.results(
+        {name: REPORTERS[name] for name in header if name in REPORTERS}, variable
+    )
+    assert len(rows) == 3
+    for row, table_row in zip(rows, expected):
+        assert list(row) == header
+        assert row["Run"] == int(table_row["Run"])
+        for name, value in parameters.items():
+            assert row[name] == value
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from graph import build_csr, expand_neighbors, partition_sizes, random_partition_edges
+from graph import sample_indices, triangle_pairs
+
+
+def test_partition_sizes():
+    assert partition_sizes(100, 3) == [33, 33, 34]
+    assert sum(partition_sizes(1001, 7)) == 1001
+
+
+def test_triangle_pairs_enumerate_the_upper_triangle():
+    n = 300
+    r, c = triangle_pairs(np.arange(n * (n - 1) // 2))
+    expected = [(i, j) for j in range(n) for i in range(j)]
+    assert list(zip(r.tolist(), c.tolist())) == expected
+
+
+def test_sample_indices_edge_cases():
+    rng = np.random.default_rng(0)
+    assert len(sample_indices(0, 0.5, rng)) == 0
+    assert len(sample_indices(100, 0.0, rng)) == 0
+    assert sample_indices(5, 1.0, rng).tolist() == [0, 1, 2, 3, 4]
+    picks = sample_indices(10 ** 6, 0.01, rng)
+    assert (np.diff(picks) > 0).all() and picks[-1] < 10 ** 6
+    assert abs(len(picks) - 10 ** 4) < 5 * np.sqrt(10 ** 4)
+
+
+@pytest.mark.parametrize("sizes, p_in, p_out", [([50, 50, 60], 0.2, 0.01), ([300], 0.05, 0.5)])
+def test_edges_follow_the_partition_probabilities(sizes, p_in, p_out):
+    rng = np.random.default_rng(1)
+    n = sum(sizes)
+    group = np.repeat(np.arange(len(sizes)), sizes)
+    pairs_in = sum(s * (s - 1) // 2 for s in sizes)
+    pairs_out = n * (n - 1) // 2 - pairs_in
+    counts_in, counts_out = [], []
+    for _ in range(20):
+        edges = random_partition_edges(sizes, p_in, p_out, rng)
+        assert (edges[:, 0] < edges[:, 1]).all()
+        # no edge twice
+        assert len(np.unique(edges[:, 0] * n + edges[:, 1])) == len(edges)
+        same = group[edges[:, 0]] == group[edges[:, 1]]
+        counts_in.append(same.sum())
+        counts_out.append((~same).sum())
+    for counts, pairs, p in ((counts_in, pairs_in, p_in), (counts_out, pairs_out, p_out)):
+        if pairs:
+            # the mean of 20 binomial counts, within 5 standard errors
+            assert abs(np.mean(counts) - pairs * p) < 5 * np.sqrt(pairs * p * (1 - p) / 20)
+
+
+def test_csr_holds_both_ends_of_every_edge():
+    edges = random_partition_edges([40, 40], 0.2, 0.02, np.random.default_rng(2))
+    offsets, indices = build_csr(80, edges)
+    adjacency = {node: set(indices[offsets[node]:offsets[node + 1]].tolist()) for node in range(80)}
+    expected = {node: set() for node in range(80)}
+    for u, v in edges.tolist():
+        expected[u].add(v)
+        expected[v].add(u)
+    assert adjacency == expected
+
+    nodes = np.array([3, 70, 3])
+    owner, neighbors = expand_neighbors(offsets, indices, nodes)
+    for position, node in enumerate(nodes.tolist()):
+        assert neighbors[owner == position].tolist() == indices[offsets[node]:offsets[node + 1]].tolist()
@@ -0,0 +1,33 @@
+import pytest
+
+from memes import MultiMemeModel, meme_label
+from model import MemeModel
+
+
+def run(model, steps=100):
+    while model.running and model.schedule.steps < steps:
+        model.step()
+    return model.datacollector.model_vars
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_two_memes_run_like_meme_model(seed):
+    multi = run(MultiMemeModel(memes=2, num_nodes=1000, n_groups=4, seed=seed))
+    single = run(MemeModel(engine="vectorized", num_nodes=1000, n_groups=4, seed=seed))
+    for name in ("Percentage_spread", "Percentage_meme_A", "Percentage_meme_B"):
+        assert multi[name] == single[name]
+
+
+def test_counts_follow_the_states():
+    model = MultiMemeModel(memes=7, num_nodes=1000, n_groups=4, maybe_bored=[0.1, 0.5] * 3 + [0.9], seed=1)
+    engine = model.schedule
+    for _ in range(10):
+        model.step()
+        assert model.interested_count.tolist() == engine.interested.sum(axis=1).tolist()
+        assert model.bored_count.tolist() == engine.bored.sum(axis=1).tolist()
+        assert model.susceptible_count == int(engine.susceptible.sum())
+        assert not (engine.interested & engine.bored).any()
+
+
+def test_meme_labels():
+    assert [meme_label(meme) for meme in (0, 25, 26, 27, 701, 702)] == ["A", "Z", "AA", "AB", "ZZ", "AAA"]
@@ -0,0 +1,63 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from model import MemeModel
+
+
+VARIANTS = [
+    {"activation": "random"},
+    {"activation": "frontier"},
+    {"activation": "calendar"},
+    {"rng": "numpy"},
+    {"engine": "vectorized"},
+]
+
+
+def run(model, steps=100):
+    while model.running and model.schedule.steps < steps:
+        model.step()
+    return model.datacollector.model_vars
+
+
+@pytest.mark.parametrize("variant", VARIANTS)
+def test_fork_goes_on_like_the_model(variant):
+    model = MemeModel(num_nodes=300, n_groups=3, seed=4, **variant)
+    for _ in range(4):
+        model.step()
+    snapshot = pickle.loads(pickle.dumps(model.snapshot()))
+    fork = MemeModel.from_snapshot(snapshot)
+    assert fork.collection_steps == model.collection_steps
+    assert run(fork) == run(model)
+    assert fork.schedule.steps == model.schedule.steps
+
+
+def test_forks_with_other_seeds_differ():
+    model = MemeModel(num_nodes=300, n_groups=3, seed=4)
+    for _ in range(2):
+        model.step()
+    runs = [run(model.fork(seed=seed)) for seed in range(3)]
+    assert runs[0] != runs[1] or runs[0] != runs[2]
+
+
+def test_restore_rejects_another_engine():
+    snapshot = MemeModel(num_nodes=50, seed=1, engine="vectorized").snapshot()
+    with pytest.raises(ValueError):
+        MemeModel(num_nodes=50, seed=1).restore(snapshot)
+
+
+@pytest.mark.parametrize("engine", ["agent", "vectorized"])
+def test_meme_spread_chance_through_zero(engine):
+    model = MemeModel(num_nodes=200, seed=2, engine=engine)
+    model.update_parameters(meme_spread_chance=0.0)
+    fork = model.fork(meme_spread_chance=0.4)
+    if engine == "vectorized":
+        chances = fork.schedule.spread_chance.values()
+    else:
+        chances = [
+            np.array([a.meme_A_spread_chance for a in fork.node_agents]),
+            np.array([a.meme_B_spread_chance for a in fork.node_agents]),
+        ]
+    for chance in chances:
+        assert set(np.round(chance, 9)) == {0.04, 0.38}
@@ -0,0 +1,52 @@
+import numpy as np
+
+from model import MemeModel
+from store import SeriesReader, SeriesStore
+from sweep import SweepRunner
+
+
+def test_series_round_trip_across_chunks(tmp_path):
+    store = SeriesStore(str(tmp_path), chunk_runs=2)
+    runs = {}
+    for run, spread in enumerate(np.linspace(0.1, 0.5, 5)):
+        series = {"Percentage_spread": np.linspace(0, spread, run + 2).tolist()}
+        runs[run] = series
+        store.append(run, series, {"meme_spread_chance": spread, "n_groups": np.int64(3)}, seed=run)
+    store.close()
+
+    reader = SeriesReader(str(tmp_path))
+    assert len(reader) == 5
+    assert reader.parameters == ["meme_spread_chance", "n_groups"]
+    for run, series in runs.items():
+        assert reader.series(run).tolist() == series["Percentage_spread"]
+        assert reader.index[run]["seed"] == run
+        assert reader.index[run]["params"]["n_groups"] == 3
+    assert reader.runs(meme_spread_chance=0.2) == [1]
+    assert reader.to_lists(n_groups=3) == [series["Percentage_spread"] for series in runs.values()]
+
+
+def test_store_without_seeds(tmp_path):
+    store = SeriesStore(str(tmp_path))
+    store.append(0, {"Percentage_spread": [0.0, 0.5]})
+    store.close()
+    reader = SeriesReader(str(tmp_path))
+    assert reader.index[0]["seed"] is None
+    assert reader.series(0).tolist() == [0.0, 0.5]
+
+
+def test_sweep_series_carry_their_steps(tmp_path):
+    runner = SweepRunner(
+        MemeModel,
+        fixed_parameters={"num_nodes": 200, "collect_every": 5},
+        iterations=3,
+        max_steps=40,
+        processes=1,
+        series_output=str(tmp_path),
+    )
+    runner.run_all()
+    reader = SeriesReader(str(tmp_path))
+    for run in reader.runs():
+        steps = reader.steps(run)
+        assert len(steps) == len(reader.series(run))
+        assert steps[0] == 0
+        assert all(step % 5 == 0 for step in steps[:-1])
@@ -0,0 +1,46 @@
+import pytest
+
+from model import MemeModel, number_peak_meme_A
+from sweep import SweepRunner
+
+
+class Collect:
+    def __init__(self):
+        self.results = []
+
+    def write(self, result):
+        self.results.append(result)
+
+    def close(self):
+        pass
+
+
+def sweep(**kwargs):
+    runner = SweepRunner(
+        MemeModel,
+        fixed_parameters={"num_nodes": 100, "n_groups": 2},
+        variable_parameters={"influencer_appearance": [1, 3]},
+        iterations=3,
+        max_steps=20,
+        model_reporters={"peak_A": number_peak_meme_A},
+        **kwargs
+    )
+    sink = Collect()
+    runner.sinks.append(sink)
+    runner.run_all()
+    return sink.results
+
+
+def test_results_do_not_depend_on_processes():
+    one = sweep(processes=1)
+    two = sweep(processes=2)
+    assert [r["run"] for r in one] == list(range(6))
+    assert [(r["seed"], r["reporters"]) for r in one] == [(r["seed"], r["reporters"]) for r in two]
+
+
+def test_sharded_sweeps_run_in_the_calling_process():
+    with pytest.raises(ValueError):
+        SweepRunner(MemeModel, fixed_parameters={"engine": "sharded"}, processes=2)
+    with pytest.raises(ValueError):
+        SweepRunner(MemeModel, variable_parameters={"engine": ["vectorized", "sharded"]}, processes=2)
+    SweepRunner(MemeModel, fixed_parameters={"engine": "sharded"}, processes=1)
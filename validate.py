@@ -0,0 +1,132 @@
+"""
+Statistical cross-checks between MemeModel variants.
+
+Runs two variants of the model over many seeds and compares the
+distribution of their final reporters with a two-sample
+Kolmogorov-Smirnov test::
+
+    $ python validate.py activation --seeds 200
+"""
+import argparse
+import math
+import sys
+from bisect import bisect_right
+from statistics import mean
+
+from model import MemeModel, number_steps, percentage_spread
+from model import number_peak_meme_A, number_peak_meme_B, number_bored_A, number_bored_B
+from model import percentage_meme_A_spread, percentage_meme_B_spread
+
+
+REPORTERS = {
+    "num_steps": number_steps,
+    "peak_A": number_peak_meme_A,
+    "peak_B": number_peak_meme_B,
+    "bored_A": number_bored_A,
+    "bored_B": number_bored_B,
+    "percentage_spread": percentage_spread,
+    "percentage_meme_A_spread": percentage_meme_A_spread,
+    "percentage_meme_B_spread": percentage_meme_B_spread,
+}
+
+# the baseline configuration of experiment.ipynb
+BASELINE = {
+    "num_nodes": 250,
+    "n_groups": 5,
+    "initial_viral_size_A": 5,
+    "initial_viral_size_B": 5,
+    "meme_spread_chance": 0.3,
+    "maybe_bored": 0.3,
+    "influencer_appearance": 3,
+    "influencer_spread_chance": 0.6,
+    "interest_meme_A_chance": 0.5,
+    "interest_meme_B_chance": 0.5,
+}
+
+# model arguments of the variants that can be compared
+VARIANTS = {
+    "activation": ({"activation": "random"}, {"activation": "frontier"}),
+    "calendar": ({"activation": "random"}, {"activation": "calendar"}),
+    "rng": ({"rng": "python"}, {"rng": "numpy"}),
+    "vectorized": ({"engine": "agent"}, {"engine": "vectorized"}),
+    "sharded": ({"engine": "vectorized"}, {"engine": "sharded", "shards": 2}),
+}
+
+
+def run_final(params, seed, max_steps=100):
+    """
+    Run one model to completion and return its final reporters.
+    """
+    model = MemeModel(seed=seed, **params)
+    while model.running and model.schedule.steps < max_steps:
+        model.step()
+    return {name: reporter(model) for name, reporter in REPORTERS.items()}
+
+
+def ks_2samp(a, b):
+    """
+    Two-sample Kolmogorov-Smirnov test.
+
+    :return: *tuple* of the statistic and its asymptotic p-value.
+    """
+    a, b = sorted(a), sorted(b)
+    n, m = len(a), len(b)
+    d = max(abs(bisect_right(a, x) / n - bisect_right(b, x) / m) for x in a + b)
+    en = math.sqrt(n * m / (n + m))
+    lam = (en + 0.12 + 0.11 / en) * d
+    p = 2 * sum((-1) ** (j - 1) * math.exp(-2 * j * j * lam * lam) for j in range(1, 101))
+    return d, min(max(p, 0.0), 1.0)
+
+
+def compare(variant_a, variant_b, seeds=200, params=None, alpha=0.01, max_steps=100):
+    """
+    Compare two model variants over disjoint seeds.
+
+    Each variant gets its own ``seeds`` seeds, so the two samples are
+    drawn from different networks and initial states and stay
+    independent, as the two-sample test assumes.
+
+    :param variant_a: *dict*
+        Model arguments of the first variant.
+
+    :param variant_b: *dict*
+        Model arguments of the second variant.
+
+    :param alpha: *float*
+        Family-wise significance level, split over the reporters.
+
+    :return: *list* of ``(reporter, mean_a, mean_b, statistic, p_value, ok)``.
+    """
+    params = dict(BASELINE if params is None else params)
+    runs_a = [run_final({**params, **variant_a}, seed, max_steps) for seed in range(seeds)]
+    runs_b = [
+        run_final({**params, **variant_b}, seed, max_steps) for seed in range(seeds, 2 * seeds)
+    ]
+    threshold = alpha / len(REPORTERS)
+    rows = []
+    for name in REPORTERS:
+        a = [run[name] for run in runs_a]
+        b = [run[name] for run in runs_b]
+        d, p = ks_2samp(a, b)
+        rows.append((name, mean(a), mean(b), d, p, p >= threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("variant", choices=sorted(VARIANTS))
+    parser.add_argument("--seeds", type=int, default=200)
+    parser.add_argument("--alpha", type=float, default=0.01)
+    args = parser.parse_args()
+
+    rows = compare(*VARIANTS[args.variant], seeds=args.seeds, alpha=args.alpha)
+    print("{:<26}{:>10}{:>10}{:>8}{:>8}".format("reporter", "mean a", "mean b", "D", "p"))
+    for name, mean_a, mean_b, d, p, ok in rows:
+        print("{:<26}{:>10.3f}{:>10.3f}{:>8.3f}{:>8.3f}{}".format(
+            name, mean_a, mean_b, d, p, "" if ok else "  DIFFERENT"
+        ))
+    sys.exit(0 if all(row[-1] for row in rows) else 1)
+
+
+if __name__ == "__main__":
+    main()